@@ -0,0 +1,264 @@
+"""
+File: bench_pipeline.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Benchmarks of the stages of the detection pipeline on synthetic recordings
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pathpy
+
+from src.data_processing import (
+    parse_run,
+    parse_run_to_pandas,
+    generate_temporal_network,
+    generate_paths_from_threads,
+)
+from src.RollingTimeWindow import MyRollingTimeWindow
+from src.attack_simulate import trial_scenario
+from src.likelihood import compile_model
+from src.parse_cache import load_events
+from src.path_counts import temporal_path_counts
+from src.scenario_analyzer import ScenarioAnalyzer
+from benchmarks.recordings import write_recording
+
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results")
+
+WINDOW_SIZE = 200000
+MAX_ORDER = 2
+TIME_DELTA = 1000
+
+
+def stages(run: str):
+    """The benchmarked stages of a single recording.
+
+    Every stage is a pair of name and function without arguments. The inputs of a stage are
+    computed once beforehand, so only the stage itself is timed.
+
+    Parameters
+    ----------
+    run : str
+        path to the recording
+
+    Returns
+    -------
+    list of tuple of str and callable
+    """
+
+    parsed = parse_run(run)
+    run_data = parse_run_to_pandas(parsed)
+    net = generate_temporal_network(parsed)
+    paths = generate_paths_from_threads(run_data)
+    model = pathpy.MultiOrderModel(paths, MAX_ORDER)
+    compiled = compile_model(model)
+
+    events = load_events(run)
+    order = np.argsort(events.time[:-1], kind="stable")
+    edges = (events.syscall[order], events.syscall[order + 1], events.time[order], TIME_DELTA)
+
+    # the scenario analysis is benchmarked with one simulated run per syscall of the recording
+    num_runs = len(events.time)
+    runs = pd.DataFrame({"path": [f"run_{i}.txt" for i in range(num_runs)]})
+    runs["is_executing_exploit"] = np.arange(num_runs) % 3 == 0
+    likelihoods = -10 * np.random.RandomState(0).rand(num_runs, 10)
+
+    def evaluate_runs():
+        analyzer = ScenarioAnalyzer(-8, None, runs)
+        for path, run_likelihoods in zip(runs["path"], likelihoods):
+            analyzer.add_run({"run": path, "likelihoods": run_likelihoods})
+        analyzer.evaluate_runs()
+        analyzer.get_min_likelihood(0.2)
+
+    def rolling_window():
+        for _ in MyRollingTimeWindow(net, WINDOW_SIZE, 100000):
+            pass
+
+    return [
+        ("parse_run_to_pandas", lambda: parse_run_to_pandas(run)),
+        ("generate_temporal_network", lambda: generate_temporal_network(parsed)),
+        ("rolling_time_window", rolling_window),
+        ("generate_paths_from_threads", lambda: generate_paths_from_threads(run_data)),
+        ("temporal_path_counts", lambda: temporal_path_counts(*edges, max_subpath_length=3)),
+        ("fit_multi_order_model", lambda: pathpy.MultiOrderModel(paths, MAX_ORDER)),
+        ("trial_scenario", lambda: trial_scenario(model, run, 0, WINDOW_SIZE)),
+        ("trial_scenario_compiled", lambda: trial_scenario(compiled, run, 0, WINDOW_SIZE)),
+        ("evaluate_runs", evaluate_runs),
+    ]
+
+
+def measure(function, repeat):
+    """Runs a function repeatedly and returns the wall clock seconds of every run."""
+
+    seconds = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - begin)
+    return seconds
+
+
+def run_benchmarks(sizes, repeat=3, selected=None, directory=None):
+    """Times all stages on synthetic recordings of the given sizes.
+
+    Parameters
+    ----------
+    sizes : list of int
+        number of syscalls of the recordings
+    repeat : int
+        runs of every stage, the minimum is used for comparisons
+    selected : list of str
+        names of the stages to run, all if None
+    directory : str
+        where the recordings are written, a temporary directory if None
+
+    Returns
+    -------
+    list of dict
+        stage, events and seconds of every measurement
+    """
+
+    results = []
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for size in sizes:
+            run = os.path.join(tmp, f"synthetic_{size}.txt")
+            write_recording(run, size)
+
+            for name, function in stages(run):
+                if selected and name not in selected:
+                    continue
+
+                seconds = measure(function, repeat)
+                results.append({"stage": name, "events": size, "seconds": seconds})
+                print(f"{name:30s} {size:>9d} events {min(seconds):10.4f} s", flush=True)
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(results, directory=RESULTS):
+    """Writes the results together with the commit and machine they were measured on.
+
+    Returns
+    -------
+    str
+        path of the written file
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    commit = git_commit()
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    report = {
+        "commit": commit,
+        "timestamp": timestamp,
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+    path = os.path.join(directory, f"{timestamp}_{commit}.json")
+    with open(path, "w") as result_file:
+        json.dump(report, result_file, indent=2)
+
+    return path
+
+
+def latest_results(directory=RESULTS, exclude=None):
+    """Returns the path of the most recent results file, None if there is none."""
+
+    if not os.path.isdir(directory):
+        return None
+
+    files = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(".json") and os.path.join(directory, name) != exclude
+    )
+    return files[-1] if files else None
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Prints the change of every stage against earlier results.
+
+    Parameters
+    ----------
+    results : list of dict
+    baseline : str
+        path of an earlier results file
+    tolerance : float
+        relative slowdown which is reported as a regression
+
+    Returns
+    -------
+    list of tuple
+        stage, events and ratio of the regressions
+    """
+
+    with open(baseline) as baseline_file:
+        report = json.load(baseline_file)
+
+    before = {(r["stage"], r["events"]): min(r["seconds"]) for r in report["results"]}
+
+    print(f"\nCompared to commit {report['commit']} ({report['timestamp']}):")
+
+    regressions = []
+    for result in results:
+        key = (result["stage"], result["events"])
+        if key not in before:
+            continue
+
+        ratio = min(result["seconds"]) / max(before[key], 1e-9)
+        slower = ratio > 1 + tolerance
+        print(f"{key[0]:30s} {key[1]:>9d} events {ratio:6.2f}x{'  SLOWER' if slower else ''}")
+        if slower:
+            regressions.append((key[0], key[1], ratio))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("Description: ")[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000], help="syscalls per recording"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stage", action="append", help="only run this stage, can be repeated")
+    parser.add_argument("--output", default=RESULTS, help="directory of the results files")
+    parser.add_argument("--compare", help="results file to compare with, defaults to the latest")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    pathpy.utils.Log.set_min_severity(pathpy.utils.Severity.WARNING)
+
+    results = run_benchmarks(args.sizes, args.repeat, args.stage)
+    path = save_results(results, args.output)
+    print(f"\nSaved results to {path}")
+
+    baseline = args.compare or latest_results(args.output, exclude=path)
+    if baseline is not None and compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
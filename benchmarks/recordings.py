@@ -0,0 +1,112 @@
+"""
+File: recordings.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Synthetic sysdig recordings in the format of the LID-DS data set
+"""
+
+import numpy as np
+
+
+SYSCALLS = [
+    "futex",
+    "read",
+    "write",
+    "poll",
+    "epoll_wait",
+    "recvfrom",
+    "sendto",
+    "accept",
+    "open",
+    "openat",
+    "close",
+    "stat",
+    "fstat",
+    "lseek",
+    "mmap",
+    "munmap",
+    "brk",
+    "select",
+    "writev",
+    "readv",
+    "fcntl",
+    "setsockopt",
+    "getsockname",
+    "shutdown",
+    "clock_gettime",
+    "sched_yield",
+    "nanosleep",
+    "pread",
+    "pwrite",
+    "ioctl",
+]
+
+
+def generate_events(num_events, num_threads=20, seed=0):
+    """Generates the syscalls of a busy server process.
+
+    Every thread follows the same sparse Markov chain over the syscalls, the threads are
+    interleaved randomly and the time between two syscalls is exponentially distributed.
+
+    Parameters
+    ----------
+    num_events : int
+        number of syscalls, each one is written as an entry and a return line
+    num_threads : int
+    seed : int
+
+    Returns
+    -------
+    time : numpy.ndarray of int64
+        nanoseconds since midnight
+    thread_id : numpy.ndarray of int64
+    syscall : numpy.ndarray of int
+        index into SYSCALLS
+    """
+
+    random = np.random.RandomState(seed)
+
+    # every syscall has a few likely successors
+    successors = random.randint(0, len(SYSCALLS), (len(SYSCALLS), 3))
+    choice = random.randint(0, 3, num_events)
+
+    thread_id = 20000 + random.randint(0, num_threads, num_events)
+    time = 40 * 60 * 10 ** 9 + np.cumsum(random.exponential(20000, num_events).astype(np.int64))
+
+    syscall = np.zeros(num_events, dtype=np.int64)
+    last = {}
+    for i, thread in enumerate(thread_id.tolist()):
+        syscall[i] = successors[last.get(thread, 0), choice[i]]
+        last[thread] = syscall[i]
+
+    return time, thread_id, syscall
+
+
+def format_timestamp(nanoseconds: int):
+    seconds, nanoseconds = divmod(nanoseconds, 10 ** 9)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours % 24:02d}:{minutes:02d}:{seconds:02d}.{nanoseconds:09d}"
+
+
+def write_recording(path: str, num_events, num_threads=20, seed=0):
+    """Writes a synthetic run with entry and return lines like the recordings of LID-DS.
+
+    Parameters
+    ----------
+    path : str
+    num_events : int
+        number of syscalls, the file has twice as many lines
+    num_threads : int
+    seed : int
+    """
+
+    time, thread_id, syscall = generate_events(num_events, num_threads, seed)
+
+    with open(path, "w") as recording:
+        for i in range(num_events):
+            timestamp = format_timestamp(int(time[i]))
+            name = SYSCALLS[syscall[i]]
+            line = f"{thread_id[i] % 8} 999 mysqld {thread_id[i]}"
+            recording.write(f"{2 * i} {timestamp} {line} > {name} fd=13(<4t>172.17.0.1:44548)\n")
+            recording.write(f"{2 * i + 1} {timestamp} {line} < {name} res=0\n")
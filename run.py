@@ -15,6 +15,7 @@ from sacred import Experiment
 from sacred.observers import MongoObserver
 
 from src.utils import config_adapt
+from src.instrumentation import Instrumentation
 import src.get_data, src.preprocess_experiment, src.run_experiment, src.ex_create_model, src.ex_analyze_data
 
 
@@ -44,14 +45,16 @@ def config(data, dataset, c_results, model, simulate):
     data["interim"] = os.path.join(data["prefix"], "interim", dataset)
 
     data["runs"] = os.path.join(data["raw"], "runs.csv")
+    data["cache"] = os.path.join(data["interim"], "parse_cache") if data["parse_cache"] else None
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     simulate["cpu_count"] = multiprocessing.cpu_count()
 
-    model["paths"] = os.path.join(data["processed"], f'temp_paths_{model["time_delta"]}.p')
+    model["paths"] = os.path.join(data["processed"], f'temp_paths_{model["time_delta"]}')
     model["save"] = os.path.join(
-        model["prefix"], dataset, f'MOM_delta_{model["time_delta"]}_prior_{model["prior"]}.p',
+        model["prefix"], dataset, f'MOM_delta_{model["time_delta"]}_prior_{model["prior"]}'
     )
+    model["compiled"] = model["save"] + "_tables"
 
     c_results["output_path"] = os.path.join(c_results["prefix"], dataset, timestamp)
 
@@ -93,21 +96,38 @@ def run(hook, _config, stages, c_results, _run):
     logger.info(_config["timestamp"])
 
     min_likelihood = None
-
-    if stages["pull_data"]:
-        src.get_data.get_dataset(_config)
-    if stages["analyze"]:
-        src.ex_analyze_data.analyze(_config)
-        ex.add_artifact(os.path.join(c_results["output_path"], "analyze.log"))
-    if stages["make_temp_paths"]:
-        src.preprocess_experiment.preprocess(_config)
-        ex.add_artifact(os.path.join(c_results["output_path"], "preprocess.log"))
-    if stages["create_model"]:
-        min_likelihood = src.ex_create_model.create_model(_config, _run)
-        ex.add_artifact(os.path.join(c_results["output_path"], "preprocess.log"))
-    if stages["simulate"]:
-        src.run_experiment.my_main(_config, _run, min_likelihood)
-        ex.add_artifact(os.path.join(c_results["output_path"], "results.log"))
-        ex.add_artifact(os.path.join(c_results["output_path"], "results.csv"))
-
-    ex.add_artifact(os.path.join(c_results["output_path"], "general.log"))
+    instrumentation = Instrumentation()
+
+    # the measurements of the stages before a failing one are the ones needed most
+    try:
+        if stages["pull_data"]:
+            with instrumentation.stage("pull_data"):
+                src.get_data.get_dataset(_config)
+        if stages["analyze"]:
+            with instrumentation.stage("analyze") as record:
+                record["events"] = int(src.ex_analyze_data.analyze(_config).syscalls.sum())
+            ex.add_artifact(os.path.join(c_results["output_path"], "analyze.log"))
+        if stages["make_temp_paths"]:
+            with instrumentation.stage("make_temp_paths") as record:
+                record["events"] = src.preprocess_experiment.preprocess(_config)
+            ex.add_artifact(os.path.join(c_results["output_path"], "preprocess.log"))
+        if stages["create_model"]:
+            with instrumentation.stage("create_model") as record:
+                min_likelihood, record["events"] = src.ex_create_model.create_model(_config, _run)
+            ex.add_artifact(os.path.join(c_results["output_path"], "preprocess.log"))
+        if stages["update_model"]:
+            with instrumentation.stage("update_model") as record:
+                min_likelihood, record["events"] = src.ex_create_model.update_model(_config, _run)
+            ex.add_artifact(os.path.join(c_results["output_path"], "preprocess.log"))
+        if stages["simulate"]:
+            with instrumentation.stage("simulate") as record:
+                record["events"] = src.run_experiment.my_main(_config, _run, min_likelihood)
+            ex.add_artifact(os.path.join(c_results["output_path"], "results.log"))
+            ex.add_artifact(os.path.join(c_results["output_path"], "results.csv"))
+            for curve_file in ["pr_curve.csv", "roc_curve.csv", "curves.json", "curves.png"]:
+                ex.add_artifact(os.path.join(c_results["output_path"], curve_file))
+            ex.add_artifact(os.path.join(c_results["output_path"], "attributions.csv"))
+    finally:
+        instrumentation.log_scalars(_run)
+
+        ex.add_artifact(os.path.join(c_results["output_path"], "general.log"))
@@ -23,6 +23,8 @@
 #    E-mail: scholtes@ifi.uzh.ch
 #    Web:    http://www.ingoscholtes.net
 
+import numpy as np
+
 from pathpy.utils import Log, Severity
 from pathpy.classes import TemporalNetwork
 
@@ -76,29 +78,99 @@ class MyRollingTimeWindow:
         self.temporal_network = temporal_net
         self.window_size = window_size
         self.step_size = step_size
-        self.current_time = min(temporal_net.ordered_times)
-        self.max_time = max(temporal_net.ordered_times)
         self.directed = directed
         self.return_window = return_window
 
+        # sort the edges by time once, each window is then a contiguous slice of them
+        times = np.array([x[2] for x in temporal_net.tedges])
+        order = np.argsort(times, kind="stable")
+        self.tedges = [temporal_net.tedges[i] for i in order]
+
+        self.windows = ArrayRollingTimeWindow(
+            times[order], window_size, step_size=step_size, return_window=True
+        )
+        self.current_time = self.windows.current_time
+        self.max_time = self.windows.max_time
+
     def __iter__(self):
         return self
 
     def __next__(self):
-        if self.current_time + self.window_size <= self.max_time:
-            time_window = [self.current_time, self.current_time + self.window_size]
+        edges, time_window = next(self.windows)
+
+        net = TemporalNetwork(self.tedges[edges])
+
+        self.current_time = self.windows.current_time
+        if self.return_window:
+            return net, time_window
+        return net
+
+
+class ArrayRollingTimeWindow:
+    r"""
+    An iterable rolling time window over time-sorted arrays. Instead of networks it
+    yields slices into the arrays, so the data of a window can be accessed as a view.
+    """
+
+    def __init__(self, times, window_size, step_size=1, return_window=False):
+        r"""
+        Computes the start and end index of all windows with a binary search on the
+        sorted times. The windows are the same as for MyRollingTimeWindow, i.e. both
+        window boundaries are inclusive.
+
+        Parameters:
+        -----------
+        times:          numpy.ndarray
+            Sorted time stamps of the events.
+        window_size:    int
+            The width of the rolling time window.
+        step_size:      int
+            The step size in time units by which the starting time of the rolling
+            window will be incremented on each iteration. Default is 1.
+        return_window: bool
+            Whether or not the iterator shall return the current time window
+            as a second return value. Default is False.
+
+        Returns
+        -------
+        ArrayRollingTimeWindow
+            An iterable sequence of tuples slice, [window_start, window_end]
+        """
+        times = np.asarray(times)
+
+        self.window_size = window_size
+        self.step_size = step_size
+        self.return_window = return_window
+
+        if len(times):
+            self.current_time = times[0]
+            self.max_time = times[-1]
+            num_windows = max((self.max_time - self.current_time - window_size) // step_size + 1, 0)
+        else:
+            self.current_time = self.max_time = 0
+            num_windows = 0
+
+        self.starts = self.current_time + step_size * np.arange(num_windows, dtype=np.int64)
+        self.begin = np.searchsorted(times, self.starts, side="left")
+        self.end = np.searchsorted(times, self.starts + window_size, side="right")
+        self.position = 0
 
-            fitting_edges = [
-                x
-                for x in self.temporal_network.tedges
-                if self.current_time <= x[2] <= self.current_time + self.window_size
-            ]
+    def __len__(self):
+        return len(self.starts)
 
-            net = TemporalNetwork(fitting_edges)
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.position < len(self.starts):
+            start = int(self.starts[self.position])
+            time_window = [start, start + self.window_size]
+            edges = slice(int(self.begin[self.position]), int(self.end[self.position]))
 
+            self.position += 1
             self.current_time += self.step_size
             if self.return_window:
-                return net, time_window
-            return net
+                return edges, time_window
+            return edges
         else:
             raise StopIteration()
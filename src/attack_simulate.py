@@ -7,86 +7,248 @@ Description: Running a scenario with a trained model
 
 
 from datetime import datetime
+from functools import partial
+import time
 import logging
 import pandas as pd
 import numpy as np
 import pathpy
 
-from src.RollingTimeWindow import MyRollingTimeWindow
-from src.data_processing import generate_temporal_network, generate_paths_from_threads, parse_run_to_pandas
+from src.RollingTimeWindow import ArrayRollingTimeWindow
+from src.event_store import EventStore
+from src.likelihood import (
+    TransitionLogProbs,
+    IncrementalScorer,
+    CompiledModel,
+    iter_window_log_likelihoods,
+    window_attribution,
+)
+from src.parse_cache import load_events
+from src.path_counts import temporal_paths
 
 
-def trial_scenario(model, run: str, time_delta: int, window_size: int):
-    """Runs a run with a moving time window to simulate a running host intrusion detection.
+# model and settings of a simulation worker process, set once by init_simulation
+_simulation = {}
+
+
+def init_simulation(
+    compiled: str,
+    time_delta: int,
+    window_size: int,
+    cache_dir=None,
+    threshold=None,
+    early_exit=False,
+):
+    """Initializer of a pool of simulation workers.
+
+    Every worker memory-maps the tables of the compiled model read-only, so the operating system
+    shares their pages between all workers and only the path of a run is sent per task.
+
+    Parameters
+    ----------
+    compiled : str
+        directory of the compiled model
+    time_delta : int
+    window_size : int
+    cache_dir : str
+    threshold : float
+    early_exit : bool
+        see trial_scenario
+    """
+
+    _simulation["model"] = CompiledModel.load(compiled, mmap_mode="r")
+    _simulation["time_delta"] = time_delta
+    _simulation["window_size"] = window_size
+    _simulation["cache_dir"] = cache_dir
+    _simulation["threshold"] = threshold
+    _simulation["early_exit"] = early_exit
+
+
+def simulate_run(run: str):
+    """Runs trial_scenario in a worker set up by init_simulation.
 
     Parameters
     ----------
-    model : pathpy.HigherOrderNetwork
-        Created from regular training data
     run : str
         The path to the run to be evaluated
+
+    Returns
+    -------
+    dict
+        see trial_scenario
+    """
+
+    return trial_scenario(
+        _simulation["model"],
+        run,
+        _simulation["time_delta"],
+        _simulation["window_size"],
+        _simulation["cache_dir"],
+        _simulation["threshold"],
+        _simulation["early_exit"],
+    )
+
+
+def trial_scenario(
+    model,
+    run: str,
+    time_delta: int,
+    window_size: int,
+    cache_dir=None,
+    threshold=None,
+    early_exit=False,
+    top_k=5,
+):
+    """Runs a run with a moving time window to simulate a running host intrusion detection.
+
+    Parameters
+    ----------
+    model : pathpy.MultiOrderModel or src.likelihood.CompiledModel
+        Created from regular training data
+    run : str or src.event_store.EventStore
+        The path to the run to be evaluated or its already parsed events
     time_delta : int
         Time-delta between syscalls in milliseconds to be considered a path. If time_delta is zero,
         then the paths will be extracted based on same threads.
     window_size : int
         Time in milliseconds which is evaluated
+    cache_dir : str
+        Location of the parse cache, if None the run is parsed
+    threshold : float
+        likelihood threshold, the end of the first window below it is the detection time
+    early_exit : bool
+        stop scoring the run at the first window below the threshold
+    top_k : int
+        number of transitions explaining the first window below the threshold
+
+    Returns
+    -------
+    results : dict
+        run, likelihoods, transitions and start time of the windows, the detection time (None if
+        the run was not flagged) with the top_k least likely transitions of the flagged window as
+        attribution (thread paths only), and the timing of the run with the number of events and
+        windows, and the seconds spent on parsing and scoring
     """
 
     results_logger = logging.getLogger("hids.results")
     results_logger.debug(f"Starting simulation with {run}")
 
-    temp_net = generate_temporal_network(run)
-    windows = MyRollingTimeWindow(temp_net, window_size, step_size=100000, return_window=True)
+    begin = time.perf_counter()
+
+    if isinstance(run, EventStore):
+        events = run
+        run = events.path
+    else:
+        events = load_events(run, cache_dir)
+
+    parse_time = time.perf_counter() - begin
+    begin = time.perf_counter()
 
-    if time_delta == 0:
-        run_data = parse_run_to_pandas(run)
+    # the temporal network has an edge from each syscall to the next one at its time
+    order = np.argsort(events.time[:-1], kind="stable")
+    edge_times = events.time[:-1][order]
+
+    windows = ArrayRollingTimeWindow(edge_times, window_size, step_size=100000, return_window=True)
+
+    if time_delta == 0 and isinstance(model, CompiledModel):
+        # windows are scored in batches, the loop below only collects the results
+        batch = iter_window_log_likelihoods(model, events, windows.starts, window_size)
+    elif time_delta == 0:
+        scorer = IncrementalScorer(TransitionLogProbs(model), events)
+    else:
+        sources = events.syscall[order]
+        targets = events.syscall[order + 1]
 
     likelihoods = []
     transitions = []
-    time = []
+    window_starts = []
+    detection_time = None
+    attribution = None
+
+    for edges, window in windows:
 
-    for net, window in windows:
+        scored = len(likelihoods)
 
         try:
-            if time_delta == 0:
-                paths = generate_paths_from_threads(run_data, window)
+            if time_delta == 0 and isinstance(model, CompiledModel):
+                total_transitions, window_log_likelihood = next(batch)
+                total_transitions = int(total_transitions)
+                log_likelihood = partial(observed_log_likelihood, window_log_likelihood)
+            elif time_delta == 0:
+                total_transitions = scorer.move(*window)
+                log_likelihood = scorer.log_likelihood
             else:
-                paths = pathpy.path_extraction.paths_from_temporal_network_single(
-                    net, delta=time_delta, max_subpath_length=4
+                paths = temporal_paths(
+                    sources[edges], targets[edges], edge_times[edges], time_delta, 4
                 )
 
-            total_transitions = 0
-
-            if paths.paths:
-
-                total_transitions = compute_total_transitions(paths)
+                total_transitions = compute_total_transitions(paths) if paths.paths else 0
+                log_likelihood = partial(model.likelihood, paths, log=True)
 
-                # TODO: arbitrary threshold, put more thoughts into this
-                if total_transitions > 3:
+            # TODO: arbitrary threshold, put more thoughts into this
+            if total_transitions > 3:
 
-                    time.append(window[0])
+                window_starts.append(window[0])
 
-                    # divide probability by number of transitions
-                    likelihood = model.likelihood(paths, log=True) - np.log(total_transitions)
-                    likelihoods.append(likelihood)
+                # divide probability by number of transitions
+                likelihood = log_likelihood() - np.log(total_transitions)
+                likelihoods.append(likelihood)
 
         except AttributeError as e:
             results_logger.info(f"Skipping ending at {window[1]} as no events...")
             likelihoods.append(-110)
-            continue
         except KeyError as e:
             results_logger.info(f"Key {e} not found... Setting Likelihood to zero.")
             likelihoods.append(-100)
+            transitions.append(total_transitions)
         except pathpy.utils.exceptions.PathpyException as e:
             results_logger.info(f"{e}... Setting Likelihood to 0")
             likelihoods.append(0)
+            transitions.append(total_transitions)
+        else:
+            transitions.append(total_transitions)
 
-        transitions.append(total_transitions)
+        if threshold is not None and detection_time is None and len(likelihoods) > scored:
+            if likelihoods[-1] < threshold:
+                detection_time = window[1]
+                if time_delta == 0 and isinstance(model, CompiledModel):
+                    attribution = window_attribution(model, events, *window, top_k)
+                elif time_delta == 0:
+                    attribution = scorer.window.attribution(scorer.log_probs, top_k)
+                if early_exit:
+                    break
 
-    results = {"run": run, "likelihoods": likelihoods, "transitions": transitions, "time": time}
+    timing = {
+        "events": len(events),
+        "windows": len(transitions),
+        "parse_time": parse_time,
+        "scoring_time": time.perf_counter() - begin,
+    }
+
+    results = {
+        "run": run,
+        "likelihoods": likelihoods,
+        "transitions": transitions,
+        "time": window_starts,
+        "detection_time": detection_time,
+        "attribution": attribution,
+        "timing": timing,
+    }
     return results
 
 
+def observed_log_likelihood(log_likelihood):
+    """Raises like the pathpy model for windows with nodes not seen in training (NaN)."""
+
+    if np.isnan(log_likelihood):
+        raise pathpy.utils.exceptions.PathpyNotImplemented(
+            "A path segment of the window has not been observed and therefore the likelihood "
+            "cannot be computed."
+        )
+
+    return log_likelihood
+
+
 def compute_total_transitions(paths):
     """Computes the total number of nodes
 
@@ -8,8 +8,9 @@ import os
 import sys
 import operator
 import subprocess
-from functools import reduce
-from collections import Counter
+import multiprocessing
+from functools import reduce, partial
+from collections import Counter, namedtuple
 
 import yaml
 import pandas as pd
@@ -20,9 +21,17 @@ import pathpy
 import logging
 
 
-def process_raw_temporal_dataset(runs, time_delta):
+# increase whenever parse_run or the EventStore layout changes, invalidates the parse cache
+PARSER_VERSION = 1
+
+
+def process_raw_temporal_dataset(runs, time_delta, cache_dir=None, processes=1, chunksize=4):
     """Generates pathpy ready dataset out of raw data
 
+    The runs are processed by a pool of worker processes. Every worker returns the paths of its run
+    as compact integer count tables which are summed in a single pass at the end, instead of
+    adding up the pathpy.Paths objects one by one.
+
     Parameters
     ----------
     runs : pandas.dataframe
@@ -30,39 +39,72 @@ def process_raw_temporal_dataset(runs, time_delta):
     time_delta : int
         Indicates the time-difference threshold for generating a valid path. If time_delta is zero,
         the thread information will be used to split the paths.
+    cache_dir : str
+        Location of the parse cache, if None every run is parsed
+    processes : int
+        Number of worker processes, with 1 the runs are processed in this process
+    chunksize : int
+        Runs handed to a worker at once
 
     Returns
     -------
     data : pathpy.path
     """
 
-    total = len(runs)
+    return extract_dataset_counts(runs, time_delta, cache_dir, processes, chunksize).to_paths()
 
-    def report(i):
-        i % 10 == 0 and print(f"Processed {i} logs of {total}")
 
-    if time_delta != 0:
+def extract_dataset_counts(runs, time_delta, cache_dir=None, processes=1, chunksize=4, store=None):
+    """The paths of all runs as count tables, see process_raw_temporal_dataset.
 
-        normal_graphs = [
-            report(i) or generate_temporal_network(scenario)
-            for i, scenario in enumerate(runs["path"])
-        ]
-        print(f"Extracting temporal valid paths with time_delta {time_delta} out of {total} runs.")
-        paths = [
-            pathpy.path_extraction.paths_from_temporal_network_single(
-                net, delta=time_delta, max_subpath_length=3
-            )
-            for net in normal_graphs
-        ]
+    Parameters
+    ----------
+    store : src.path_counts.CountStore
+        if given, the tables of the runs are summed on disk one by one instead of in memory
 
+    Returns
+    -------
+    src.path_counts.PathCounts
+        memory-mapped if a store is given
+    """
+
+    # imported here as src.path_counts builds on this module
+    from src.path_counts import PathCounts, extract_path_counts
+
+    total = len(runs)
+
+    if time_delta != 0:
+        print(f"Extracting temporal valid paths with time_delta {time_delta} out of {total} runs.")
     else:
         print(f"Time delta was 0, therefore using thread info to extract valid paths.")
-        paths = [
-            report(i) or generate_paths_from_threads(parse_run_to_pandas(run))
-            for i, run in enumerate(runs["path"])
-        ]
 
-    return reduce(operator.add, paths)
+    extract = partial(extract_path_counts, time_delta=time_delta, cache_dir=cache_dir)
+
+    merge = PathCounts.merge if store is None else partial(merge_into_store, store)
+
+    if processes > 1 and total > 1:
+        with multiprocessing.Pool(min(processes, total)) as pool:
+            tables = report_progress(pool.imap(extract, runs["path"], chunksize), total)
+            return merge(tables)
+
+    return merge(report_progress(map(extract, runs["path"]), total))
+
+
+def merge_into_store(store, tables):
+    """Adds the tables to the store as they arrive and returns the sum."""
+
+    for table in tables:
+        store.add(table)
+
+    return store.finish()
+
+
+def report_progress(tables, total):
+    """Passes the tables through while printing the progress every ten runs."""
+
+    for i, table in enumerate(tables):
+        i % 10 == 0 and print(f"Processed {i} logs of {total}")
+        yield table
 
 
 def get_runs(path: str, selector=None):
@@ -122,13 +164,13 @@ def parse_syscall(syscall):
     return parsed_syscall
 
 
-def generate_temporal_network(path: str):
+def generate_temporal_network(run):
     """Temporal network with pathpy
 
     Parameters
     ----------
-    path : str
-        The log-file
+    run : str, ParsedRun or src.event_store.EventStore
+        The log-file, its already parsed content or the encoded events
 
     Returns
     -------
@@ -136,28 +178,10 @@ def generate_temporal_network(path: str):
 
     """
 
-    format_string = "%H:%M:%S.%f"
-
-    def parse_timestamps(time: str):
-        return datetime.strptime(time[:-3], format_string)
-
-    def normalize_time(time):
-        return round((time - start_time).total_seconds() * 1000000)
-
-    with open(path) as raw_file:
-        syscalls = raw_file.readlines()
-
-    syscalls = [parse_syscall(syscall.strip()) for syscall in syscalls]
-    syscalls = [syscall for syscall in syscalls if syscall[6] == "<"]
+    time, _, syscall = exit_events(run)
+    event_types = syscall.tolist()
 
-    event_types = [syscall[7] for syscall in syscalls]
-
-    timestamps = [parse_timestamps(syscall[1]) for syscall in syscalls]
-    start_time = timestamps[0]
-
-    timestamps = [normalize_time(time) for time in timestamps]
-
-    transitions = list(zip(event_types, event_types[1:], timestamps))
+    transitions = list(zip(event_types, event_types[1:], time.tolist()))
 
     return pathpy.TemporalNetwork(transitions)
 
@@ -167,7 +191,7 @@ def generate_paths_from_threads(run_data, start_end_time=None):
 
     Parameters
     ----------
-    run_data : pandas.Dataframe
+    run_data : pandas.Dataframe or ThreadIndex
         single run log
     start_end_time: pair(int, int)
         if specified defines the time window
@@ -181,20 +205,155 @@ def generate_paths_from_threads(run_data, start_end_time=None):
     paths = pathpy.Paths()
     paths.max_subpath_length = 4
 
-    if start_end_time is not None:
-        run_data = run_data.loc[
-            (run_data["time"] >= start_end_time[0]) & (run_data["time"] < start_end_time[1])
-        ]
+    if not isinstance(run_data, ThreadIndex):
+        run_data = ThreadIndex.from_frame(run_data)
 
-    for _, thread_data in run_data.groupby("thread_id"):
-        paths.add_path(thread_data["syscall"].to_list())
+    if start_end_time is None:
+        thread_paths = run_data.window()
+    else:
+        thread_paths = run_data.window(*start_end_time)
+
+    for path in thread_paths:
+        paths.add_path(run_data.syscall_names[path].tolist())
 
     return paths
 
 
-def parse_run_to_pandas(run_file: str):
+class ThreadIndex(object):
+    """The syscalls of a run sorted by thread and time, with the offset of every thread.
+
+    The syscalls of a thread inside a time window are found with a binary search, so extracting
+    the thread paths of a window needs no DataFrame. Syscalls are kept as integer codes into
+    syscall_names.
+    """
+
+    # bits for the time inside a thread in the combined sort key, about 12 days in microseconds
+    TIME_BITS = 40
+
+    def __init__(self, time, thread_id, syscall, syscall_names):
+        """
+        Parameters
+        ----------
+        time : numpy.ndarray of int
+        thread_id : numpy.ndarray of int
+        syscall : numpy.ndarray of int
+            index into syscall_names
+        syscall_names : numpy.ndarray of str
+        """
+        super(ThreadIndex, self).__init__()
+
+        time = np.asarray(time, dtype=np.int64)
+        thread_id = np.asarray(thread_id)
+
+        # stable, so syscalls at the same time keep their order in the log
+        order = np.lexsort((time, thread_id))
+
+        self.thread_id, self.offsets = np.unique(thread_id[order], return_index=True)
+        self.offsets = np.append(self.offsets, len(order))
+        self.time = time[order]
+        self.syscall = np.asarray(syscall)[order]
+        self.syscall_names = np.asarray(syscall_names, dtype=object)
+
+        self.min_time = int(self.time.min()) if len(self.time) else 0
+        if len(self.time) and self.time.max() - self.min_time >= 1 << self.TIME_BITS:
+            raise ValueError("The run is too long for a ThreadIndex")
+
+        rank = np.repeat(np.arange(len(self.thread_id)), np.diff(self.offsets))
+        self.keys = (rank << self.TIME_BITS) | (self.time - self.min_time)
+
+    @classmethod
+    def from_frame(cls, run_data):
+        """Creates the index out of the DataFrame of parse_run_to_pandas."""
+
+        syscall, syscall_names = pd.factorize(run_data["syscall"])
+
+        return cls(
+            run_data["time"].to_numpy(), run_data["thread_id"].to_numpy(), syscall, syscall_names
+        )
+
+    @classmethod
+    def from_events(cls, run):
+        """Creates the index out of a log-file, ParsedRun or src.event_store.EventStore."""
+
+        time, thread_id, syscall = exit_events(run)
+        syscall, syscall_names = pd.factorize(syscall)
+
+        return cls(time, thread_id, syscall, syscall_names)
+
+    def __len__(self):
+        return len(self.time)
+
+    def window(self, start=None, end=None):
+        """The syscalls of every thread with start <= time < end.
+
+        Parameters
+        ----------
+        start : int
+        end : int
+
+        Returns
+        -------
+        list of numpy.ndarray of int
+            syscall codes per thread with at least one syscall in the window, ordered by thread
+        """
+
+        if start is None and end is None:
+            begin, end = self.offsets[:-1], self.offsets[1:]
+        else:
+            begin = self.thread_bounds(start, self.offsets[:-1])
+            end = self.thread_bounds(end, self.offsets[1:])
+
+        return [self.syscall[b:e] for b, e in zip(begin.tolist(), end.tolist()) if e > b]
+
+    def thread_bounds(self, time, default):
+        """Index of the first syscall of every thread at or after time."""
+
+        if time is None:
+            return default
+
+        time = min(max(time - self.min_time, 0), (1 << self.TIME_BITS) - 1)
+        rank = np.arange(len(self.thread_id), dtype=np.int64)
+
+        return np.searchsorted(self.keys, (rank << self.TIME_BITS) | time, side="left")
+
+
+def parse_run_to_pandas(run):
     """Extracts the data from a single run.
 
+    Parameters
+    ----------
+    run : str, ParsedRun or src.event_store.EventStore
+        path to the file, its already parsed content or the encoded events
+
+    Returns
+    -------
+    run_data : pandas.Dataframe
+    """
+
+    time, thread_id, syscall = exit_events(run)
+
+    run_data = pd.DataFrame({"time": time, "thread_id": thread_id, "syscall": syscall})
+
+    return run_data
+
+
+ParsedRun = namedtuple("ParsedRun", ["time", "thread_id", "direction", "syscall", "syscall_names"])
+ParsedRun.__doc__ = """Columnar content of a single run.
+
+    time : numpy.ndarray of int64, microseconds since midnight
+    thread_id : numpy.ndarray of int64
+    direction : numpy.ndarray of bytes, b">" for syscall entry and b"<" for return
+    syscall : numpy.ndarray of int, index into syscall_names
+    syscall_names : numpy.ndarray of str
+"""
+
+
+def parse_run(run_file: str):
+    """Reads a single run once into columnar numpy arrays.
+
+    Only the columns needed by the pipelines are read (C parser of pandas) and the timestamps are
+    converted to integer microseconds with vectorized arithmetic on the fixed width time strings.
+
     Parameters
     ----------
     run_file : str
@@ -202,33 +361,117 @@ def parse_run_to_pandas(run_file: str):
 
     Returns
     -------
-    run_data : pandas.Dataframe
+    ParsedRun
     """
 
     logger = logging.getLogger("hids.preprocess")
     logger.debug("Currently working on %s", run_file)
 
-    parser = lambda time_str: datetime.strptime(time_str[:-3], "%H:%M:%S.%f")
-
     run_data = pd.read_csv(
         run_file,
         delim_whitespace=True,
         usecols=[1, 5, 6, 7],
         names=["time", "thread_id", "dir", "syscall"],
-        parse_dates=["time"],
-        date_parser=parser,
+        dtype={"time": str, "thread_id": np.int64, "dir": str, "syscall": str},
         quoting=3,
     )
 
-    run_data = run_data[run_data["dir"] == "<"]
-    run_data = run_data.drop("dir", axis=1)
+    syscall, syscall_names = pd.factorize(run_data["syscall"])
+
+    return ParsedRun(
+        time=parse_timestamps(run_data["time"].to_numpy()),
+        thread_id=run_data["thread_id"].to_numpy(),
+        direction=run_data["dir"].to_numpy().astype("S1"),
+        syscall=syscall,
+        syscall_names=np.asarray(syscall_names, dtype=object),
+    )
+
 
-    run_data.reset_index()
+def parse_timestamps(times):
+    """Converts sysdig timestamps of the form HH:MM:SS.nnnnnnnnn to microseconds since midnight.
+
+    The nanoseconds are truncated to microseconds, the same as parsing time[:-3] with strptime.
+
+    Parameters
+    ----------
+    times : numpy.ndarray of str
+
+    Returns
+    -------
+    numpy.ndarray of int64
+    """
 
-    # convert datetime to microseconds
-    run_data["time"] -= run_data["time"].iat[0]
-    run_data["time"] = run_data["time"].apply(
-        lambda my_time: round(my_time.total_seconds() * 1000000)
+    width = 18
+
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    raw = np.asarray(times).astype(f"S{width}")
+
+    if not (np.char.str_len(raw) == width).all():
+        raise ValueError("Timestamps are expected in the format HH:MM:SS.nnnnnnnnn")
+
+    digits = raw.view(np.uint8).reshape(-1, width).astype(np.int64) - ord("0")
+
+    def number(start, end):
+        result = np.zeros(len(digits), dtype=np.int64)
+        for i in range(start, end):
+            result = result * 10 + digits[:, i]
+        return result
+
+    hours = number(0, 2)
+    minutes = number(3, 5)
+    seconds = number(6, 8)
+    microseconds = number(9, 15)
+
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000000 + microseconds
+
+
+def parse_timestamp(time: str):
+    """Converts a single sysdig timestamp to microseconds since midnight, see parse_timestamps.
+
+    Parameters
+    ----------
+    time : str
+
+    Returns
+    -------
+    int
+    """
+
+    return ((int(time[0:2]) * 60 + int(time[3:5])) * 60 + int(time[6:8])) * 1000000 + int(
+        time[9:15]
     )
 
-    return run_data
+
+def exit_events(run):
+    """Returns the syscall returns of a run with the time relative to the first one.
+
+    Parameters
+    ----------
+    run : str, ParsedRun or src.event_store.EventStore
+        path to the file, its already parsed content or the encoded events
+
+    Returns
+    -------
+    time : numpy.ndarray of int64
+        microseconds since the first event
+    thread_id : numpy.ndarray of int
+    syscall : numpy.ndarray of str
+    """
+
+    if isinstance(run, str):
+        run = parse_run(run)
+
+    if not isinstance(run, ParsedRun):
+        # an EventStore only holds the syscall returns, decoded at this edge
+        return run.time, run.thread_id, run.syscall_names()
+
+    mask = run.direction == b"<"
+
+    time = run.time[mask]
+
+    if len(time):
+        time = time - time[0]
+
+    return time, run.thread_id[mask], run.syscall_names[run.syscall[mask]]
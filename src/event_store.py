@@ -0,0 +1,202 @@
+"""
+File: event_store.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Compact integer encoded storage of the syscalls of a single run
+"""
+
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from src.data_processing import parse_run
+from src.utils import create_bidict
+
+
+SYSCALL_TABLE = os.path.join(os.path.dirname(__file__), "..", "references", "syscalls.txt")
+
+UNKNOWN_SYSCALL = "unknown"
+
+UNMAPPED_SYSCALL = "unmapped"
+
+
+@lru_cache(maxsize=None)
+def default_syscall_map(path: str = SYSCALL_TABLE):
+    """Returns the syscall <-> integer mapping with entries for unknown and unmapped syscalls.
+
+    Parameters
+    ----------
+    path : str
+        Location of the syscall table
+
+    Returns
+    -------
+    bidict.bidict
+    """
+
+    syscall_map = create_bidict(path)
+
+    for name in [UNKNOWN_SYSCALL, UNMAPPED_SYSCALL]:
+        if name not in syscall_map:
+            syscall_map[name] = len(syscall_map)
+
+    return syscall_map
+
+
+class EventStore(object):
+    """Syscall returns of a single run held as contiguous typed arrays.
+
+    The syscalls are encoded with the syscall table, names are only decoded at the edges when
+    pathpy or pandas need them. Syscalls not contained in the table are logged and encoded as
+    'unmapped'.
+    """
+
+    def __init__(self, time, thread_id, syscall, path=None, syscall_map=None):
+        """
+        Parameters
+        ----------
+        time : array_like
+            microseconds since the first syscall return
+        thread_id : array_like
+        syscall : array_like
+            syscall ids according to syscall_map
+        path : str
+            the recording the events were read from
+        syscall_map : bidict.bidict
+            mapping between syscall names and ids, defaults to references/syscalls.txt
+        """
+        super(EventStore, self).__init__()
+
+        self.time = np.ascontiguousarray(time, dtype=np.int64)
+        self.thread_id = np.ascontiguousarray(thread_id, dtype=np.int32)
+        self.syscall = np.ascontiguousarray(syscall, dtype=np.uint16)
+        self.path = path
+        self.syscall_map = default_syscall_map() if syscall_map is None else syscall_map
+
+    @classmethod
+    def from_parsed(cls, parsed_run, path=None, syscall_map=None):
+        """Creates the store out of a ParsedRun.
+
+        Parameters
+        ----------
+        parsed_run : src.data_processing.ParsedRun
+        path : str
+        syscall_map : bidict.bidict
+
+        Returns
+        -------
+        EventStore
+        """
+
+        syscall_map = default_syscall_map() if syscall_map is None else syscall_map
+
+        mask = parsed_run.direction == b"<"
+
+        time = parsed_run.time[mask]
+        if len(time):
+            time = time - time[0]
+
+        # encode the few unique names once and gather the ids for all events
+        lookup = encode_syscalls(parsed_run.syscall_names, syscall_map)
+
+        missing = [name for name in parsed_run.syscall_names if name not in syscall_map]
+        if missing:
+            logging.getLogger("hids.preprocess").warning(
+                "Syscalls %s of %s are encoded as '%s'", missing, path, UNMAPPED_SYSCALL
+            )
+
+        return cls(
+            time,
+            parsed_run.thread_id[mask],
+            lookup[parsed_run.syscall[mask]],
+            path=path,
+            syscall_map=syscall_map,
+        )
+
+    @classmethod
+    def from_file(cls, path: str, syscall_map=None):
+        """Parses a recording into an EventStore.
+
+        Parameters
+        ----------
+        path : str
+            the log-file
+        syscall_map : bidict.bidict
+
+        Returns
+        -------
+        EventStore
+        """
+
+        return cls.from_parsed(parse_run(path), path=path, syscall_map=syscall_map)
+
+    def __len__(self):
+        return len(self.time)
+
+    def __repr__(self):
+        return f"EventStore({self.path!r}, events={len(self)}, nbytes={self.nbytes})"
+
+    @property
+    def nbytes(self):
+        """Memory used by the event arrays in bytes."""
+        return self.time.nbytes + self.thread_id.nbytes + self.syscall.nbytes
+
+    def syscall_names(self):
+        """Decodes the syscall ids to names.
+
+        Returns
+        -------
+        numpy.ndarray of str
+        """
+
+        return decode_syscalls(self.syscall, self.syscall_map)
+
+
+def encode_syscalls(names, syscall_map=None):
+    """Maps syscall names to ids, names missing in the mapping are encoded as 'unmapped'.
+
+    Training data, models and the input of a fitted model are all encoded this way, so the syscalls
+    missing in the table are a node of the model like any other syscall. It is a different node
+    than 'unknown', which a model with prior uses for the syscalls never seen in training.
+
+    Parameters
+    ----------
+    names : iterable of str
+    syscall_map : bidict.bidict
+
+    Returns
+    -------
+    numpy.ndarray of uint16
+    """
+
+    syscall_map = default_syscall_map() if syscall_map is None else syscall_map
+    unmapped = syscall_map[UNMAPPED_SYSCALL]
+
+    return np.array([syscall_map.get(name, unmapped) for name in names], dtype=np.uint16)
+
+
+def decode_syscalls(ids, syscall_map=None):
+    """Maps syscall ids back to their names.
+
+    Parameters
+    ----------
+    ids : numpy.ndarray of int
+    syscall_map : bidict.bidict
+
+    Returns
+    -------
+    numpy.ndarray of str
+    """
+
+    syscall_map = default_syscall_map() if syscall_map is None else syscall_map
+
+    return _name_table(syscall_map)[ids]
+
+
+def _name_table(syscall_map):
+    names = np.empty(max(syscall_map.inverse) + 1, dtype=object)
+    for syscall_id, name in syscall_map.inverse.items():
+        names[syscall_id] = name
+    return names
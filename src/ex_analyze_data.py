@@ -12,118 +12,164 @@ import pandas as pd
 import dotenv
 import numpy as np
 from matplotlib import pyplot as plt
-from scipy import stats
 
 import sacred
 
-from src.data_processing import generate_temporal_network, get_runs
+from src.data_processing import get_runs
 from src.preprocess_experiment import create_train_test_split
+from src.trace_statistics import dataset_statistics
 from src.utils import config_adapt
 
 
 def analyze(config):
-    def report(i):
-        i % 10 == 0 and print(f"Processed {i} logs of {total}")
+    """Statistics of the inter-event times and syscalls of the training runs.
+
+    Parameters
+    ----------
+    config : dict
+        main config dict generates from the corresponding file
+
+    Returns
+    -------
+    src.trace_statistics.TraceStatistics
+    """
 
     logger = logging.getLogger("hids.analyze")
 
     train, _ = create_train_test_split(config["data"]["runs"], config["model"]["train_examples"])
     runs = get_runs(config["data"]["runs"], train)
 
-    total = len(runs)
-
-    normal_graphs = [
-        report(i) or generate_temporal_network(scenario, None)
-        for i, scenario in enumerate(runs["path"])
-    ]
+    statistics = dataset_statistics(runs, config["data"]["cache"], config["simulate"]["cpu_count"])
 
     save_path = os.path.join(config["analyze"]["figures"], f'{config["dataset"]}_time_analyze.png')
 
-    inter_event_times_all = analyze_time(normal_graphs, save_path)
-
-    statistics = stats.describe(inter_event_times_all)
+    analyze_time(statistics, save_path)
 
     logger.debug("runs for training")
     logger.debug(runs)
 
     logger.info("Summary time statistics")
     logger.info("")
-    logger.info(statistics)
+    logger.info(pformat(statistics.summary()))
+    logger.info("Most frequent syscalls")
+    logger.info(pformat(statistics.most_frequent_syscalls()))
+
+    return statistics
+
 
+def analyze_time(statistics, save_path=None):
+    """Plots the histograms of the inter-event times, their mean and maximum per run, the syscall
+    rates of the threads and the most frequent syscalls.
 
-def analyze_time(temporal_nets, save_path=None):
+    The inter-event times are binned logarithmically, the linear histogram of the 90 percentile
+    redistributes these bins and is exact up to the width of a log bin.
 
-    multi = [x.inter_event_times().flatten() for x in temporal_nets]
-    means = [x.mean() / 1000.0 for x in multi]
-    max_times = [x.max() / 1000000.0 for x in multi]
-    multi = np.concatenate(multi)
+    Parameters
+    ----------
+    statistics : src.trace_statistics.TraceStatistics
+    save_path : str
+    """
 
-    observation_lengths = [x.observation_length() for x in temporal_nets]
+    histogram = statistics.histogram
+    edges = histogram.edges
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    weights = 100 * histogram.counts / max(histogram.total, 1)
+
+    means = statistics.run_means / 1000.0
+    max_times = statistics.run_maxima / 1000000.0
 
     plt.tight_layout()
     # these are my measurements, unsorted
-    fig = plt.figure(figsize=(8, 20))
+    fig = plt.figure(figsize=(8, 30))
     fig.subplots_adjust(hspace=0.3)
 
-    plt.subplot(411)
+    plt.subplot(611)
+    percentile_99 = histogram.percentile(99)
     plt.hist(
-        multi,
-        bins=np.logspace(np.log10(1), np.log10(np.percentile(multi, 99)), 50),
-        weights=100 * np.ones(len(multi)) / len(multi),
+        centers,
+        bins=edges[: np.searchsorted(edges, percentile_99) + 1],
+        weights=weights,
         color="blue",
         edgecolor="black",
         alpha=0.5,
-        range=(0, np.percentile(multi, 99)),
     )
     plt.gca().set_xscale("log")
     plt.title("Histogram Time Differences (Log)")
     plt.xlabel("Time differences [$\mu s$]")
     plt.ylabel("Percentage [%]")
 
-    plt.subplot(412)
+    plt.subplot(612)
     plt.hist(
-        multi,
+        centers,
         bins=50,
-        weights=100 * np.ones(len(multi)) / len(multi),
+        weights=weights,
         color="blue",
         edgecolor="black",
         alpha=0.5,
-        range=(0, np.percentile(multi, 90)),
+        range=(0, histogram.percentile(90)),
     )
     plt.title("Histogram Time Differences of 90 percentile")
     plt.xlabel("Time differences [$\mu s$]")
     plt.ylabel("Percentage [%]")
 
-    plt.subplot(413)
-    plt.hist(
-        means,
-        bins=50,
-        weights=100 * np.ones(len(means)) / len(means),
-        color="blue",
-        edgecolor="black",
-        alpha=0.5,
-        range=(0, np.percentile(means, 99)),
-    )
+    # runs, threads or syscalls may be missing, e.g. when all runs are empty
+    plt.subplot(613)
+    if len(means):
+        plt.hist(
+            means,
+            bins=50,
+            weights=100 * np.ones(len(means)) / len(means),
+            color="blue",
+            edgecolor="black",
+            alpha=0.5,
+            range=(0, np.percentile(means, 99)),
+        )
     plt.title("Histogram Mean Time Difference")
     plt.xlabel("Mean time differences [ms]")
     plt.ylabel("Percentage [%]")
 
-    plt.subplot(414)
-    plt.hist(
-        max_times,
-        bins=50,
-        weights=100 * np.ones(len(means)) / len(means),
-        color="blue",
-        edgecolor="black",
-        alpha=0.5,
-        range=(0, np.percentile(max_times, 99)),
-    )
+    plt.subplot(614)
+    if len(max_times):
+        plt.hist(
+            max_times,
+            bins=50,
+            weights=100 * np.ones(len(max_times)) / len(max_times),
+            color="blue",
+            edgecolor="black",
+            alpha=0.5,
+            range=(0, np.percentile(max_times, 99)),
+        )
     plt.title("Histogram Maximum Time Difference")
     plt.xlabel("Maximum time differences [s]")
     plt.ylabel("Percentage [%]")
 
+    plt.subplot(615)
+    rates = statistics.thread_rates[statistics.thread_rates > 0]
+    if len(rates):
+        plt.hist(
+            rates,
+            bins=np.logspace(np.log10(rates.min()), np.log10(rates.max()) + 1e-9, 50),
+            weights=100 * np.ones(len(rates)) / len(rates),
+            color="blue",
+            edgecolor="black",
+            alpha=0.5,
+        )
+        plt.gca().set_xscale("log")
+    plt.title(f"Histogram Syscall Rate per Thread (Burstiness {statistics.burstiness:.2f})")
+    plt.xlabel("Syscalls per second")
+    plt.ylabel("Percentage [%]")
+
+    plt.subplot(616)
+    frequent = statistics.most_frequent_syscalls()
+    if frequent:
+        names, counts = zip(*frequent)
+        plt.bar(names, 100 * np.array(counts) / statistics.syscalls.sum(), color="blue", alpha=0.5)
+        plt.xticks(rotation=90)
+    plt.title("Most Frequent Syscalls")
+    plt.ylabel("Percentage [%]")
+
     if save_path:
         os.makedirs(os.path.dirname(save_path), exist_ok=True)
         plt.savefig(save_path, bbox_inches="tight")
 
-    return multi
+    plt.close(fig)
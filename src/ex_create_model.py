@@ -1,9 +1,11 @@
 import os
+import json
 from datetime import datetime
 import pprint
 import glob
 import logging
 import pickle
+import argparse
 from pprint import pformat
 import sys
 import yaml
@@ -11,13 +13,17 @@ import pathpy
 import pandas as pd
 import dotenv
 import multiprocessing
+from functools import partial
 
 import sacred
 
-from src.data_processing import process_raw_temporal_dataset, get_runs
-from src.preprocess_experiment import create_train_test_split
-from src.attack_simulate import trial_scenario
+from src.data_processing import extract_dataset_counts, get_runs
+from src.preprocess_experiment import create_train_test_split, save_training_runs
+from src.attack_simulate import init_simulation, simulate_run
 from src.scenario_analyzer import ScenarioAnalyzer
+from src.event_store import UNKNOWN_SYSCALL
+from src.likelihood import CompiledModel, compile_model
+from src.path_counts import PathCounts, CountStore, truncate_model
 from src.utils import config_adapt
 
 
@@ -35,51 +41,207 @@ def create_model(config, sacred_run):
     -------
     min_likelihood : float
         likelihood threshold for detecting attacks
+    transitions : int
+        number of syscalls the model was fitted to
     """
 
     model = config["model"]
     data = config["data"]
-    simulate = config["simulate"]
 
     logger = logging.getLogger("hids.preprocess")
 
-    paths = pickle.load(open(model["paths"], "rb"))
+    counts = PathCounts.load(model["paths"], mmap_mode="r")
 
-    logger.info(paths)
-    logger.info("Creating multi order model now...")
+    logger.info("Creating multi order model of %s syscalls now...", counts.total_transitions)
 
-    mom = pathpy.MultiOrderModel(paths, max_order=model["max_order"], prior=model["prior"])
-    order = mom.estimate_order()
-    mom = pathpy.MultiOrderModel(
-        paths, max_order=order, prior=model["prior"], unknown=model["unknown"]
-    )
+    processes = config["simulate"]["cpu_count"]
 
-    if not os.path.exists(os.path.dirname(model["save"])):
-        os.makedirs(os.path.dirname(model["save"]))
+    # the order is estimated without the unknown node
+    mom = counts.fit(model["max_order"], processes, prior=model["prior"])
+    order = mom.estimate_order()
+    parameters = {"max_order": order, "prior": model["prior"], "unknown": model["unknown"]}
 
-    pickle.dump(mom, open(model["save"], "wb"))
+    if model["unknown"]:
+        mom = counts.fit(processes=processes, **parameters)
+    else:
+        # the layers up to the estimated order are the ones of a model fitted with that order
+        mom = truncate_model(mom, order)
 
-    logger.info(mom)
+    save_model(mom, counts, parameters, model)
 
     logger.info("Now computing the likelihood threshold...")
 
     train, _ = create_train_test_split(data["runs"], model["train_examples"])
     runs = get_runs(data["runs"], train)
 
-    run_paths = list(runs["path"])
-    moms = [mom] * len(run_paths)
-    dts = [model["time_delta"]] * len(run_paths)
-    time_windows = [simulate["time_window"]] * len(run_paths)
+    likelihoods = score_training_runs(config, sacred_run, runs)
+    likelihoods["model_version"] = 1
+
+    return save_threshold(likelihoods, model["compiled"]), counts.total_transitions
+
+
+def update_model(config, sacred_run):
+    """Folds the training runs which are not part of the model yet into it.
+
+    Only the new normal runs, e.g. after increasing train_examples, are parsed and their path
+    counts added to the stored ones. Runs can not be removed, if a run of the model is no longer a
+    training run, e.g. after decreasing train_examples, a full create_model is needed.
+
+    The model is refitted with the order of create_model and gets the next model version. If the
+    new runs hold more than rescore_share of the training syscalls, all training runs are scored
+    again. Otherwise only the new runs are scored, and the threshold is computed together with the
+    stored minimum likelihoods of the old runs under the model version they were scored with.
+
+    Parameters
+    ----------
+    config : dict
+        main config dict generates from the corresponding file
+    sacred_run: sacred.run
+        for adding metrics to it
+
+    Returns
+    -------
+    min_likelihood : float
+        likelihood threshold for detecting attacks
+    transitions : int
+        number of syscalls the model was fitted to, 0 if there were no new runs
+    """
+
+    model = config["model"]
+    data = config["data"]
+
+    logger = logging.getLogger("hids.preprocess")
+
+    processed = pd.read_csv(os.path.join(model["paths"], "runs.csv"))
+
+    train, _ = create_train_test_split(data["runs"], model["train_examples"])
+    runs = get_runs(data["runs"], train)
+    new_runs = runs[~runs["path"].isin(processed["path"])]
+
+    # such runs are in the test set now, their counts would leak it into the model
+    removed = processed[~processed["path"].isin(runs["path"])]
+    if not removed.empty:
+        raise ValueError(
+            f"{len(removed)} runs of the model, e.g. {removed['path'].iloc[0]}, are no longer "
+            "training runs. Run create_model to rebuild the model without them."
+        )
+
+    likelihoods = pd.read_csv(os.path.join(model["compiled"], "train_likelihoods.csv"))
+    if "model_version" not in likelihoods:
+        likelihoods["model_version"] = 1
+
+    if new_runs.empty:
+        logger.info("All %s training runs are already part of the model.", len(runs))
+        return save_threshold(likelihoods, model["compiled"]), 0
+
+    logger.info("Adding %s new runs to the model of %s runs...", len(new_runs), len(processed))
+
+    extract = partial(
+        extract_dataset_counts,
+        new_runs,
+        model["time_delta"],
+        data["cache"],
+        config["simulate"]["cpu_count"],
+    )
+
+    parameters, old_counts = read_model(model["save"])
+    old_transitions = old_counts.total_transitions
 
-    ins = zip(moms, run_paths, dts, time_windows)
+    if model["out_of_core"]:
+        store = CountStore(model["paths"])
+        store.add_saved(model["paths"])
+        counts = extract(store=store)
+    else:
+        # not memory-mapped as the files are overwritten
+        counts = PathCounts.load(model["paths"]) + extract()
+        counts.save(model["paths"])
 
-    with multiprocessing.Pool(simulate["cpu_count"]) as pool:
-        results = pool.starmap(trial_scenario, ins)
+    save_training_runs(pd.concat([processed, new_runs[["path"]]]), model["paths"])
+
+    mom = counts.fit(processes=config["simulate"]["cpu_count"], **parameters)
+    save_model(mom, counts, parameters, model)
+
+    version = likelihoods["model_version"].max() + 1
+    share = 1 - old_transitions / max(counts.total_transitions, 1)
+
+    if share > model["rescore_share"]:
+        logger.info("The new runs hold %.1f%% of the syscalls, rescoring all runs.", 100 * share)
+        likelihoods = score_training_runs(config, sacred_run, runs)
+        likelihoods["model_version"] = version
+    else:
+        logger.info(
+            "Keeping the minimum likelihoods of %s runs scored with model versions %s.",
+            len(likelihoods),
+            sorted(likelihoods["model_version"].unique().tolist()),
+        )
+        logger.debug("Runs scored with an older model:\n%s", likelihoods.to_string())
+        new_likelihoods = score_training_runs(config, sacred_run, new_runs)
+        new_likelihoods["model_version"] = version
+        likelihoods = pd.concat([likelihoods, new_likelihoods], ignore_index=True)
+
+    return save_threshold(likelihoods, model["compiled"]), counts.total_transitions
+
+
+def save_model(mom, counts, parameters, model):
+    """Stores the parameters of a model, the location of its counts and its compiled tables.
+
+    The counts fitted by create_model and update_model are the ones in the 'paths' directory,
+    model.json points to them instead of keeping a copy. Without a 'paths' entry, e.g. for a
+    migrated model, the counts are written into the 'save' directory.
+
+    Parameters
+    ----------
+    mom : pathpy.MultiOrderModel
+    counts : src.path_counts.PathCounts
+        the training paths of the model
+    parameters : dict
+        arguments of PathCounts.fit
+    model : dict
+        model section of the config
+    """
+
+    # the parameters and counts instead of the pickled model, see load_model and read_model
+    os.makedirs(model["save"], exist_ok=True)
+
+    if "paths" in model:
+        location = os.path.relpath(model["paths"], model["save"])
+    else:
+        counts.save(model["save"])
+        location = "."
+
+    description = dict(parameters, counts=location, transitions=counts.total_transitions)
+    with open(os.path.join(model["save"], "model.json"), "w") as model_file:
+        json.dump(description, model_file)
+
+    logging.getLogger("hids.preprocess").info(mom)
+
+    compile_model(mom).save(model["compiled"])
+
+
+def score_training_runs(config, sacred_run, runs):
+    """Simulates the training runs with the compiled model.
+
+    Returns
+    -------
+    pandas.DataFrame
+        path and min_likelihood of every run
+    """
+
+    model = config["model"]
+    data = config["data"]
+    simulate = config["simulate"]
+
+    logger = logging.getLogger("hids.preprocess")
+
+    run_paths = list(runs["path"])
+    settings = (model["compiled"], model["time_delta"], simulate["time_window"], data["cache"])
+
+    with multiprocessing.Pool(simulate["cpu_count"], init_simulation, settings) as pool:
+        results = pool.map(simulate_run, run_paths)
 
     # if one does not want to use multiprocessing
-    # results = []
-    # for in_params in ins:
-    #    results.append(trial_scenario(*in_params))
+    # init_simulation(*settings)
+    # results = [simulate_run(run) for run in run_paths]
 
     analyzer = ScenarioAnalyzer(simulate["threshold"], sacred_run, runs)
 
@@ -88,12 +250,187 @@ def create_model(config, sacred_run):
 
     df = analyzer.evaluate_runs()
 
-    min_likelihood = analyzer.get_min_likelihood(0.2)
-
     logger.info("\n %s", str(df))
 
-    analyzer.write_misclassified_runs(only_wrong=False)
+    analyzer.write_misclassified_runs(
+        config["c_results"]["output_path"], only_wrong=False, name="train_window_metrics.npz"
+    )
+
+    return df[["path", "min_likelihood"]]
+
+
+def save_threshold(likelihoods, compiled):
+    """Stores the likelihood threshold and the minimum likelihoods of the training runs.
+
+    Parameters
+    ----------
+    likelihoods : pandas.DataFrame
+        path, min_likelihood and model_version of every training run
+    compiled : str
+        directory of the compiled model
+
+    Returns
+    -------
+    min_likelihood : float
+    """
+
+    min_likelihood = likelihoods["min_likelihood"].quantile(0.2)
+
+    logging.getLogger("hids.preprocess").info(
+        "The mimimum likelihood in the training set is %s.", min_likelihood
+    )
+
+    likelihoods.to_csv(os.path.join(compiled, "train_likelihoods.csv"), index=False)
 
-    logger.info("The mimimum likelihood in the training set is %s.", min_likelihood)
+    with open(os.path.join(compiled, "threshold.json"), "w") as threshold_file:
+        json.dump({"min_likelihood": min_likelihood}, threshold_file)
 
     return min_likelihood
+
+
+def compiled_path(save: str):
+    """Directory of the compiled tables of a model, migrating a pickled model of older versions.
+
+    Parameters
+    ----------
+    save : str
+        the 'save' entry of the model config
+
+    Returns
+    -------
+    str
+    """
+
+    compiled = save + "_tables"
+    if os.path.exists(compiled):
+        return compiled
+
+    legacy = save + ".p"
+    if os.path.exists(legacy):
+        logging.getLogger("hids.preprocess").info("Migrating the pickled model %s", legacy)
+        migrate_model(legacy)
+        return compiled
+
+    raise FileNotFoundError(
+        f"No compiled model at {compiled}, run create_model or migrate a pickled model with "
+        f"'python -m src.ex_create_model <model>.p'"
+    )
+
+
+def load_model(save: str, mmap_mode="r"):
+    """Loads the compiled tables of the model saved by create_model, without refitting it.
+
+    Parameters
+    ----------
+    save : str
+        the 'save' entry of the model config
+    mmap_mode : str
+        passed to CompiledModel.load
+
+    Returns
+    -------
+    src.likelihood.CompiledModel
+    """
+
+    return CompiledModel.load(compiled_path(save), mmap_mode=mmap_mode)
+
+
+def refit_model(save: str):
+    """Refits the MultiOrderModel saved by create_model, e.g. to inspect its layers.
+
+    Parameters
+    ----------
+    save : str
+        the 'save' entry of the model config
+
+    Returns
+    -------
+    pathpy.MultiOrderModel
+    """
+
+    parameters, counts = read_model(save)
+
+    return counts.fit(**parameters)
+
+
+def read_model(save: str):
+    """Reads the parameters and the memory-mapped counts of a model saved by create_model.
+
+    Parameters
+    ----------
+    save : str
+        the 'save' entry of the model config
+
+    Returns
+    -------
+    parameters : dict
+        arguments of PathCounts.fit
+    counts : src.path_counts.PathCounts
+
+    Raises
+    ------
+    ValueError
+        if the counts were changed after the model was fitted, e.g. by extracting the paths of
+        other training runs
+    """
+
+    with open(os.path.join(save, "model.json")) as model_file:
+        parameters = json.load(model_file)
+
+    location = os.path.join(save, parameters.pop("counts", "."))
+    transitions = parameters.pop("transitions", None)
+
+    counts = PathCounts.load(location, mmap_mode="r")
+    if transitions is not None and counts.total_transitions != transitions:
+        raise ValueError(
+            f"The path counts at {location} hold {counts.total_transitions} syscalls, the model "
+            f"{save} was fitted to {transitions}. Run create_model to fit it to the new counts."
+        )
+
+    return parameters, counts
+
+
+def migrate_model(legacy: str):
+    """Converts a pickled MultiOrderModel of older versions into the layout of create_model.
+
+    The counts, parameters and compiled tables are written next to the pickle, to its path
+    without the .p suffix and with the suffix _tables.
+
+    Parameters
+    ----------
+    legacy : str
+        path of the pickled model
+
+    Returns
+    -------
+    str
+        the 'save' entry of the migrated model
+    """
+
+    with open(legacy, "rb") as model_file:
+        mom = pickle.load(model_file)
+
+    save = os.path.splitext(legacy)[0]
+    parameters = {
+        "max_order": mom.max_order,
+        "prior": getattr(mom, "prior", 0),
+        "unknown": UNKNOWN_SYSCALL in mom.layers[0].nodes,
+    }
+
+    model = {"save": save, "compiled": save + "_tables"}
+    save_model(mom, PathCounts.from_paths(mom.paths), parameters, model)
+
+    return save
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrates pickled models to compiled tables")
+    parser.add_argument("models", nargs="+", help="pickled models, e.g. MOM_delta_0_prior_1.p")
+    args = parser.parse_args(argv)
+
+    for legacy in args.models:
+        print(f"Migrated {legacy} to {migrate_model(legacy)}_tables")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+File: ingest_server.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Asyncio server scoring the syscall streams of many monitored hosts
+"""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+
+from src.likelihood import CompiledModel
+from src.stream_detector import StreamDetector, load_threshold
+
+
+CHUNK_SIZE = 1 << 16
+
+
+class HostState(object):
+    """Detector, queue and metrics of a single monitored host or container."""
+
+    def __init__(self, detector, queue_size):
+        super(HostState, self).__init__()
+
+        self.detector = detector
+        self.queue = asyncio.Queue(queue_size)
+        self.consumer = None
+
+        self.connections = 0
+        self.last_seen = time.monotonic()
+
+        self.lines = 0
+        self.dropped = 0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.reported_lines = 0
+        self.reported_time = time.monotonic()
+
+
+class IngestServer(object):
+    """Accepts sysdig formatted syscall streams from many hosts at once.
+
+    A client starts with the line 'HOST <name>' followed by the syscalls of that host. Every host
+    gets its own StreamDetector, so the windows of different hosts or containers never mix, also
+    when one host uses several connections. Received lines are put into a bounded queue per host,
+    when a client sends faster than its lines are scored the server stops reading from it and TCP
+    flow control slows the client down. Lines which can not be scored are logged and dropped, and
+    hosts without a connection for idle_timeout seconds are forgotten.
+    """
+
+    def __init__(
+        self,
+        model,
+        threshold,
+        window_size,
+        step_size=100000,
+        queue_size=64,
+        on_score=None,
+        idle_timeout=600.0,
+    ):
+        """
+        Parameters
+        ----------
+        model : src.likelihood.CompiledModel
+            Created from regular training data
+        threshold : float
+            windows with a lower normalized log-likelihood raise an alert
+        window_size : int
+            width of a window in microseconds
+        step_size : int
+            microseconds between the start of two windows
+        queue_size : int
+            chunks of up to 64 KiB buffered per host before reading is paused
+        on_score : callable
+            called with host and score of every completed window, defaults to printing alerts
+        idle_timeout : float
+            seconds after the last connection of a host closed until its detector is dropped
+        """
+        super(IngestServer, self).__init__()
+
+        self.model = model
+        self.threshold = threshold
+        self.window_size = window_size
+        self.step_size = step_size
+        self.queue_size = queue_size
+        self.on_score = on_score if on_score is not None else print_alert
+        self.idle_timeout = idle_timeout
+
+        self.hosts = {}
+
+    def host(self, name: str):
+        """Returns the state of a host, creating it on first contact."""
+
+        if name not in self.hosts:
+            detector = StreamDetector(self.model, self.threshold, self.window_size, self.step_size)
+            state = HostState(detector, self.queue_size)
+            state.consumer = asyncio.ensure_future(self.consume(name, state))
+            self.hosts[name] = state
+
+        return self.hosts[name]
+
+    def expire_hosts(self):
+        """Drops the hosts without connection and queued lines for more than idle_timeout.
+
+        Returns
+        -------
+        list of str
+            names of the dropped hosts
+        """
+
+        now = time.monotonic()
+        idle = [
+            name
+            for name, state in self.hosts.items()
+            if state.connections == 0
+            and state.queue.empty()
+            and now - state.last_seen > self.idle_timeout
+        ]
+
+        for name in idle:
+            self.hosts.pop(name).consumer.cancel()
+
+        return idle
+
+    async def handle(self, reader, writer):
+        """Reads the stream of a single connection."""
+
+        logger = logging.getLogger("hids.ingest")
+
+        hello = (await reader.readline()).decode(errors="replace").split()
+        if len(hello) != 2 or hello[0] != "HOST":
+            logger.warning("Connection without 'HOST <name>' line, closing it")
+            writer.close()
+            return
+
+        name = hello[1]
+        state = self.host(name)
+        state.connections += 1
+        logger.info("Host %s connected", name)
+
+        try:
+            remainder = b""
+            while True:
+                chunk = await reader.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (remainder + chunk).split(b"\n")
+                remainder = lines.pop()
+                # waits while the queue of the host is full, which pauses reading from the socket
+                await state.queue.put((time.monotonic(), lines))
+
+            if remainder:
+                await state.queue.put((time.monotonic(), [remainder]))
+
+            await state.queue.join()
+        finally:
+            state.connections -= 1
+            state.last_seen = time.monotonic()
+
+        logger.info("Host %s disconnected", name)
+
+        writer.write(f"processed {state.lines}\n".encode())
+        await writer.drain()
+        writer.close()
+
+    async def consume(self, name, state):
+        """Scores the queued lines of a host."""
+
+        logger = logging.getLogger("hids.ingest")
+
+        while True:
+            received, lines = await state.queue.get()
+
+            # a failing line must not end the consumer, handle would wait for the queue forever
+            try:
+                for line in lines:
+                    try:
+                        scores = state.detector.process_line(line.decode(errors="replace"))
+                    except Exception:
+                        state.dropped += 1
+                        logger.warning(
+                            "Dropped line %r of host %s", line[:200], name, exc_info=True
+                        )
+                        continue
+
+                    for score in scores:
+                        self.on_score(name, score)
+            except Exception:
+                logger.exception("Scoring the lines of host %s failed", name)
+            finally:
+                lag = time.monotonic() - received
+                state.lines += len(lines)
+                state.lag += lag * len(lines)
+                state.max_lag = max(state.max_lag, lag)
+                state.queue.task_done()
+
+            # let the other hosts and the socket readers run between chunks
+            await asyncio.sleep(0)
+
+    def metrics(self):
+        """Events per second and scoring lag of every host since the last call.
+
+        Returns
+        -------
+        dict
+            per host the events/s, mean and maximum lag in ms, the queued chunks and the number
+            of dropped lines
+        """
+
+        now = time.monotonic()
+        report = {}
+
+        for name, state in self.hosts.items():
+            lines = state.lines - state.reported_lines
+            report[name] = {
+                "events_per_second": lines / max(now - state.reported_time, 1e-9),
+                "mean_lag_ms": 1000 * state.lag / lines if lines else 0.0,
+                "max_lag_ms": 1000 * state.max_lag,
+                "queued_chunks": state.queue.qsize(),
+                "dropped_lines": state.dropped,
+            }
+            state.reported_lines = state.lines
+            state.reported_time = now
+            state.lag = 0.0
+            state.max_lag = 0.0
+
+        return report
+
+    async def report_metrics(self, interval):
+        logger = logging.getLogger("hids.ingest")
+
+        while True:
+            await asyncio.sleep(interval)
+            for name, metrics in self.metrics().items():
+                logger.info("%s %s", name, json.dumps(metrics))
+            for name in self.expire_hosts():
+                logger.info("Host %s expired", name)
+
+    async def serve(self, tcp=None, unix=None, metrics_interval=10.0):
+        """Runs the server until it is cancelled.
+
+        Parameters
+        ----------
+        tcp : tuple of str and int
+            host and port to listen on
+        unix : str
+            path of a Unix socket to listen on
+        metrics_interval : float
+            seconds between two metric reports
+        """
+
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, *tcp)
+
+        reporter = asyncio.ensure_future(self.report_metrics(metrics_interval))
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            reporter.cancel()
+            for state in self.hosts.values():
+                state.consumer.cancel()
+
+
+def print_alert(host, score):
+    if score["alert"]:
+        print(json.dumps(dict(score, host=host)), flush=True)
+
+
+async def replay(path: str, name: str, tcp=None, unix=None):
+    """Sends a recorded run to the server as if it came from a live host.
+
+    Parameters
+    ----------
+    path : str
+        the log-file
+    name : str
+        host name used in the 'HOST' line
+    tcp : tuple of str and int
+    unix : str
+
+    Returns
+    -------
+    str
+        answer of the server
+    """
+
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(*tcp)
+
+    writer.write(f"HOST {name}\n".encode())
+
+    with open(path, "rb") as recording:
+        for chunk in iter(lambda: recording.read(CHUNK_SIZE), b""):
+            writer.write(chunk)
+            await writer.drain()
+
+    writer.write_eof()
+    answer = await reader.read()
+    writer.close()
+
+    return answer.decode()
+
+
+def address(value: str):
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("Description: ")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="run the ingest server")
+    serve.add_argument("model", help="directory of the compiled model written by create_model")
+    serve.add_argument("--threshold", type=float, help="defaults to the one of create_model")
+    serve.add_argument("--window", type=int, default=200000, help="window size in microseconds")
+    serve.add_argument("--step", type=int, default=100000, help="step size in microseconds")
+    serve.add_argument("--metrics-interval", type=float, default=10.0)
+    serve.add_argument(
+        "--idle-timeout", type=float, default=600.0, help="seconds until an idle host is dropped"
+    )
+
+    client = commands.add_parser("replay", help="replay recordings as live hosts")
+    client.add_argument("runs", nargs="+", help="log-files, each one is sent as its own host")
+
+    for command in (serve, client):
+        listen = command.add_mutually_exclusive_group(required=True)
+        listen.add_argument("--tcp", type=address, help="host:port")
+        listen.add_argument("--unix", help="path of the Unix socket")
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "serve":
+        model = CompiledModel.load(args.model)
+        threshold = args.threshold
+        if threshold is None:
+            threshold = load_threshold(args.model, -100)
+
+        server = IngestServer(
+            model, threshold, args.window, args.step, idle_timeout=args.idle_timeout
+        )
+        try:
+            asyncio.run(server.serve(args.tcp, args.unix, args.metrics_interval))
+        except KeyboardInterrupt:
+            pass
+    else:
+
+        async def replay_all():
+            return await asyncio.gather(
+                *[replay(run, f"host{i}", args.tcp, args.unix) for i, run in enumerate(args.runs)]
+            )
+
+        for run, answer in zip(args.runs, asyncio.run(replay_all())):
+            print(run, answer.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+File: instrumentation.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Time, CPU and memory usage of the stages of an experiment
+"""
+
+import time
+import logging
+import resource
+from contextlib import contextmanager
+
+
+def peak_rss():
+    """Peak resident set size of this process and of its finished child processes in MB.
+
+    Returns
+    -------
+    tuple of float
+        self, children
+    """
+
+    # ru_maxrss is in kilobytes on Linux
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    )
+
+
+def cpu_time():
+    """User and system CPU seconds of this process and of its finished child processes."""
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class Instrumentation(object):
+    """Records wall time, CPU time, peak RSS and processed events of the stages of a run.
+
+    The CPU time includes worker processes once their pool is closed. The peak RSS is the high-water
+    mark of the process up to the end of a stage, not of the stage alone, and is recorded as
+    peak_rss_so_far_mb. A stage reports at least the value of the stages before it.
+    """
+
+    def __init__(self):
+        super(Instrumentation, self).__init__()
+
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Measures the enclosed block.
+
+        Parameters
+        ----------
+        name : str
+
+        Yields
+        ------
+        dict
+            the record of the stage, the number of processed events can be set as 'events'. A
+            stage which raises is recorded too, with 'failed' set to 1.
+        """
+
+        record = {"stage": name, "events": None, "failed": 0}
+
+        wall = time.perf_counter()
+        cpu = cpu_time()
+
+        try:
+            yield record
+        except BaseException:
+            record["failed"] = 1
+            raise
+        finally:
+            record["wall_time"] = time.perf_counter() - wall
+            record["cpu_time"] = cpu_time() - cpu
+            record["peak_rss_so_far_mb"], record["children_peak_rss_so_far_mb"] = peak_rss()
+
+            self.stages.append(record)
+
+            logging.getLogger("hids.instrumentation").info(
+                "Stage %s took %.1f s wall, %.1f s CPU, peak RSS so far %.0f MB (workers %.0f MB)",
+                name,
+                record["wall_time"],
+                record["cpu_time"],
+                record["peak_rss_so_far_mb"],
+                record["children_peak_rss_so_far_mb"],
+            )
+
+    def log_scalars(self, sacred_run):
+        """Logs the measurements of all stages as scalars of the sacred run.
+
+        Parameters
+        ----------
+        sacred_run : sacred.run
+        """
+
+        for record in self.stages:
+            for key, value in record.items():
+                if key != "stage" and value is not None:
+                    sacred_run.log_scalar(f"{record['stage']}_{key}", value)
+
+            if record["events"]:
+                sacred_run.log_scalar(
+                    f"{record['stage']}_events_per_second",
+                    record["events"] / max(record["wall_time"], 1e-9),
+                )
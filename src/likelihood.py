@@ -0,0 +1,853 @@
+"""
+File: likelihood.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Likelihood computation of syscall windows without building pathpy.Paths
+"""
+
+import os
+import json
+from collections import Counter, deque
+from functools import reduce
+
+import numpy as np
+from pathpy.utils.exceptions import PathpyNotImplemented
+
+from src.event_store import EventStore, UNKNOWN_SYSCALL, decode_syscalls, encode_syscalls
+
+
+class TransitionLogProbs(object):
+    """Per-order transition log-probabilities of a MultiOrderModel.
+
+    A transition of order k is given as the (k+1)-gram of syscall ids, the order 0 transitions are
+    the ones from the 'start' node. The probabilities are looked up the same way as in
+    MultiOrderModel.path_likelihood and cached per n-gram. Transitions not seen in training fall
+    back to the prior of the source node and nodes not seen in training to the 'unknown' node, if
+    the model was created with them.
+    """
+
+    def __init__(self, model, syscall_map=None):
+        """
+        Parameters
+        ----------
+        model : pathpy.MultiOrderModel
+        syscall_map : bidict.bidict
+            mapping between syscall names and ids, defaults to references/syscalls.txt
+        """
+        super(TransitionLogProbs, self).__init__()
+
+        self.model = model
+        self.max_order = model.max_order
+        self.syscall_map = syscall_map
+        self.index_maps = {k: model.layers[k].node_to_name_map() for k in range(self.max_order + 1)}
+        self.priors = getattr(model, "transition_matrices_prior", None)
+        self.cache = {}
+
+    def __getitem__(self, ngram):
+        try:
+            return self.cache[ngram]
+        except KeyError:
+            log_prob = self.cache[ngram] = self.log_prob(ngram)
+            return log_prob
+
+    def log_prob(self, ngram):
+        """Computes the log-probability of the last syscall of the n-gram given the ones before.
+
+        Parameters
+        ----------
+        ngram : tuple of int
+            syscall ids, the order of the transition is len(ngram) - 1
+
+        Returns
+        -------
+        float
+
+        Raises
+        ------
+        PathpyNotImplemented
+            if a node is not part of the model and the model has no unknown node, the same as
+            MultiOrderModel.path_likelihood
+        """
+
+        order = len(ngram) - 1
+        names = decode_syscalls(np.array(ngram), self.syscall_map).tolist()
+
+        if order == 0:
+            source, target = "start", names[0]
+        else:
+            separator = self.model.layers[order].separator
+            source, target = separator.join(names[:-1]), separator.join(names[1:])
+
+        source = self.node_index(order, source)
+        target = self.node_index(order, target)
+
+        prob = self.model.transition_matrices[order][target, source]
+
+        if prob == 0 and self.priors is not None:
+            prob = self.priors[order][source]
+
+        with np.errstate(divide="ignore"):
+            return np.log(prob)
+
+    def node_index(self, order, node):
+        index_map = self.index_maps[order]
+
+        try:
+            return index_map[node]
+        except KeyError:
+            separator = self.model.layers[order].separator
+            unknown = separator.join([UNKNOWN_SYSCALL] * max(order, 1))
+            if unknown in index_map:
+                return index_map[unknown]
+            raise PathpyNotImplemented(
+                f"The path segment '({node})' has not been observed and therefore the "
+                "likelihood cannot be computed."
+            )
+
+
+class WindowTransitions(object):
+    """Transition counts of the thread paths inside a sliding window.
+
+    Each thread contributes the path of its syscalls inside the window. Syscalls enter a window at
+    the end of their thread path and leave it at the start. Entering syscalls add their transition,
+    leaving ones subtract theirs. As the first syscalls of a path use the lower order layers, a
+    leaving syscall also moves the transitions of the next max_order syscalls of its thread one
+    layer down. Only the syscalls inside the window are kept.
+    """
+
+    def __init__(self, max_order):
+        """
+        Parameters
+        ----------
+        max_order : int
+            maximum order of the model used for scoring
+        """
+        super(WindowTransitions, self).__init__()
+
+        self.max_order = max_order
+        self.threads = {}
+        self.counts = Counter()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def enter(self, thread, syscall):
+        """Appends a syscall to the path of its thread."""
+
+        path = self.threads.setdefault(thread, deque())
+        path.append(syscall)
+        self.size += 1
+
+        self._add(path, len(path) - 1, 0, 1)
+
+    def leave(self, thread):
+        """Removes the first syscall of the path of a thread."""
+
+        path = self.threads[thread]
+        shifted = min(self.max_order + 1, len(path))
+
+        for i in range(shifted):
+            self._add(path, i, 0, -1)
+        for i in range(1, shifted):
+            self._add(path, i, 1, 1)
+
+        path.popleft()
+        self.size -= 1
+        if not path:
+            del self.threads[thread]
+
+    def log_likelihood(self, log_probs):
+        """Log-likelihood of the thread paths in the window.
+
+        Parameters
+        ----------
+        log_probs : TransitionLogProbs or CompiledModel
+            log-probability per transition n-gram
+
+        Returns
+        -------
+        float
+        """
+
+        return sum(count * log_probs[ngram] for ngram, count in self.counts.items())
+
+    def attribution(self, log_probs, k=5):
+        """The k least likely transitions of the window, see top_transitions.
+
+        Parameters
+        ----------
+        log_probs : TransitionLogProbs or CompiledModel
+        k : int
+
+        Returns
+        -------
+        list of dict
+        """
+
+        ngrams = list(self.counts)
+        counts = np.array([self.counts[ngram] for ngram in ngrams], dtype=np.int64)
+
+        return top_transitions(ngrams, counts, ngram_log_probs(log_probs, ngrams), k)
+
+    def _add(self, path, position, path_start, count):
+        order = min(position - path_start, self.max_order)
+        ngram = tuple(path[i] for i in range(position - order, position + 1))
+
+        self.counts[ngram] += count
+        if not self.counts[ngram]:
+            del self.counts[ngram]
+
+
+class IncrementalScorer(object):
+    """Log-likelihood of a sliding time window over the thread paths of a run.
+
+    The window only moves forward in time, so the syscalls entering and leaving it are found with
+    two pointers into the time-sorted syscalls. The transition counts are kept up to date by
+    WindowTransitions.
+    """
+
+    def __init__(self, log_probs, events):
+        """
+        Parameters
+        ----------
+        log_probs : TransitionLogProbs or CompiledModel
+        events : src.event_store.EventStore
+        """
+        super(IncrementalScorer, self).__init__()
+
+        self.log_probs = log_probs
+
+        order = np.argsort(events.time, kind="stable")
+        self.time = events.time[order]
+        self.thread = events.thread_id[order].tolist()
+        self.syscall = events.syscall[order].tolist()
+
+        self.window = WindowTransitions(log_probs.max_order)
+        self.begin = 0
+        self.end = 0
+
+    def move(self, start, end):
+        """Moves the window to the syscalls with start <= time < end.
+
+        Parameters
+        ----------
+        start : int
+        end : int
+
+        Returns
+        -------
+        int
+            number of syscalls in the window
+        """
+
+        begin = int(np.searchsorted(self.time, start, side="left"))
+        end = max(int(np.searchsorted(self.time, end, side="left")), begin)
+
+        # leave first, so the syscalls of a thread inside the window stay contiguous
+        for event in range(self.begin, min(begin, self.end)):
+            self.window.leave(self.thread[event])
+        for event in range(max(self.end, begin), end):
+            self.window.enter(self.thread[event], self.syscall[event])
+
+        self.begin = begin
+        self.end = end
+
+        return end - begin
+
+    def log_likelihood(self):
+        """Log-likelihood of the thread paths in the current window.
+
+        Returns
+        -------
+        float
+        """
+
+        return self.window.log_likelihood(self.log_probs)
+
+
+class CompiledModel(object):
+    """Transition log-probability tables of a MultiOrderModel indexed by integer syscall ids.
+
+    For every order k the nodes of the layer (k-grams of syscalls) are stored as sorted integer keys
+    and the non-zero entries of the transition matrix as sorted keys source * num_nodes + target.
+    The log-priors of the source nodes cover the transitions not seen in training. Lookups of whole
+    batches of transitions are binary searches into these arrays, the pathpy model is not needed
+    anymore after compiling.
+    """
+
+    VERSION = 1
+
+    def __init__(self, max_order, vocabulary, start, unknown, tables):
+        """
+        Parameters
+        ----------
+        max_order : int
+        vocabulary : numpy.ndarray of int
+            sorted syscall ids of the nodes of the model
+        start : int
+            index of the 'start' node in the order 0 layer
+        unknown : list of int
+            per order the index of the unknown node, -1 if the model has none
+        tables : dict
+            per order the arrays node_keys, node_index, transition_keys, transition_log_probs and
+            prior_log_probs
+        """
+        super(CompiledModel, self).__init__()
+
+        self.max_order = max_order
+        self.vocabulary = np.asarray(vocabulary)
+        self.start = start
+        self.unknown = list(unknown)
+        self.tables = tables
+
+        # syscalls outside the vocabulary get the digit radix - 1, which is part of no node
+        self.radix = len(self.vocabulary) + 1
+        self.lookup = np.full(1 << 16, self.radix - 1, dtype=np.int64)
+        self.lookup[self.vocabulary] = np.arange(len(self.vocabulary))
+
+        self.cache = {}
+
+    def __getitem__(self, ngram):
+        try:
+            return self.cache[ngram]
+        except KeyError:
+            syscalls = np.array(ngram)
+            log_prob = self.transition_log_probs(syscalls, np.arange(len(syscalls)))[-1]
+            self.cache[ngram] = log_prob
+            return log_prob
+
+    def transition_log_probs(self, syscalls, path_position, strict=True):
+        """Log-probabilities of syscalls in concatenated paths given their predecessors.
+
+        The syscall at position i of its path is scored with the layer of order min(i, max_order),
+        as in MultiOrderModel.path_likelihood.
+
+        Parameters
+        ----------
+        syscalls : numpy.ndarray of int
+            syscall ids of all paths one after another
+        path_position : numpy.ndarray of int
+            position of every syscall within its path
+        strict : bool
+            if False, transitions with a node which is not part of the model are NaN instead of
+            raising
+
+        Returns
+        -------
+        numpy.ndarray of float
+
+        Raises
+        ------
+        PathpyNotImplemented
+            if a node is not part of the model and the model has no unknown node
+        """
+
+        local = self.lookup[syscalls]
+        orders = np.minimum(path_position, self.max_order)
+        log_probs = np.empty(len(local))
+
+        for order in range(self.max_order + 1):
+            events = np.flatnonzero(orders == order)
+            if not len(events):
+                continue
+
+            target = self.node_indices(order, self.ngram_keys(local, events, order), strict)
+            if order == 0:
+                source = np.full(len(events), self.start)
+            else:
+                source = self.node_indices(order, self.ngram_keys(local, events - 1, order), strict)
+
+            missing = (source < 0) | (target < 0)
+            log_probs[events] = np.where(
+                missing, np.nan, self.lookup_transitions(order, source, target)
+            )
+
+        return log_probs
+
+    def ngram_keys(self, local, ends, length):
+        keys = np.zeros(len(ends), dtype=np.int64)
+        for i in range(max(length, 1) - 1, -1, -1):
+            keys = keys * self.radix + local[ends - i]
+        return keys
+
+    def node_indices(self, order, keys, strict=True):
+        table = self.tables[order]
+
+        position, found = search_sorted(table["node_keys"], keys)
+
+        if not found.all():
+            if self.unknown[order] < 0 and strict:
+                raise PathpyNotImplemented(
+                    f"{(~found).sum()} path segments of order {order} have not been observed and "
+                    "therefore the likelihood cannot be computed."
+                )
+
+        return np.where(found, table["node_index"][position], self.unknown[order])
+
+    def lookup_transitions(self, order, source, target):
+        table = self.tables[order]
+        keys = source * len(table["prior_log_probs"]) + target
+
+        position, found = search_sorted(table["transition_keys"], keys)
+
+        return np.where(
+            found,
+            table["transition_log_probs"][position],
+            table["prior_log_probs"][np.maximum(source, 0)],
+        )
+
+    def log_likelihood(self, syscalls, path_position, weights=None):
+        """Log-likelihood of concatenated paths.
+
+        Parameters
+        ----------
+        syscalls : numpy.ndarray of int
+        path_position : numpy.ndarray of int
+        weights : numpy.ndarray of int
+            how often each syscall is observed, e.g. the frequency of its path
+
+        Returns
+        -------
+        float
+        """
+
+        log_probs = self.transition_log_probs(syscalls, path_position)
+
+        if weights is not None:
+            log_probs = log_probs * weights
+
+        return log_probs.sum()
+
+    def likelihood(self, paths, log=True):
+        """Drop-in for MultiOrderModel.likelihood on a pathpy.Paths object.
+
+        Parameters
+        ----------
+        paths : pathpy.Paths
+        log : bool
+
+        Returns
+        -------
+        float
+        """
+
+        observed = [
+            (path, frequency[1])
+            for length in paths.paths.values()
+            for path, frequency in length.items()
+            if frequency[1] > 0
+        ]
+
+        syscalls, path_position, weights = paths_to_arrays(
+            [path for path, _ in observed], [frequency for _, frequency in observed]
+        )
+
+        likelihood = self.log_likelihood(syscalls, path_position, weights)
+
+        return likelihood if log else np.exp(likelihood)
+
+    def save(self, path: str):
+        """Writes the tables as .npy files into a directory.
+
+        Parameters
+        ----------
+        path : str
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        np.save(os.path.join(path, "vocabulary.npy"), self.vocabulary)
+        for order, table in self.tables.items():
+            for name, array in table.items():
+                np.save(os.path.join(path, f"{name}_{order}.npy"), array)
+
+        meta = {
+            "version": self.VERSION,
+            "max_order": self.max_order,
+            "start": self.start,
+            "unknown": self.unknown,
+        }
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode=None):
+        """Reads tables written by save.
+
+        Parameters
+        ----------
+        path : str
+        mmap_mode : str
+            passed to numpy.load, e.g. 'r' to memory-map the tables
+
+        Returns
+        -------
+        CompiledModel
+        """
+
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+
+        if meta["version"] != cls.VERSION:
+            raise ValueError(f"Compiled model version {meta['version']} is not supported")
+
+        tables = {
+            order: {
+                name: np.load(os.path.join(path, f"{name}_{order}.npy"), mmap_mode=mmap_mode)
+                for name in TABLE_NAMES
+            }
+            for order in range(meta["max_order"] + 1)
+        }
+
+        return cls(
+            meta["max_order"],
+            np.load(os.path.join(path, "vocabulary.npy")),
+            meta["start"],
+            meta["unknown"],
+            tables,
+        )
+
+
+def window_log_likelihoods(model, events, starts, window_size, batch_size=1 << 22):
+    """Log-likelihoods of the thread paths inside many time windows of a run at once.
+
+    Every window covers the syscalls with start <= time < start + window_size, the same as
+    IncrementalScorer.move. A syscall is scored with the layer of the order given by the number of
+    its predecessors in the same thread inside the window, capped at max_order. The log-probability
+    of every syscall is looked up once for each possible order, then for all pairs of window and
+    syscall the matching one is gathered and summed per window with np.add.reduceat. The pairs are
+    built for batches of windows of at most batch_size syscalls.
+
+    Parameters
+    ----------
+    model : CompiledModel
+    events : src.event_store.EventStore
+    starts : numpy.ndarray of int
+        sorted start times of the windows
+    window_size : int
+    batch_size : int
+
+    Returns
+    -------
+    counts : numpy.ndarray of int64
+        syscalls per window
+    log_likelihoods : numpy.ndarray of float64
+        NaN for windows with a node which is not part of the model
+    """
+
+    order = np.argsort(events.time, kind="stable")
+    time = np.asarray(events.time)[order]
+    thread = np.asarray(events.thread_id)[order]
+    syscalls = np.asarray(events.syscall)[order]
+    num_events = len(time)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    begin = np.searchsorted(time, starts, side="left")
+    end = np.maximum(np.searchsorted(time, starts + window_size, side="left"), begin)
+    counts = (end - begin).astype(np.int64)
+
+    # the syscalls of every thread one after another, each thread in time order
+    by_thread = np.lexsort((np.arange(num_events), thread))
+    sorted_thread = thread[by_thread]
+    position = np.arange(num_events)
+    first = np.ones(num_events, dtype=bool)
+    first[1:] = sorted_thread[1:] != sorted_thread[:-1]
+    rank = position - np.maximum.accumulate(np.where(first, position, 0))
+
+    # index of the k-th previous syscall of the same thread, -1 if there is none
+    previous = np.full((model.max_order, num_events), -1, dtype=np.int64)
+    for k in range(1, model.max_order + 1):
+        previous[k - 1, by_thread] = np.where(rank >= k, by_thread[np.maximum(position - k, 0)], -1)
+
+    log_probs = np.empty((model.max_order + 1, num_events))
+    for depth in range(model.max_order + 1):
+        log_probs[depth, by_thread] = model.transition_log_probs(
+            syscalls[by_thread], np.minimum(rank, depth), strict=False
+        )
+
+    log_likelihoods = np.zeros(len(starts))
+    cumulative = np.cumsum(counts)
+    low = 0
+
+    while low < len(starts):
+        high = int(np.searchsorted(cumulative, cumulative[low] - counts[low] + batch_size, "right"))
+        high = max(high, low + 1)
+
+        windows = np.arange(low, high)
+        window_counts = counts[windows]
+        offsets = np.cumsum(window_counts) - window_counts
+        nonempty = window_counts > 0
+
+        if nonempty.any():
+            window_begin = np.repeat(begin[windows], window_counts)
+            event = np.arange(window_counts.sum()) - np.repeat(offsets, window_counts)
+            event += window_begin
+
+            depth = np.zeros(len(event), dtype=np.int64)
+            for k in range(model.max_order):
+                depth += previous[k, event] >= window_begin
+
+            log_likelihoods[windows[nonempty]] = np.add.reduceat(
+                log_probs[depth, event], offsets[nonempty]
+            )
+
+        low = high
+
+    return counts, log_likelihoods
+
+
+def iter_window_log_likelihoods(model, events, starts, window_size, chunk_size=256):
+    """Yields the syscall count and log-likelihood of one window after the other.
+
+    The windows are scored with window_log_likelihoods in chunks of chunk_size windows, each chunk
+    only with the syscalls inside its windows, so scoring a run can be stopped early.
+
+    Parameters
+    ----------
+    model : CompiledModel
+    events : src.event_store.EventStore
+    starts : numpy.ndarray of int
+        sorted start times of the windows
+    window_size : int
+    chunk_size : int
+
+    Yields
+    ------
+    count : int
+    log_likelihood : float
+    """
+
+    order = np.argsort(events.time, kind="stable")
+    time = np.asarray(events.time)[order]
+    thread = np.asarray(events.thread_id)[order]
+    syscalls = np.asarray(events.syscall)[order]
+
+    for low in range(0, len(starts), chunk_size):
+        chunk = np.asarray(starts[low : low + chunk_size], dtype=np.int64)
+
+        first = np.searchsorted(time, chunk[0], side="left")
+        last = np.searchsorted(time, chunk[-1] + window_size, side="left")
+        inside = EventStore(time[first:last], thread[first:last], syscalls[first:last])
+
+        yield from zip(*window_log_likelihoods(model, inside, chunk, window_size))
+
+
+def ngram_log_probs(log_probs, ngrams):
+    """Log-probabilities of transition n-grams, NaN if a node is not part of the model.
+
+    The n-grams of a CompiledModel are looked up in one batch, the last syscall of an n-gram of
+    length n is scored with the layer of order n - 1.
+
+    Parameters
+    ----------
+    log_probs : TransitionLogProbs or CompiledModel
+    ngrams : list of tuple of int
+
+    Returns
+    -------
+    numpy.ndarray of float
+    """
+
+    if not ngrams:
+        return np.zeros(0)
+
+    if isinstance(log_probs, CompiledModel):
+        lengths = np.array([len(ngram) for ngram in ngrams])
+        syscalls = np.fromiter((s for ngram in ngrams for s in ngram), np.int64, lengths.sum())
+        position = np.arange(len(syscalls)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        scored = log_probs.transition_log_probs(syscalls, position, strict=False)
+        return scored[np.cumsum(lengths) - 1]
+
+    scored = np.empty(len(ngrams))
+    for i, ngram in enumerate(ngrams):
+        try:
+            scored[i] = log_probs[ngram]
+        except (KeyError, PathpyNotImplemented):
+            scored[i] = np.nan
+
+    return scored
+
+
+def top_transitions(ngrams, counts, log_probs, k=5):
+    """The k transitions with the lowest log-probability, an explanation of a low window score.
+
+    Transitions with a node which is not part of the model come first, ties are broken by the
+    number of occurrences in the window.
+
+    Parameters
+    ----------
+    ngrams : list of tuple of int
+        syscall ids of every transition, the last one is the scored syscall
+    counts : numpy.ndarray of int
+        occurrences of every transition in the window
+    log_probs : numpy.ndarray of float
+        log-probability of every transition, NaN if it can not be scored
+    k : int
+
+    Returns
+    -------
+    list of dict
+        ngram as syscall names, log_prob (None if it can not be scored) and count
+    """
+
+    ranked = np.lexsort((-counts, np.nan_to_num(log_probs, nan=-np.inf)))[:k]
+
+    return [
+        {
+            "ngram": decode_syscalls(np.array(ngrams[i])).tolist(),
+            "log_prob": None if np.isnan(log_probs[i]) else float(log_probs[i]),
+            "count": int(counts[i]),
+        }
+        for i in ranked
+    ]
+
+
+def window_attribution(log_probs, events, start, end, k=5):
+    """The k least likely transitions of the thread paths with start <= time < end.
+
+    Parameters
+    ----------
+    log_probs : TransitionLogProbs or CompiledModel
+    events : src.event_store.EventStore
+    start : int
+    end : int
+    k : int
+
+    Returns
+    -------
+    list of dict
+        see top_transitions
+    """
+
+    scorer = IncrementalScorer(log_probs, events)
+    scorer.move(start, end)
+
+    return scorer.window.attribution(log_probs, k)
+
+
+TABLE_NAMES = [
+    "node_keys",
+    "node_index",
+    "transition_keys",
+    "transition_log_probs",
+    "prior_log_probs",
+]
+
+
+def compile_model(model, syscall_map=None):
+    """Exports the transition probabilities of a fitted MultiOrderModel into a CompiledModel.
+
+    Parameters
+    ----------
+    model : pathpy.MultiOrderModel
+    syscall_map : bidict.bidict
+        mapping between syscall names and ids, defaults to references/syscalls.txt
+
+    Returns
+    -------
+    CompiledModel
+    """
+
+    priors = getattr(model, "transition_matrices_prior", None)
+
+    names = [name for name in model.layers[0].node_to_name_map() if name != "start"]
+    vocabulary = np.unique(encode_syscalls(names, syscall_map)).astype(np.int64)
+    radix = len(vocabulary) + 1
+
+    start = model.layers[0].node_to_name_map()["start"]
+    unknown = []
+    tables = {}
+
+    for order in range(model.max_order + 1):
+        layer = model.layers[order]
+        index_map = layer.node_to_name_map()
+
+        nodes = [node for node in index_map if node != "start"]
+        digits = [
+            np.searchsorted(vocabulary, encode_syscalls(node.split(layer.separator), syscall_map))
+            for node in nodes
+        ]
+        keys = np.array([reduce(lambda key, d: key * radix + int(d), n, 0) for n in digits])
+        keys = keys.astype(np.int64)
+        node_index = np.array([index_map[node] for node in nodes], dtype=np.int64)
+        sorting = np.argsort(keys)
+
+        unknown_node = layer.separator.join([UNKNOWN_SYSCALL] * max(order, 1))
+        unknown.append(index_map.get(unknown_node, -1))
+
+        matrix = model.transition_matrices[order].tocoo()
+        num_nodes = matrix.shape[0]
+        nonzero = matrix.data != 0
+        # matrix entries are [target, source]
+        transition_keys = matrix.col[nonzero].astype(np.int64) * num_nodes + matrix.row[nonzero]
+        transition_sorting = np.argsort(transition_keys)
+
+        with np.errstate(divide="ignore"):
+            if priors is not None:
+                prior_log_probs = np.log(np.asarray(priors[order], dtype=np.float64))
+            else:
+                prior_log_probs = np.full(num_nodes, -np.inf)
+
+            tables[order] = {
+                "node_keys": keys[sorting],
+                "node_index": node_index[sorting],
+                "transition_keys": transition_keys[transition_sorting],
+                "transition_log_probs": np.log(matrix.data[nonzero][transition_sorting]),
+                "prior_log_probs": prior_log_probs,
+            }
+
+    return CompiledModel(model.max_order, vocabulary, start, unknown, tables)
+
+
+def search_sorted(sorted_keys, keys):
+    """Binary search of keys in a sorted array.
+
+    Parameters
+    ----------
+    sorted_keys : numpy.ndarray
+    keys : numpy.ndarray
+
+    Returns
+    -------
+    position : numpy.ndarray of int
+        valid index into sorted_keys for every key
+    found : numpy.ndarray of bool
+        whether sorted_keys[position] is the key
+    """
+
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+
+    position = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+
+    return position, sorted_keys[position] == keys
+
+
+def paths_to_arrays(paths, frequencies=None, syscall_map=None):
+    """Concatenates paths of syscall names into the arrays used by CompiledModel.
+
+    Parameters
+    ----------
+    paths : list of tuple of str
+    frequencies : list of int
+    syscall_map : bidict.bidict
+
+    Returns
+    -------
+    syscalls : numpy.ndarray of uint16
+    path_position : numpy.ndarray of int64
+    weights : numpy.ndarray of float64
+    """
+
+    lengths = np.array([len(path) for path in paths], dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+
+    syscalls = encode_syscalls([name for path in paths for name in path], syscall_map)
+    path_position = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+
+    if frequencies is None:
+        frequencies = np.ones(len(paths))
+
+    return syscalls, path_position, np.repeat(np.asarray(frequencies, dtype=np.float64), lengths)
@@ -0,0 +1,114 @@
+"""
+File: metrics.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Buffered metric series written as a single columnar artifact
+"""
+
+import os
+
+import numpy as np
+
+
+class MetricSink(object):
+    """Collects metric series in memory and writes them as one .npz file.
+
+    Logging every point with sacred_run.log_scalar is a round trip to the observer each time. The
+    sink has the same log_scalar method, but also takes whole series at once, and stores every
+    series as a pair of columns '<name>/steps' and '<name>/values' which np.load reads back.
+    """
+
+    def __init__(self):
+        super(MetricSink, self).__init__()
+
+        self.steps = {}
+        self.values = {}
+
+    def add_series(self, name: str, values, steps=None):
+        """Appends points to a series.
+
+        Parameters
+        ----------
+        name : str
+        values : array-like of float
+        steps : array-like of int
+            step of every value, counted on from the end of the series if None
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+
+        if steps is None:
+            begin = sum(len(part) for part in self.steps.get(name, []))
+            steps = np.arange(begin, begin + len(values))
+
+        steps = np.asarray(steps, dtype=np.int64)
+        if len(steps) != len(values):
+            raise ValueError(f"Series {name} has {len(values)} values but {len(steps)} steps")
+
+        self.steps.setdefault(name, []).append(steps)
+        self.values.setdefault(name, []).append(values)
+
+    def log_scalar(self, name: str, value, step=None):
+        """Appends a single point, the same signature as sacred_run.log_scalar."""
+
+        self.add_series(name, [value], None if step is None else [step])
+
+    def series(self):
+        """All series.
+
+        Returns
+        -------
+        dict
+            per name a tuple of steps and values
+        """
+
+        return {
+            name: (np.concatenate(self.steps[name]), np.concatenate(self.values[name]))
+            for name in self.steps
+        }
+
+    def __len__(self):
+        return sum(len(part) for parts in self.values.values() for part in parts)
+
+    def write(self, path: str, sacred_run=None):
+        """Writes all series to a .npz file, optionally added as artifact to a sacred run.
+
+        Parameters
+        ----------
+        path : str
+        sacred_run : sacred.run
+
+        Returns
+        -------
+        str
+            path of the written file
+        """
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        columns = {}
+        for name, (steps, values) in self.series().items():
+            columns[f"{name}/steps"] = steps
+            columns[f"{name}/values"] = values
+
+        with open(path, "wb") as metrics_file:
+            np.savez_compressed(metrics_file, **columns)
+
+        if sacred_run is not None:
+            sacred_run.add_artifact(path)
+
+        return path
+
+
+def read_metrics(path: str):
+    """Reads the series written by MetricSink.write.
+
+    Returns
+    -------
+    dict
+        per name a tuple of steps and values
+    """
+
+    with np.load(path) as columns:
+        names = sorted({key.rsplit("/", 1)[0] for key in columns.files})
+        return {name: (columns[f"{name}/steps"], columns[f"{name}/values"]) for name in names}
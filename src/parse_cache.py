@@ -0,0 +1,148 @@
+"""
+File: parse_cache.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: On-disk cache of parsed runs as memory-mappable numpy arrays
+"""
+
+import os
+import json
+import hashlib
+import logging
+from functools import lru_cache
+
+import numpy as np
+
+from src.data_processing import PARSER_VERSION
+from src.event_store import EventStore, SYSCALL_TABLE
+
+
+COLUMNS = ["time", "thread_id", "syscall"]
+
+
+def load_events(path: str, cache_dir=None):
+    """Returns the EventStore of a run, parsing the recording only if it is not cached yet.
+
+    A cache entry is a directory with one .npy file per column and a meta.json. The entry is only
+    used if the size and mtime of the recording, the parser version and the syscall table match.
+    Cached arrays are memory-mapped read-only.
+
+    Parameters
+    ----------
+    path : str
+        the log-file
+    cache_dir : str
+        location of the cache, if None the recording is always parsed
+
+    Returns
+    -------
+    EventStore
+    """
+
+    if cache_dir is None:
+        return EventStore.from_file(path)
+
+    logger = logging.getLogger("hids.preprocess")
+
+    entry = os.path.join(cache_dir, cache_key(path))
+    meta = cache_meta(path)
+
+    try:
+        with open(os.path.join(entry, "meta.json")) as meta_file:
+            cached_meta = json.load(meta_file)
+        if cached_meta == meta:
+            logger.debug("Loading %s from cache", path)
+            arrays = {
+                column: np.load(os.path.join(entry, column + ".npy"), mmap_mode="r")
+                for column in COLUMNS
+            }
+            return EventStore(path=path, **arrays)
+    except (OSError, ValueError):
+        pass
+
+    events = EventStore.from_file(path)
+    store_events(events, entry, meta)
+
+    return events
+
+
+def store_events(events, entry: str, meta: dict):
+    """Writes the arrays of an EventStore into a cache entry.
+
+    The meta.json is written last, so an interrupted write leaves an invalid entry behind which
+    is parsed again on the next access.
+
+    Parameters
+    ----------
+    events : EventStore
+    entry : str
+        directory of the cache entry
+    meta : dict
+        validity information of the entry
+    """
+
+    os.makedirs(entry, exist_ok=True)
+
+    meta_path = os.path.join(entry, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    # write to temporary files first, parallel workers might fill the same entry
+    suffix = f".{os.getpid()}.tmp"
+
+    for column in COLUMNS:
+        target = os.path.join(entry, column + ".npy")
+        with open(target + suffix, "wb") as array_file:
+            np.save(array_file, getattr(events, column))
+        os.replace(target + suffix, target)
+
+    with open(meta_path + suffix, "w") as meta_file:
+        json.dump(meta, meta_file)
+    os.replace(meta_path + suffix, meta_path)
+
+
+def cache_key(path: str):
+    """Name of the cache entry of a recording.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    str
+    """
+
+    path = os.path.abspath(path)
+    digest = hashlib.sha1(path.encode()).hexdigest()[:16]
+
+    return f"{os.path.splitext(os.path.basename(path))[0]}_{digest}"
+
+
+def cache_meta(path: str):
+    """Information which invalidates a cache entry when it changes.
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    dict
+    """
+
+    stat = os.stat(path)
+
+    return {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "parser_version": PARSER_VERSION,
+        "syscall_table": syscall_table_digest(),
+    }
+
+
+@lru_cache(maxsize=None)
+def syscall_table_digest(path: str = SYSCALL_TABLE):
+    with open(path, "rb") as table:
+        return hashlib.sha1(table.read()).hexdigest()
@@ -0,0 +1,865 @@
+"""
+File: path_counts.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Path statistics as integer encoded count tables
+"""
+
+import os
+import sys
+import json
+import argparse
+import shutil
+import multiprocessing
+from array import array
+from collections import deque
+
+import numpy as np
+import pathpy
+
+from src.data_processing import ThreadIndex, generate_paths_from_threads
+from src.event_store import encode_syscalls, decode_syscalls
+from src.parse_cache import load_events
+
+
+class PathCounts(object):
+    """The path statistics of a pathpy.Paths object as integer arrays.
+
+    For every path length k, paths[k] holds the observed paths as rows of k + 1 syscall ids and
+    counts[k] the matching rows of (subpath count, longest path count) of pathpy.Paths. The tables
+    are far smaller to send between processes than the nested dicts of tuples of strings, and
+    adding them does not copy the growing sum.
+
+    The counts are the sufficient statistics of a MultiOrderModel. Saved as sorted arrays they are
+    the training data on disk, which loads memory-mapped, is extended by adding the counts of new
+    runs and is refitted into a model on demand.
+    """
+
+    VERSION = 1
+
+    def __init__(self, paths, counts, max_subpath_length=sys.maxsize):
+        """
+        Parameters
+        ----------
+        paths : dict
+            per path length an array of shape (num_paths, length + 1) with syscall ids
+        counts : dict
+            per path length an array of shape (num_paths, 2) with the counts
+        max_subpath_length : int
+            same as pathpy.Paths.max_subpath_length
+        """
+        super(PathCounts, self).__init__()
+
+        self.paths = paths
+        self.counts = counts
+        self.max_subpath_length = max_subpath_length
+
+    @classmethod
+    def from_paths(cls, paths, syscall_map=None):
+        """Encodes a pathpy.Paths object.
+
+        Parameters
+        ----------
+        paths : pathpy.Paths
+        syscall_map : bidict.bidict
+
+        Returns
+        -------
+        PathCounts
+        """
+
+        encoded = {}
+        counts = {}
+
+        for length, length_paths in paths.paths.items():
+            names = [name for path in length_paths for name in path]
+            encoded[length] = encode_syscalls(names, syscall_map).reshape(-1, length + 1)
+            counts[length] = np.array(list(length_paths.values()), dtype=np.float64).reshape(-1, 2)
+
+        return cls(encoded, counts, paths.max_subpath_length)
+
+    def to_paths(self, syscall_map=None):
+        """Decodes the counts into a pathpy.Paths object.
+
+        Parameters
+        ----------
+        syscall_map : bidict.bidict
+
+        Returns
+        -------
+        pathpy.Paths
+        """
+
+        paths = pathpy.Paths()
+        paths.max_subpath_length = self.max_subpath_length
+
+        for length in sorted(self.paths):
+            length_paths = paths.paths[length]
+            names = decode_syscalls(self.paths[length], syscall_map).tolist()
+            for path, count in zip(names, self.counts[length]):
+                length_paths[tuple(path)] = count.copy()
+
+        return paths
+
+    @classmethod
+    def merge(cls, tables):
+        """Sums the counts of several tables in a single pass.
+
+        Parameters
+        ----------
+        tables : list of PathCounts
+
+        Returns
+        -------
+        PathCounts
+        """
+
+        tables = list(tables)
+        if len(tables) == 1:
+            return tables[0]
+
+        lengths = sorted({length for table in tables for length in table.paths})
+        paths = {}
+        counts = {}
+
+        for length in lengths:
+            all_paths = np.concatenate(
+                [table.paths[length] for table in tables if length in table.paths]
+            )
+            all_counts = np.concatenate(
+                [table.counts[length] for table in tables if length in table.paths]
+            )
+
+            paths[length], inverse = unique_rows(all_paths)
+            counts[length] = np.zeros((len(paths[length]), 2))
+            np.add.at(counts[length], inverse, all_counts)
+
+        # the same as the sum of pathpy.Paths objects
+        return cls(paths, counts, sys.maxsize)
+
+    def __add__(self, other):
+        return PathCounts.merge([self, other])
+
+    @property
+    def nbytes(self):
+        """Memory used by the tables in bytes."""
+        return sum(self.paths[k].nbytes + self.counts[k].nbytes for k in self.paths)
+
+    @property
+    def total_transitions(self):
+        """Number of syscalls in the longest paths, the same as compute_total_transitions."""
+        return int(sum(self.counts[k][:, 1].sum() * (k + 1) for k in self.counts))
+
+    def fit(self, max_order, processes=1, **kwargs):
+        """Fits a MultiOrderModel to the paths.
+
+        The layer of order k only reads the paths of length k and, for k > 1, of length 1. With
+        several processes every worker gets just these tables and fits a single layer, instead of
+        pathpy building all layers one after the other.
+
+        Parameters
+        ----------
+        max_order : int
+        processes : int
+            number of worker processes fitting the layers of order 1 and higher
+        kwargs
+            passed to pathpy.MultiOrderModel, e.g. prior and unknown
+
+        Returns
+        -------
+        pathpy.MultiOrderModel
+        """
+
+        if processes <= 1 or max_order <= 1:
+            return pathpy.MultiOrderModel(self.to_paths(), max_order=max_order, **kwargs)
+
+        model = pathpy.MultiOrderModel(self.to_paths(), max_order=0, **kwargs)
+
+        tasks = [(self.layer_counts(k), k, kwargs) for k in range(1, max_order + 1)]
+
+        with multiprocessing.Pool(min(processes, max_order)) as pool:
+            for k, attributes in pool.imap_unordered(fit_layer, tasks):
+                attributes["layers"].paths = model.paths
+                for name, value in attributes.items():
+                    getattr(model, name)[k] = value
+
+        return model
+
+    def layer_counts(self, order):
+        """The tables needed to fit the layer of the given order, see fit."""
+
+        lengths = {0, 1, order} & set(self.paths)
+        return PathCounts(
+            {length: self.paths[length] for length in lengths},
+            {length: self.counts[length] for length in lengths},
+            self.max_subpath_length,
+        )
+
+    def save(self, path: str):
+        """Writes the tables as .npy files into a directory, the paths sorted row by row.
+
+        Parameters
+        ----------
+        path : str
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        for length in self.paths:
+            paths, counts = self.paths[length], self.counts[length]
+            order = np.lexsort(paths.T[::-1])
+            np.save(os.path.join(path, f"paths_{length}.npy"), paths[order].astype(np.uint16))
+            np.save(os.path.join(path, f"counts_{length}.npy"), counts[order])
+
+        meta = {
+            "version": self.VERSION,
+            "max_subpath_length": self.max_subpath_length,
+            "lengths": sorted(self.paths),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode=None):
+        """Reads tables written by save.
+
+        Parameters
+        ----------
+        path : str
+        mmap_mode : str
+            passed to numpy.load, e.g. 'r' to memory-map the tables
+
+        Returns
+        -------
+        PathCounts
+        """
+
+        with open(os.path.join(path, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+
+        if meta["version"] != cls.VERSION:
+            raise ValueError(f"Path counts version {meta['version']} is not supported")
+
+        paths = {}
+        counts = {}
+        for length in meta["lengths"]:
+            paths[length] = np.load(os.path.join(path, f"paths_{length}.npy"), mmap_mode=mmap_mode)
+            counts[length] = np.load(
+                os.path.join(path, f"counts_{length}.npy"), mmap_mode=mmap_mode
+            )
+
+        return cls(paths, counts, meta["max_subpath_length"])
+
+
+class CountStore(object):
+    """Sums the path counts of many runs on disk with bounded memory.
+
+    The tables of the runs are buffered until they reach buffer_size bytes, then summed and saved
+    as a sorted segment. finish merges the segments length by length, reading at most chunk_size
+    rows of every memory-mapped segment at once, so the memory does not grow with the number of
+    runs but only with the number of segments.
+    """
+
+    def __init__(self, path: str, buffer_size=1 << 28, chunk_size=1 << 18):
+        """
+        Parameters
+        ----------
+        path : str
+            directory of the summed counts, the segments are written next to it
+        buffer_size : int
+            bytes of tables kept in memory before a segment is written
+        chunk_size : int
+            rows read from every segment per merge step
+        """
+        super(CountStore, self).__init__()
+
+        self.path = path
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+
+        self.directory = path.rstrip(os.sep) + ".segments"
+        self.segments = []
+        self.buffer = []
+        self.buffered = 0
+        self.tables = 0
+        self.max_subpath_length = sys.maxsize
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+
+    def add(self, table):
+        """Adds the counts of a run.
+
+        Parameters
+        ----------
+        table : PathCounts
+        """
+
+        self.buffer.append(table)
+        self.buffered += table.nbytes
+        self.count(table)
+
+        if self.buffered >= self.buffer_size:
+            self.spill()
+
+    def add_saved(self, path: str):
+        """Adds counts written by PathCounts.save without reading them into memory.
+
+        Parameters
+        ----------
+        path : str
+        """
+
+        self.segments.append(path)
+        self.count(PathCounts.load(path, mmap_mode="r"))
+
+    def count(self, table):
+        # the same max_subpath_length as the sum of the pathpy.Paths objects
+        self.tables += 1
+        self.max_subpath_length = table.max_subpath_length if self.tables == 1 else sys.maxsize
+
+    def spill(self):
+        """Sums the buffered tables into a new segment."""
+
+        if not self.buffer:
+            return
+
+        segment = os.path.join(self.directory, f"segment_{len(self.segments)}")
+        PathCounts.merge(self.buffer).save(segment)
+
+        self.segments.append(segment)
+        self.buffer = []
+        self.buffered = 0
+
+    def finish(self):
+        """Merges all segments into the counts at path and removes the segments.
+
+        Returns
+        -------
+        PathCounts
+            memory-mapped
+        """
+
+        self.spill()
+
+        tables = [PathCounts.load(segment, mmap_mode="r") for segment in self.segments]
+        lengths = sorted({length for table in tables for length in table.paths})
+
+        # written next to the segments first, path itself can be one of them
+        merged = os.path.join(self.directory, "merged")
+        os.makedirs(merged)
+
+        for length in lengths:
+            paths = [table.paths[length] for table in tables if length in table.paths]
+            counts = [table.counts[length] for table in tables if length in table.paths]
+            merge_sorted(paths, counts, merged, length, self.chunk_size)
+
+        meta = {
+            "version": PathCounts.VERSION,
+            "max_subpath_length": self.max_subpath_length,
+            "lengths": lengths,
+        }
+        with open(os.path.join(merged, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file)
+
+        del tables
+        shutil.rmtree(self.path, ignore_errors=True)
+        shutil.move(merged, self.path)
+        shutil.rmtree(self.directory)
+
+        return PathCounts.load(self.path, mmap_mode="r")
+
+
+def merge_sorted(paths, counts, directory: str, length: int, chunk_size: int):
+    """Sums tables of paths sorted row by row into the files of PathCounts.save.
+
+    In every step the rows up to the smallest of the chunk_size-th remaining rows of all tables
+    are summed, so no row is split between two steps and at most chunk_size rows of each table are
+    read at once.
+
+    Parameters
+    ----------
+    paths : list of numpy.ndarray
+        per table the sorted paths of the given length
+    counts : list of numpy.ndarray
+        per table the matching counts
+    directory : str
+    length : int
+    chunk_size : int
+    """
+
+    starts = [0] * len(paths)
+
+    raw_paths = os.path.join(directory, f"paths_{length}.raw")
+    raw_counts = os.path.join(directory, f"counts_{length}.raw")
+    rows = 0
+
+    with open(raw_paths, "wb") as paths_file, open(raw_counts, "wb") as counts_file:
+        while any(start < len(table) for start, table in zip(starts, paths)):
+            bound = min(
+                tuple(table[min(start + chunk_size, len(table)) - 1].tolist())
+                for start, table in zip(starts, paths)
+                if start < len(table)
+            )
+
+            ends = [search_rows(table, bound, start) for start, table in zip(starts, paths)]
+
+            chunk_paths = np.concatenate([t[s:e] for t, s, e in zip(paths, starts, ends)])
+            chunk_counts = np.concatenate([c[s:e] for c, s, e in zip(counts, starts, ends)])
+
+            unique, inverse = unique_rows(chunk_paths)
+            summed = np.zeros((len(unique), 2))
+            np.add.at(summed, inverse, chunk_counts)
+
+            paths_file.write(unique.tobytes())
+            counts_file.write(summed.tobytes())
+            rows += len(unique)
+            starts = ends
+
+    # the number of rows is only known now, the raw files are copied behind a .npy header
+    for raw, name, dtype, width in [
+        (raw_paths, "paths", np.uint16, length + 1),
+        (raw_counts, "counts", np.float64, 2),
+    ]:
+        source = np.memmap(raw, dtype=dtype, mode="r", shape=(rows, width)) if rows else None
+        target = np.lib.format.open_memmap(
+            os.path.join(directory, f"{name}_{length}.npy"), "w+", dtype, (rows, width)
+        )
+        for begin in range(0, rows, chunk_size):
+            target[begin : begin + chunk_size] = source[begin : begin + chunk_size]
+        target.flush()
+        del source, target
+        os.remove(raw)
+
+
+def unique_rows(rows):
+    """Like np.unique(rows, axis=0, return_inverse=True) for rows of syscall ids.
+
+    np.unique compares the rows as records with a field per column, which is slow and large for
+    the long paths of a temporal network. As big-endian bytes the rows compare in the same order
+    as single opaque values.
+
+    Parameters
+    ----------
+    rows : numpy.ndarray
+        shape (num_rows, length + 1)
+
+    Returns
+    -------
+    numpy.ndarray of uint16
+        distinct rows, sorted row by row
+    numpy.ndarray of int
+        index of every row in the distinct rows
+    """
+
+    width = rows.shape[1]
+    keys = np.ascontiguousarray(rows, dtype=">u2").view(np.dtype((np.void, 2 * width)))
+    keys, inverse = np.unique(keys.reshape(-1), return_inverse=True)
+    return keys.view(">u2").reshape(-1, width).astype(np.uint16), inverse.reshape(-1)
+
+
+def search_rows(rows, bound, start=0):
+    """Index of the first row after start which is larger than bound, rows sorted row by row."""
+
+    low, high = start, len(rows)
+    while low < high:
+        middle = (low + high) // 2
+        if tuple(rows[middle].tolist()) <= bound:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def order_attributes(model):
+    """Names of the attributes of a MultiOrderModel with a value per order.
+
+    Besides layers and transition_matrices, the pathpy fork used for the models keeps e.g. the
+    transition_matrices_prior of every order.
+    """
+
+    orders = set(model.layers)
+    return [
+        name
+        for name, value in vars(model).items()
+        if isinstance(value, dict) and set(value) == orders
+    ]
+
+
+def fit_layer(task):
+    """Fits a single layer of a MultiOrderModel in a worker process, see PathCounts.fit.
+
+    Parameters
+    ----------
+    task : tuple
+        PathCounts with the paths of the layer, its order and the arguments of the model
+
+    Returns
+    -------
+    tuple
+        order and the value of every attribute of order_attributes for it
+    """
+
+    counts, order, kwargs = task
+
+    # pathpy only adds layers in increasing order, the lower ones see empty tables and are dropped.
+    # A layer and its prior only depend on the paths of its own length, the prior of a node being
+    # prior / (outweight + prior * number of nodes) in the saved models.
+    model = pathpy.MultiOrderModel(counts.to_paths(), max_order=0, **kwargs)
+    model.add_layers(order)
+
+    return order, {name: getattr(model, name)[order] for name in order_attributes(model)}
+
+
+def truncate_model(model, order):
+    """Drops the layers above the given order, the same as fitting the model with max_order=order.
+
+    Parameters
+    ----------
+    model : pathpy.MultiOrderModel
+    order : int
+
+    Returns
+    -------
+    pathpy.MultiOrderModel
+        the same model
+    """
+
+    for name in order_attributes(model):
+        values = getattr(model, name)
+        for k in [k for k in values if k > order]:
+            del values[k]
+
+    return model
+
+
+class _Candidate(object):
+    """Longest paths of the temporal path extraction which can still be continued.
+
+    A candidate ends in the node 'node' at 'time'. It either starts a path with the syscalls
+    in 'nodes', or continues all paths of its 'parents' with them. Candidates which are continued
+    by a single edge are extended in place, so unbroken chains are stored as one array of 16 bit
+    syscall ids. Every candidate is continued at most once, so the candidates of a path form a
+    tree whose root is the candidate the paths end in, and 'size' is the number of its syscalls.
+    """
+
+    __slots__ = ["time", "node", "nodes", "parents", "open", "size"]
+
+    def __init__(self, time, node, nodes, parents=None):
+        self.time = time
+        self.node = node
+        self.nodes = array("H", nodes)
+        self.parents = parents
+        self.open = True
+        self.size = len(nodes) + sum(parent.size for parent in parents or [])
+
+
+def _unique_counts(rows, weights):
+    """Distinct rows and the summed weights of each one."""
+
+    rows, inverse = unique_rows(rows)
+    return rows, np.bincount(inverse, weights, len(rows))
+
+
+def count_candidates(ends, max_subpath_length=sys.maxsize):
+    """Counts the paths of finished candidates like pathpy.Paths.expand_subpaths.
+
+    The paths are not enumerated. A tree with r starts and a depth of d has r paths of up to d
+    syscalls, but its chains hold every syscall once. A subpath starting at a syscall of the tree
+    is contained in as many paths as there are starts before it, which is counted once per chain.
+    Longest paths are deduplicated by chain and continuation, so only the distinct ones are built.
+
+    Parameters
+    ----------
+    ends : list of _Candidate
+        finished candidates, the last one of their paths
+    max_subpath_length : int
+
+    Returns
+    -------
+    PathCounts
+    """
+
+    # every chain before the chains it continues
+    chains = []
+    child = []
+    stack = [(end, -1) for end in ends]
+    while stack:
+        candidate, continued = stack.pop()
+        child.append(continued)
+        chains.append(candidate)
+        if candidate.parents is not None:
+            stack.extend((parent, len(chains) - 1) for parent in candidate.parents)
+
+    child = np.array(child, dtype=np.int64)
+    lengths = np.array([len(chain.nodes) for chain in chains], dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    starts = np.array([chain.parents is None for chain in chains])
+
+    # one past the last syscall is a sentinel which follows itself
+    total = int(lengths.sum())
+    nodes = np.concatenate([np.frombuffer(chain.nodes, dtype=np.uint16) for chain in chains])
+    following = np.arange(1, total + 2)
+    following[offsets + lengths - 1] = np.where(child >= 0, offsets[np.maximum(child, 0)], total)
+    following[total] = total
+
+    # number of paths through every chain and number of syscalls after it
+    through = starts.astype(np.float64)
+    after = np.zeros(len(chains), dtype=np.int64)
+    for i in range(len(chains) - 1, -1, -1):
+        if child[i] >= 0:
+            through[child[i]] += through[i]
+    for i in range(len(chains)):
+        if child[i] >= 0:
+            after[i] = lengths[child[i]] + after[child[i]]
+
+    path_lengths = (lengths + after - 1)[starts]
+
+    encoded = {}
+    counts = {}
+
+    # subpaths with k edges, starting at every syscall which is followed by k more
+    weights = np.repeat(through, lengths)
+    columns = [np.arange(total)]
+    for k in range(min(max_subpath_length, path_lengths.max()) + 1):
+        if k:
+            columns.append(following[columns[-1]])
+        valid = columns[-1] < total
+        rows, subpath_counts = _unique_counts(
+            nodes[np.stack([column[valid] for column in columns], axis=1)], weights[valid]
+        )
+        encoded[k], counts[k] = rows, np.stack([subpath_counts, np.zeros(len(rows))], axis=1)
+
+    # equal chains continued by equal suffixes give the same longest path
+    suffixes = {}
+    suffix = np.zeros(len(chains), dtype=np.int64)
+    for i, chain in enumerate(chains):
+        key = (chain.nodes.tobytes(), suffix[child[i]] if child[i] >= 0 else -1)
+        suffix[i] = suffixes.setdefault(key, len(suffixes))
+
+    _, first, frequency = np.unique(suffix[starts], return_index=True, return_counts=True)
+    longest = {}
+    for start, path_count in zip(np.flatnonzero(starts)[first].tolist(), frequency.tolist()):
+        parts = []
+        while start >= 0:
+            parts.append(nodes[offsets[start] : offsets[start] + lengths[start]])
+            start = child[start]
+        path = np.concatenate(parts)
+        longest.setdefault(len(path) - 1, []).append((path, path_count))
+
+    tables = [PathCounts(encoded, counts)]
+    for length, paths in longest.items():
+        rows, path_counts = _unique_counts(
+            np.stack([path for path, _ in paths]), np.array([count for _, count in paths])
+        )
+        # a path is not a subpath of itself
+        subpath_counts = -path_counts if length <= max_subpath_length else np.zeros(len(rows))
+        tables.append(
+            PathCounts({length: rows}, {length: np.stack([subpath_counts, path_counts], axis=1)})
+        )
+
+    return PathCounts.merge(tables)
+
+
+def temporal_path_counts(
+    sources, targets, times, delta, max_subpath_length=sys.maxsize, flush_size=1 << 20
+):
+    """Time-respecting paths of a temporal network like paths_from_temporal_network_single.
+
+    The time-stamped edges are streamed once in the order of their time. An edge (u, v; t)
+    continues all candidate paths ending in u at a time in [t - delta, t), otherwise it starts a
+    new path, as pathpy does with only the first continuation of every path. Candidates are
+    stored as chains of syscall ids instead of tuples of time-stamped edges. As soon as the last
+    candidate of a tree can not be continued anymore, the tree is counted by count_candidates
+    without enumerating its paths, and dropped.
+
+    The memory is bounded by the syscalls of the unfinished trees, two bytes each, plus the
+    finished ones buffered up to flush_size syscalls. The queues of the live candidates are
+    compacted whenever they hold more stale than live entries, so they do not grow with delta.
+
+    Parameters
+    ----------
+    sources : numpy.ndarray of int
+        syscall ids of the edge sources
+    targets : numpy.ndarray of int
+        syscall ids of the edge targets
+    times : numpy.ndarray of int
+        time stamps of the edges, sorted
+    delta : int
+        maximum time difference between two consecutive edges of a path
+    max_subpath_length : int
+        longest subpaths which are counted
+    flush_size : int
+        syscalls of finished trees buffered before they are counted
+
+    Returns
+    -------
+    PathCounts
+    """
+
+    waiting = {}
+    expiry = deque()
+    roots = set()
+    root_time = None
+    live = 0
+
+    finished = []
+    buffered = 0
+    tables = []
+
+    def current(entry):
+        return entry[-1].open and entry[-1].time == entry[0]
+
+    def finish(candidate):
+        nonlocal buffered, live
+        candidate.open = False
+        live -= 1
+        finished.append(candidate)
+        buffered += candidate.size
+
+    def flush():
+        nonlocal buffered
+        if finished:
+            tables.append(count_candidates(finished, max_subpath_length))
+            if len(tables) > 1:
+                tables[:] = [PathCounts.merge(tables)]
+            finished.clear()
+            buffered = 0
+
+    for source, target, time in zip(sources.tolist(), targets.tolist(), times.tolist()):
+
+        # candidates ending before time - delta can not be continued anymore
+        while expiry and expiry[0][0] < time - delta:
+            entry = expiry.popleft()
+            if current(entry):
+                finish(entry[-1])
+            queue = waiting.get(entry[1])
+            while queue and (not queue[0][1].open or queue[0][0] < time - delta):
+                queue.popleft()
+
+        # entries of extended or merged candidates are stale until they expire
+        if len(expiry) > 2 * live + 1024:
+            expiry = deque(entry for entry in expiry if current(entry))
+            for node in list(waiting):
+                waiting[node] = deque(entry for entry in waiting[node] if current(entry))
+                if not waiting[node]:
+                    del waiting[node]
+
+        if buffered >= flush_size:
+            flush()
+
+        if time != root_time:
+            roots.clear()
+            root_time = time
+
+        continued = []
+        queue = waiting.get(source)
+        while queue and queue[0][0] < time:
+            previous, candidate = queue.popleft()
+            if candidate.open and candidate.time == previous and previous >= time - delta:
+                continued.append(candidate)
+
+        if not continued:
+            # pathpy keeps its paths in sets, so equal edges at the same time start one path
+            if (source, target) in roots:
+                continue
+            roots.add((source, target))
+            candidate = _Candidate(time, target, [source, target])
+            live += 1
+        elif len(continued) == 1:
+            candidate = continued[0]
+            candidate.nodes.append(target)
+            candidate.time = time
+            candidate.node = target
+            candidate.size += 1
+        else:
+            for parent in continued:
+                parent.open = False
+            candidate = _Candidate(time, target, [target], continued)
+            live += 1 - len(continued)
+
+        waiting.setdefault(target, deque()).append((time, candidate))
+        expiry.append((time, target, candidate))
+
+    for entry in expiry:
+        if current(entry):
+            finish(entry[-1])
+    flush()
+
+    if not tables:
+        return PathCounts({}, {}, max_subpath_length)
+
+    counts = tables[0]
+    counts.max_subpath_length = max_subpath_length
+
+    # pathpy.Paths has an entry for every length up to the longest path
+    for length in range(max(counts.paths, default=-1)):
+        if length not in counts.paths:
+            counts.paths[length] = np.zeros((0, length + 1), dtype=np.uint16)
+            counts.counts[length] = np.zeros((0, 2))
+
+    return counts
+
+
+def temporal_paths(sources, targets, times, delta, max_subpath_length=sys.maxsize):
+    """Drop-in for paths_from_temporal_network_single on the edges of a temporal network.
+
+    Parameters
+    ----------
+    sources, targets, times, delta, max_subpath_length
+        see temporal_path_counts
+
+    Returns
+    -------
+    pathpy.Paths
+    """
+
+    return temporal_path_counts(sources, targets, times, delta, max_subpath_length).to_paths()
+
+
+def extract_path_counts(run: str, time_delta: int, cache_dir=None):
+    """Extracts the paths of a single run, as used by process_raw_temporal_dataset.
+
+    Parameters
+    ----------
+    run : str
+        path to the log-file
+    time_delta : int
+        Time-difference threshold for a valid path, if zero the thread information is used.
+    cache_dir : str
+        Location of the parse cache, if None the run is parsed
+
+    Returns
+    -------
+    PathCounts
+    """
+
+    events = load_events(run, cache_dir)
+
+    if time_delta != 0:
+        # the edges of generate_temporal_network, from each syscall to the next one
+        order = np.argsort(events.time[:-1], kind="stable")
+        return temporal_path_counts(
+            events.syscall[order], events.syscall[order + 1], events.time[order], time_delta, 3
+        )
+
+    paths = generate_paths_from_threads(ThreadIndex.from_events(events))
+
+    return PathCounts.from_paths(paths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merges saved path counts, e.g. of new runs")
+    parser.add_argument("output", help="directory of the merged counts")
+    parser.add_argument("counts", nargs="+", help="directories written by PathCounts.save")
+    args = parser.parse_args(argv)
+
+    # not memory-mapped, the output may be one of the inputs
+    counts = PathCounts.merge([PathCounts.load(path) for path in args.counts])
+    counts.save(args.output)
+
+    print(f"Merged {len(args.counts)} counts with {counts.total_transitions} syscalls")
+
+
+if __name__ == "__main__":
+    main()
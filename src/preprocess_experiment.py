@@ -13,11 +13,19 @@ import dotenv
 
 import sacred
 
-from src.data_processing import process_raw_temporal_dataset, get_runs
+from src.data_processing import extract_dataset_counts, get_runs
+from src.path_counts import CountStore
 from src.utils import config_adapt
 
 
 def preprocess(config):
+    """Extracts the paths of the training runs and stores them.
+
+    Returns
+    -------
+    int
+        number of syscalls in the extracted paths
+    """
 
     logger = logging.getLogger("hids.preprocess")
 
@@ -30,13 +38,38 @@ def preprocess(config):
     logger.info("runs for training")
     logger.info(runs)
 
-    paths = process_raw_temporal_dataset(runs, time_delta)
+    if config["model"]["out_of_core"]:
+        store = CountStore(config["model"]["paths"])
+    else:
+        store = None
+
+    counts = extract_dataset_counts(
+        runs, time_delta, config["data"]["cache"], config["simulate"]["cpu_count"], store=store
+    )
+
+    if store is None:
+        counts.save(config["model"]["paths"])
+    save_training_runs(runs, config["model"]["paths"])
 
-    pickle.dump(
-        paths, open(config["model"]["paths"], "wb"),
+    logger.info(
+        "Saved the counts of %s syscalls to %s", counts.total_transitions, config["model"]["paths"]
     )
 
-    logger.info(paths)
+    return counts.total_transitions
+
+
+def save_training_runs(runs, path: str):
+    """Stores the list of the runs next to their path counts.
+
+    Parameters
+    ----------
+    runs : pandas.DataFrame
+        the runs of the counts, update_model only adds runs which are not listed
+    path : str
+        directory of the counts
+    """
+
+    runs[["path"]].to_csv(os.path.join(path, "runs.csv"), index=False)
 
 
 def create_train_test_split(runs: str, num_train: int):
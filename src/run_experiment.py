@@ -15,14 +15,13 @@ import dotenv
 import multiprocessing
 from tqdm import tqdm
 
-from src.attack_simulate import trial_scenario
+from src.attack_simulate import init_simulation, simulate_run
 from src.preprocess_experiment import create_train_test_split
 from src.data_processing import generate_temporal_network, get_runs
 from src.scenario_analyzer import ScenarioAnalyzer
+from src.ex_create_model import compiled_path
 from src.utils import config_adapt
 
-import src.istarmap
-
 
 def my_main(config, sacred_run, min_likelihood=None):
     """Simulates runs with a trained model.
@@ -35,6 +34,11 @@ def my_main(config, sacred_run, min_likelihood=None):
         to store metrics
     min_likelihood : float
         likelihood threshold to detect attacks
+
+    Returns
+    -------
+    int
+        number of simulated syscalls
     """
 
     model = config["model"]
@@ -43,8 +47,6 @@ def my_main(config, sacred_run, min_likelihood=None):
 
     results_logger = logging.getLogger("hids.results")
 
-    mom = pickle.load(open(model["save"], "rb"))
-
     _, test = create_train_test_split(data["runs"], model["train_examples"])
 
     runs = get_runs(data["runs"], test)
@@ -64,31 +66,33 @@ def my_main(config, sacred_run, min_likelihood=None):
             attack_samples = runs[runs["is_executing_exploit"]]
         runs = pd.concat([norm_samples, attack_samples])
 
-    run_paths = list(runs["path"])
-    moms = [mom] * len(run_paths)
-    dts = [model["time_delta"]] * len(run_paths)
-    time_windows = [simulate["time_window"]] * len(run_paths)
+    threshold = min_likelihood if min_likelihood else simulate["threshold"]
 
-    ins = list(zip(moms, run_paths, dts, time_windows))
+    run_paths = list(runs["path"])
+    settings = (
+        compiled_path(model["save"]),
+        model["time_delta"],
+        simulate["time_window"],
+        data["cache"],
+        threshold,
+        simulate["early_exit"],
+    )
 
     results_logger.info("test")
 
     results = []
-    with multiprocessing.Pool(simulate["cpu_count"]) as pool:
-        for result in tqdm(pool.istarmap(trial_scenario, ins), total=len(ins)):
+    with multiprocessing.Pool(simulate["cpu_count"], init_simulation, settings) as pool:
+        for result in tqdm(pool.imap(simulate_run, run_paths), total=len(run_paths)):
             results.append(result)
 
 
     results_logger.info("done with trials")
 
 
-    # for in_params in ins:
-    #    results.append(trial_scenario(*in_params))
+    # init_simulation(*settings)
+    # results = [simulate_run(run) for run in run_paths]
 
-    if min_likelihood:
-        analyzer = ScenarioAnalyzer(min_likelihood, sacred_run, runs)
-    else:
-        analyzer = ScenarioAnalyzer(simulate["threshold"], sacred_run, runs)
+    analyzer = ScenarioAnalyzer(threshold, sacred_run, runs)
 
     results_logger.debug("Using likelihood threshold of %s", analyzer.threshold)
 
@@ -102,6 +106,11 @@ def my_main(config, sacred_run, min_likelihood=None):
 
     df.to_csv(os.path.join(config["c_results"]["output_path"], "results.csv"))
 
-    analyzer.write_misclassified_runs(only_wrong=False)
+    analyzer.write_curves(config["c_results"]["output_path"])
+    analyzer.write_attributions(config["c_results"]["output_path"])
+
+    analyzer.write_misclassified_runs(config["c_results"]["output_path"], only_wrong=False)
 
     # pickle.dump(analyzer, open(os.path.join(results["output_path"], "analyzer.p"), "wb"))
+
+    return sum(result["timing"]["events"] for result in results)
@@ -5,13 +5,19 @@ Email: petit@informatik.uni-leipzig.de
 Description: Class for analyzing a scenario
 """
 
-from sklearn.metrics import precision_recall_curve
+import os
+import json
+
+from sklearn.metrics import precision_recall_curve, roc_curve, auc, average_precision_score
 from sklearn.metrics import precision_score
 from sklearn.metrics import classification_report
 import pandas as pd
 import numpy as np
 import pudb
 import logging
+from matplotlib import pyplot as plt
+
+from src.metrics import MetricSink
 
 
 class ScenarioAnalyzer(object):
@@ -34,18 +40,38 @@ class ScenarioAnalyzer(object):
         self.results.append(run_result)
 
     def evaluate_runs(self):
+        """Joins the minimum likelihood of every result onto the runs and applies the threshold.
 
-        for i, result in enumerate(self.results):
+        Returns
+        -------
+        runs : pandas.DataFrame
+            the runs with the columns min_likelihood, result_id, prediction_exploit and
+            detection_time in seconds, NaN if the simulation did not record one
+        """
 
-            min_likelihood = np.min(result["likelihoods"])
+        results = pd.DataFrame(
+            {
+                "path": [result["run"] for result in self.results],
+                "min_likelihood": [np.min(result["likelihoods"]) for result in self.results],
+                "result_id": np.arange(len(self.results), dtype=np.int32),
+                "detection_time": [result.get("detection_time", None) for result in self.results],
+            }
+        ).astype({"detection_time": np.float64})
 
-            self.runs.loc[self.runs["path"] == result["run"], "min_likelihood"] = min_likelihood
-            self.runs.loc[self.runs["path"] == result["run"], "result_id"] = i
-            self.runs.loc[self.runs["path"] == result["run"], "prediction_exploit"] = (
-                min_likelihood < self.threshold
-            )
+        # microseconds since the first syscall to seconds, like the times in runs.csv
+        results["detection_time"] /= 1e6
+
+        # a run which was simulated several times keeps its last result
+        results = results.drop_duplicates("path", keep="last").set_index("path")
 
-        self.runs = self.runs.astype({"result_id": "int32"})
+        runs = self.runs.drop(
+            columns=["min_likelihood", "result_id", "prediction_exploit", "detection_time"],
+            errors="ignore",
+        )
+        runs = runs.join(results, on="path")
+        runs["prediction_exploit"] = runs["min_likelihood"] < self.threshold
+
+        self.runs = runs.astype({"result_id": "int32"})
         self.processed_results = self.runs
 
         return self.runs
@@ -84,9 +110,219 @@ class ScenarioAnalyzer(object):
         self.sacred_run.log_scalar("recall", report["True"]["recall"])
         self.sacred_run.log_scalar("f1", report["True"]["f1-score"])
 
+        self.log_costs()
+
+        detection = self.get_detection_report()
+        if detection is not None:
+            for key in ["mean", "50%", "90%", "max"]:
+                name = "median" if key == "50%" else key.replace("%", "")
+                self.sacred_run.log_scalar(f"time_to_detection_{name}", detection[key])
+
+            report_out += f"\nTime to detection [s]\n{detection.to_string()}\n"
+
         return report_out
 
-    def write_misclassified_runs(self, only_wrong=True):
+    def get_detection_report(self):
+        """Distribution of the time to detection of the detected exploit runs.
+
+        The time to detection is counted from the exploit start if runs.csv has the column
+        exploit_start_time, otherwise from the first syscall of the run.
+
+        Returns
+        -------
+        pandas.Series
+            count, mean, std, min, percentiles and max in seconds, None if no detection times were
+            recorded
+        """
+
+        if self.processed_results is None:
+            self.evaluate_runs()
+
+        runs = self.processed_results
+        detected = runs[runs["is_executing_exploit"] & runs["detection_time"].notna()]
+
+        if detected.empty:
+            return None
+
+        time_to_detection = detected["detection_time"]
+        if "exploit_start_time" in detected:
+            time_to_detection = time_to_detection - detected["exploit_start_time"]
+
+        return time_to_detection.describe(percentiles=[0.5, 0.9])
+
+    def get_curves(self):
+        """Precision-recall and ROC curves over all thresholds of the minimum likelihood.
+
+        A run is predicted as exploit if its minimum likelihood is below the threshold. The
+        thresholds of the curves are the ones which change a prediction, so every threshold the
+        single simulation pass could have used is covered.
+
+        Returns
+        -------
+        pr : pandas.DataFrame
+            threshold, precision, recall and f1
+        roc : pandas.DataFrame
+            threshold, false and true positive rate
+        summary : dict
+            area under the roc curve, average precision as area under the precision-recall
+            curve, the best f1 and its threshold
+        """
+
+        if self.processed_results is None:
+            self.evaluate_runs()
+
+        labels = self.processed_results["is_executing_exploit"].to_numpy(dtype=bool)
+        scores = -self.processed_results["min_likelihood"].to_numpy(dtype=np.float64)
+
+        # sklearn predicts score >= t, which is min_likelihood <= -t, the smallest larger
+        # threshold gives the same predictions with min_likelihood < threshold
+        to_threshold = lambda t: np.nextafter(-t, np.inf)
+
+        precision, recall, thresholds = precision_recall_curve(labels, scores)
+        precision, recall = precision[:-1], recall[:-1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+
+        pr = pd.DataFrame(
+            {
+                "threshold": to_threshold(thresholds),
+                "precision": precision,
+                "recall": recall,
+                "f1": f1,
+            }
+        )
+
+        fpr, tpr, thresholds = roc_curve(labels, scores)
+        roc = pd.DataFrame({"threshold": to_threshold(thresholds), "fpr": fpr, "tpr": tpr})
+
+        best = int(np.argmax(f1))
+        summary = {
+            "roc_auc": auc(fpr, tpr),
+            "pr_auc": average_precision_score(labels, scores),
+            "best_f1": float(f1[best]),
+            "best_threshold": float(pr["threshold"].iloc[best]),
+        }
+
+        return pr, roc, summary
+
+    def write_curves(self, output_path):
+        """Writes the curves as csv files and a plot and logs the summary to the sacred run.
+
+        Parameters
+        ----------
+        output_path : str
+            directory of the files
+
+        Returns
+        -------
+        list of str
+            paths of the written files
+        """
+
+        pr, roc, summary = self.get_curves()
+
+        for key, value in summary.items():
+            self.sacred_run.log_scalar(key, value)
+
+        logging.getLogger("hids.results").info("Threshold sweep: %s", summary)
+
+        files = [os.path.join(output_path, name) for name in ["pr_curve.csv", "roc_curve.csv"]]
+        pr.to_csv(files[0], index=False)
+        roc.to_csv(files[1], index=False)
+
+        files.append(os.path.join(output_path, "curves.json"))
+        with open(files[-1], "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+
+        fig, (pr_ax, roc_ax) = plt.subplots(1, 2, figsize=(12, 5))
+
+        pr_ax.plot(pr["recall"], pr["precision"], drawstyle="steps-post")
+        pr_ax.set_title(f"Precision-Recall (AUC {summary['pr_auc']:.3f})")
+        pr_ax.set_xlabel("Recall")
+        pr_ax.set_ylabel("Precision")
+
+        roc_ax.plot(roc["fpr"], roc["tpr"], drawstyle="steps-post")
+        roc_ax.plot([0, 1], [0, 1], color="gray", linestyle="--")
+        roc_ax.set_title(f"ROC (AUC {summary['roc_auc']:.3f})")
+        roc_ax.set_xlabel("False positive rate")
+        roc_ax.set_ylabel("True positive rate")
+
+        files.append(os.path.join(output_path, "curves.png"))
+        fig.savefig(files[-1], bbox_inches="tight")
+        plt.close(fig)
+
+        return files
+
+    def write_attributions(self, output_path):
+        """Writes the least likely transitions of the flagged window of every run as one csv file.
+
+        Parameters
+        ----------
+        output_path : str
+            directory of the file
+
+        Returns
+        -------
+        str
+            path of the written file
+        """
+
+        rows = [
+            {
+                "path": result["run"],
+                "detection_time": result["detection_time"] / 1e6,
+                "rank": rank,
+                "ngram": " ".join(transition["ngram"]),
+                "log_prob": transition["log_prob"],
+                "count": transition["count"],
+            }
+            for result in self.results
+            for rank, transition in enumerate(result.get("attribution") or [])
+        ]
+
+        columns = ["path", "detection_time", "rank", "ngram", "log_prob", "count"]
+        path = os.path.join(output_path, "attributions.csv")
+        pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+
+        return path
+
+    def log_costs(self):
+        """Logs the summed parse and scoring time of the runs next to the scores."""
+
+        timings = [result["timing"] for result in self.results if "timing" in result]
+        if not timings:
+            return
+
+        costs = {key: sum(timing[key] for timing in timings) for key in timings[0]}
+
+        for key, value in costs.items():
+            self.sacred_run.log_scalar(f"simulation_{key}", value)
+
+        self.sacred_run.log_scalar(
+            "simulation_events_per_second",
+            costs["events"] / max(costs["parse_time"] + costs["scoring_time"], 1e-9),
+        )
+
+    def write_misclassified_runs(self, output_path, only_wrong=True, name="window_metrics.npz"):
+        """Writes transitions and likelihood per window of the runs as one sacred artifact.
+
+        The series of all runs are buffered in a MetricSink and written at once, instead of a
+        log_scalar call per window and run.
+
+        Parameters
+        ----------
+        output_path : str
+            directory of the file
+        only_wrong : bool
+            only the misclassified runs
+        name : str
+            name of the file
+
+        Returns
+        -------
+        str
+            path of the written file
+        """
 
         if self.processed_results is None:
             self.evaluate_runs()
@@ -101,6 +337,8 @@ class ScenarioAnalyzer(object):
         else:
             runs = self.processed_results
 
+        sink = MetricSink()
+
         for _, run in runs[runs["min_likelihood"] < -1].iterrows():
             scenario_name = run["scenario_name"]
             result = self.results[run["result_id"]]
@@ -108,10 +346,11 @@ class ScenarioAnalyzer(object):
             time = result["time"]
             exploit = "w_expl" if run["is_executing_exploit"] else "no_expl"
 
-            for i, t in enumerate(time):
-                self.sacred_run.log_scalar(
-                    f"transitions_{scenario_name}_{exploit}", result["transitions"][i], t
-                )
-                self.sacred_run.log_scalar(
-                    f"likelihood_{scenario_name}_{exploit}", result["likelihoods"][i], t
-                )
+            sink.add_series(
+                f"transitions_{scenario_name}_{exploit}", result["transitions"][: len(time)], time
+            )
+            sink.add_series(
+                f"likelihood_{scenario_name}_{exploit}", result["likelihoods"][: len(time)], time
+            )
+
+        return sink.write(os.path.join(output_path, name), self.sacred_run)
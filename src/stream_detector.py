@@ -0,0 +1,280 @@
+"""
+File: stream_detector.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Real-time host intrusion detection on a stream of sysdig formatted syscalls
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+
+import numpy as np
+import pathpy
+
+from src.data_processing import parse_syscall, parse_timestamp
+from src.event_store import default_syscall_map, UNMAPPED_SYSCALL
+from src.likelihood import CompiledModel, WindowTransitions
+
+
+DAY = 24 * 60 * 60 * 1000000
+
+
+class StreamDetector(object):
+    """Scores a live stream of syscalls with the same windows as trial_scenario.
+
+    The windows have a width of window_size and start every step_size microseconds, beginning with
+    the first syscall. A window is scored as soon as the first syscall after its end arrives. Only
+    the syscalls of the current window are kept, so the memory is bounded by the syscall rate.
+    """
+
+    def __init__(self, model, threshold, window_size, step_size=100000, min_transitions=3, top_k=5):
+        """
+        Parameters
+        ----------
+        model : src.likelihood.CompiledModel
+            Created from regular training data
+        threshold : float
+            windows with a lower normalized log-likelihood raise an alert
+        window_size : int
+            width of a window in microseconds
+        step_size : int
+            microseconds between the start of two windows
+        min_transitions : int
+            windows with at most this many syscalls are not scored
+        top_k : int
+            number of least likely transitions added to an alert as its attribution
+        """
+        super(StreamDetector, self).__init__()
+
+        self.model = model
+        self.threshold = threshold
+        self.window_size = window_size
+        self.step_size = step_size
+        self.min_transitions = min_transitions
+        self.top_k = top_k
+
+        self.syscall_map = default_syscall_map()
+        self.unmapped = self.syscall_map[UNMAPPED_SYSCALL]
+
+        self.window = WindowTransitions(model.max_order)
+        self.queue = deque()
+        self.start = None
+        self.last_time = None
+        self.day_offset = 0
+
+        self.events = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def process_line(self, line: str):
+        """Processes a single sysdig formatted line.
+
+        Parameters
+        ----------
+        line : str
+
+        Returns
+        -------
+        list of dict
+            scores of the windows completed by this syscall
+        """
+
+        try:
+            syscall = parse_syscall(line)
+            if syscall[6] != "<":
+                return []
+            timestamp = parse_timestamp(syscall[1])
+            thread = int(syscall[5])
+        except (IndexError, ValueError):
+            logging.getLogger("hids.stream").debug("Skipping malformed line %r", line)
+            return []
+
+        return self.process(timestamp, thread, self.syscall_map.get(syscall[7], self.unmapped))
+
+    def process(self, timestamp: int, thread: int, syscall: int):
+        """Processes a single syscall return.
+
+        Parameters
+        ----------
+        timestamp : int
+            microseconds since midnight
+        thread : int
+        syscall : int
+            syscall id
+
+        Returns
+        -------
+        list of dict
+            scores of the windows completed by this syscall
+        """
+
+        begin = time.perf_counter()
+
+        timestamp = self.monotonic(timestamp)
+
+        if self.start is None:
+            self.start = timestamp
+
+        scores = []
+        while timestamp >= self.start + self.window_size:
+            scores.append(self.score())
+            self.advance()
+
+        if timestamp >= self.start:
+            self.window.enter(thread, syscall)
+            self.queue.append((timestamp, thread))
+
+        latency = (time.perf_counter() - begin) * 1000000
+        self.events += 1
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        return scores
+
+    def monotonic(self, timestamp):
+        """Handles the wrap of the time of day at midnight and slightly unordered syscalls."""
+
+        if self.last_time is not None:
+            if timestamp + self.day_offset < self.last_time - DAY // 2:
+                self.day_offset += DAY
+            timestamp = max(timestamp + self.day_offset, self.last_time)
+
+        self.last_time = timestamp
+        return timestamp
+
+    def score(self):
+        """Scores the current window.
+
+        Returns
+        -------
+        dict
+            time, transitions, likelihood and alert, alerts also have an attribution
+        """
+
+        transitions = len(self.window)
+        likelihood = None
+
+        if transitions > self.min_transitions:
+            try:
+                likelihood = float(self.window.log_likelihood(self.model) - np.log(transitions))
+            except pathpy.utils.exceptions.PathpyException as e:
+                logging.getLogger("hids.stream").info(f"{e}... Setting Likelihood to 0")
+                likelihood = 0.0
+
+        score = {
+            "time": self.start,
+            "transitions": transitions,
+            "likelihood": likelihood,
+            "alert": likelihood is not None and likelihood < self.threshold,
+        }
+
+        if score["alert"]:
+            score["attribution"] = self.window.attribution(self.model, self.top_k)
+
+        return score
+
+    def advance(self):
+        self.start += self.step_size
+
+        while self.queue and self.queue[0][0] < self.start:
+            _, thread = self.queue.popleft()
+            self.window.leave(thread)
+
+    def mean_latency(self):
+        """Mean processing time per syscall in microseconds."""
+        return self.latency / self.events if self.events else 0.0
+
+
+def follow(stream, poll_interval=0.1):
+    """Yields the lines of a file which is still written to, like tail -f.
+
+    Parameters
+    ----------
+    stream : file object
+    poll_interval : float
+        seconds to wait for new data at the end of the file
+    """
+
+    partial = ""
+    while True:
+        line = stream.readline()
+        if not line:
+            time.sleep(poll_interval)
+            continue
+        partial += line
+        if partial.endswith("\n"):
+            yield partial
+            partial = ""
+
+
+def load_threshold(compiled: str, default: float):
+    """Reads the likelihood threshold create_model stored next to the compiled model.
+
+    Parameters
+    ----------
+    compiled : str
+        directory of the compiled model
+    default : float
+        used if create_model did not store a threshold
+
+    Returns
+    -------
+    float
+    """
+
+    try:
+        with open(os.path.join(compiled, "threshold.json")) as threshold_file:
+            return json.load(threshold_file)["min_likelihood"]
+    except (OSError, KeyError, ValueError):
+        return default
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("Description: ")[1])
+    parser.add_argument("model", help="directory of the compiled model written by create_model")
+    parser.add_argument("input", nargs="?", default="-", help="file or FIFO, - for stdin")
+    parser.add_argument("--follow", action="store_true", help="keep reading a growing file")
+    parser.add_argument("--threshold", type=float, help="defaults to the one of create_model")
+    parser.add_argument("--window", type=int, default=200000, help="window size in microseconds")
+    parser.add_argument("--step", type=int, default=100000, help="step size in microseconds")
+    parser.add_argument("--all", action="store_true", help="print the scores of all windows")
+    parser.add_argument("--top-k", type=int, default=5, help="transitions explaining an alert")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("hids.stream")
+
+    model = CompiledModel.load(args.model)
+    threshold = args.threshold
+    if threshold is None:
+        threshold = load_threshold(args.model, -100)
+
+    detector = StreamDetector(model, threshold, args.window, args.step, top_k=args.top_k)
+    logger.info("Using likelihood threshold of %s", threshold)
+
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    lines = follow(stream) if args.follow else stream
+
+    try:
+        for line in lines:
+            for score in detector.process_line(line):
+                if score["alert"] or args.all:
+                    print(json.dumps(score), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info(
+            "Processed %s syscalls, latency per syscall mean %.1f us, max %.1f us",
+            detector.events,
+            detector.mean_latency(),
+            detector.max_latency,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+File: trace_statistics.py
+Author: Jens Petit
+Email: petit@informatik.uni-leipzig.de
+Description: Time and frequency statistics of syscall traces computed on the parsed arrays
+"""
+
+import multiprocessing
+from functools import partial
+
+import numpy as np
+
+from src.data_processing import report_progress
+from src.event_store import decode_syscalls, default_syscall_map
+from src.parse_cache import load_events
+
+
+class LogHistogram(object):
+    """Histogram with logarithmic bins of positive values, e.g. inter-event times in microseconds.
+
+    The bins are fixed, bin i covers [10^(i / bins_per_decade), 10^((i + 1) / bins_per_decade)),
+    so histograms of different runs are merged by adding their counts. Values below one are counted
+    in the first bin and values above the last bin in the last one.
+    """
+
+    def __init__(self, bins_per_decade=100, decades=12, counts=None):
+        """
+        Parameters
+        ----------
+        bins_per_decade : int
+        decades : int
+            the bins cover 1 to 10^decades
+        counts : numpy.ndarray
+            counts of the bins, empty if None
+        """
+        super(LogHistogram, self).__init__()
+
+        self.bins_per_decade = bins_per_decade
+        self.decades = decades
+
+        num_bins = bins_per_decade * decades
+        self.counts = np.zeros(num_bins, dtype=np.int64) if counts is None else counts
+
+    @property
+    def edges(self):
+        return np.logspace(0, self.decades, len(self.counts) + 1)
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def add(self, values):
+        """Counts the values.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+        """
+
+        with np.errstate(divide="ignore"):
+            bins = np.floor(np.log10(values) * self.bins_per_decade)
+
+        bins = np.clip(np.nan_to_num(bins, neginf=0), 0, len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def __add__(self, other):
+        if (self.bins_per_decade, self.decades) != (other.bins_per_decade, other.decades):
+            raise ValueError("Only histograms with the same bins can be added")
+
+        return LogHistogram(self.bins_per_decade, self.decades, self.counts + other.counts)
+
+    def percentile(self, q):
+        """The upper edge of the bin which contains the q-th percentile.
+
+        Parameters
+        ----------
+        q : float
+            between 0 and 100
+
+        Returns
+        -------
+        float
+        """
+
+        position = np.searchsorted(np.cumsum(self.counts), q / 100 * self.total)
+        return self.edges[min(position + 1, len(self.counts))]
+
+
+class TraceStatistics(object):
+    """Mergeable statistics of one or many syscall traces.
+
+    The inter-event times are the differences between consecutive distinct time stamps of the edges
+    of the temporal network of a run, the same as TemporalNetwork.inter_event_times. Their
+    distribution is kept as a LogHistogram together with the moments needed for the mean, the
+    standard deviation and the burstiness. Mean and maximum of every run and the syscall rates of
+    every thread are kept per run.
+    """
+
+    def __init__(
+        self,
+        histogram,
+        moments,
+        syscalls,
+        run_means,
+        run_maxima,
+        thread_rates,
+        observation_length,
+    ):
+        """
+        Parameters
+        ----------
+        histogram : LogHistogram
+            inter-event times in microseconds
+        moments : numpy.ndarray
+            count, sum, sum of squares, minimum and maximum of the inter-event times
+        syscalls : numpy.ndarray of int
+            number of calls per syscall id
+        run_means : numpy.ndarray
+            per run the mean inter-event time in microseconds
+        run_maxima : numpy.ndarray
+            per run the maximum inter-event time in microseconds
+        thread_rates : numpy.ndarray
+            per thread of every run its syscalls per second
+        observation_length : int
+            summed observation lengths of the runs in microseconds
+        """
+        super(TraceStatistics, self).__init__()
+
+        self.histogram = histogram
+        self.moments = moments
+        self.syscalls = syscalls
+        self.run_means = run_means
+        self.run_maxima = run_maxima
+        self.thread_rates = thread_rates
+        self.observation_length = observation_length
+
+    @classmethod
+    def from_events(cls, events, bins_per_decade=100):
+        """Statistics of a single run.
+
+        Parameters
+        ----------
+        events : src.event_store.EventStore
+        bins_per_decade : int
+
+        Returns
+        -------
+        TraceStatistics
+        """
+
+        # the temporal network has an edge at the time of every syscall but the last
+        times = np.unique(events.time[:-1])
+        inter_event_times = np.diff(times).astype(np.float64)
+
+        histogram = LogHistogram(bins_per_decade)
+        histogram.add(inter_event_times)
+
+        if len(inter_event_times):
+            moments = np.array(
+                [
+                    len(inter_event_times),
+                    inter_event_times.sum(),
+                    np.square(inter_event_times).sum(),
+                    inter_event_times.min(),
+                    inter_event_times.max(),
+                ]
+            )
+            run_means = inter_event_times.mean(keepdims=True)
+            run_maxima = inter_event_times.max(keepdims=True)
+        else:
+            moments = np.array([0, 0, 0, np.inf, -np.inf])
+            run_means = run_maxima = np.zeros(0)
+
+        observation_length = int(times[-1] - times[0]) if len(times) else 0
+
+        _, thread_counts = np.unique(events.thread_id, return_counts=True)
+        thread_rates = thread_counts / max(observation_length / 1e6, 1e-6)
+
+        syscalls = np.bincount(events.syscall, minlength=len(default_syscall_map()))
+
+        return cls(
+            histogram, moments, syscalls, run_means, run_maxima, thread_rates, observation_length
+        )
+
+    @classmethod
+    def merge(cls, statistics):
+        """Combines the statistics of several runs in a single pass.
+
+        Parameters
+        ----------
+        statistics : iterable of TraceStatistics
+
+        Returns
+        -------
+        TraceStatistics
+        """
+
+        statistics = iter(statistics)
+        first = next(statistics)
+
+        histogram = first.histogram.counts.copy()
+        moments = first.moments.copy()
+        syscalls = first.syscalls.astype(np.int64)
+        per_run = [[first.run_means], [first.run_maxima], [first.thread_rates]]
+        observation_length = first.observation_length
+
+        # folded one after the other, so the runs of a pool are merged as they arrive
+        for s in statistics:
+            histogram += s.histogram.counts
+            moments[:3] += s.moments[:3]
+            moments[3] = min(moments[3], s.moments[3])
+            moments[4] = max(moments[4], s.moments[4])
+            syscalls[: len(s.syscalls)] += s.syscalls
+            for values, run_values in zip(per_run, [s.run_means, s.run_maxima, s.thread_rates]):
+                values.append(run_values)
+            observation_length += s.observation_length
+
+        return cls(
+            LogHistogram(first.histogram.bins_per_decade, first.histogram.decades, histogram),
+            moments,
+            syscalls,
+            *[np.concatenate(values) for values in per_run],
+            observation_length,
+        )
+
+    def __add__(self, other):
+        return TraceStatistics.merge([self, other])
+
+    @property
+    def mean(self):
+        return self.moments[1] / max(self.moments[0], 1)
+
+    @property
+    def std(self):
+        return np.sqrt(max(self.moments[2] / max(self.moments[0], 1) - self.mean**2, 0))
+
+    @property
+    def burstiness(self):
+        """(std - mean) / (std + mean) of the inter-event times, -1 periodic, 0 Poisson, 1 bursty"""
+        return (self.std - self.mean) / max(self.std + self.mean, 1e-9)
+
+    def summary(self):
+        """The statistics of the inter-event times and of the thread rates as a dict."""
+
+        return {
+            "runs": len(self.run_means),
+            "inter_event_times": int(self.moments[0]),
+            "min": self.moments[3],
+            "max": self.moments[4],
+            "mean": self.mean,
+            "std": self.std,
+            "burstiness": self.burstiness,
+            "median": self.histogram.percentile(50),
+            "percentile_90": self.histogram.percentile(90),
+            "percentile_99": self.histogram.percentile(99),
+            "threads": len(self.thread_rates),
+            "mean_thread_rate": self.thread_rates.mean() if len(self.thread_rates) else 0.0,
+            "observation_length": self.observation_length,
+        }
+
+    def most_frequent_syscalls(self, num=20):
+        """Names and counts of the most frequent syscalls.
+
+        Returns
+        -------
+        list of tuple of str and int
+        """
+
+        ids = np.argsort(-self.syscalls, kind="stable")[:num]
+        ids = ids[self.syscalls[ids] > 0]
+        return list(zip(decode_syscalls(ids).tolist(), self.syscalls[ids].tolist()))
+
+
+def run_statistics(run: str, cache_dir=None):
+    """Worker of dataset_statistics, the statistics of a single run."""
+
+    return TraceStatistics.from_events(load_events(run, cache_dir))
+
+
+def dataset_statistics(runs, cache_dir=None, processes=1, chunksize=4):
+    """Computes the statistics of all runs with a pool of worker processes.
+
+    Parameters
+    ----------
+    runs : pandas.DataFrame
+        Content of runs.csv file
+    cache_dir : str
+        Location of the parse cache, if None every run is parsed
+    processes : int
+        Number of worker processes, with 1 the runs are processed in this process
+    chunksize : int
+        Runs handed to a worker at once
+
+    Returns
+    -------
+    TraceStatistics
+    """
+
+    compute = partial(run_statistics, cache_dir=cache_dir)
+    total = len(runs)
+
+    if processes > 1 and total > 1:
+        with multiprocessing.Pool(min(processes, total)) as pool:
+            return TraceStatistics.merge(
+                report_progress(pool.imap(compute, runs["path"], chunksize), total)
+            )
+
+    return TraceStatistics.merge(report_progress(map(compute, runs["path"]), total))
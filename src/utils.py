@@ -93,18 +93,24 @@ def config_adapt(config):
         my_config["data"]["raw"], my_config["dataset"], "runs.csv"
     )
     my_config["data"]["scenarios"] = os.path.join(my_config["data"]["raw"], my_config["dataset"])
+    my_config["data"]["cache"] = (
+        os.path.join(my_config["data"]["interim"], my_config["dataset"], "parse_cache")
+        if my_config["data"]["parse_cache"]
+        else None
+    )
 
     my_config["timestamp"] = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     my_config["simulate"]["cpu_count"] = multiprocessing.cpu_count()
 
     my_config["model"]["paths"] = os.path.join(
-        my_config["data"]["processed"], f'temp_paths_{my_config["model"]["time_delta"]}.p'
+        my_config["data"]["processed"], f'temp_paths_{my_config["model"]["time_delta"]}'
     )
     my_config["model"]["save"] = os.path.join(
         my_config["model"]["prefix"],
         my_config["dataset"],
-        f'MOM_delta_{my_config["model"]["time_delta"]}_prior_{my_config["model"]["prior"]}.p',
+        f'MOM_delta_{my_config["model"]["time_delta"]}_prior_{my_config["model"]["prior"]}',
     )
+    my_config["model"]["compiled"] = my_config["model"]["save"] + "_tables"
 
     my_config["c_results"]["output_path"] = os.path.join(
         my_config["c_results"]["prefix"], my_config["dataset"], my_config["timestamp"]
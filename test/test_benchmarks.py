@@ -0,0 +1,16 @@
+import pytest
+from .context import src
+
+from benchmarks import bench_pipeline
+
+
+def test_benchmarks(tmp_path):
+    results = bench_pipeline.run_benchmarks([2000], repeat=1, directory=str(tmp_path))
+
+    assert "trial_scenario" in {result["stage"] for result in results}
+    assert all(len(result["seconds"]) == 1 for result in results)
+
+    path = bench_pipeline.save_results(results, str(tmp_path / "results"))
+
+    assert bench_pipeline.latest_results(str(tmp_path / "results")) == path
+    assert bench_pipeline.compare(results, path) == []
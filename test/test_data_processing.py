@@ -1,6 +1,8 @@
 import pytest
 import os
 import pathpy
+import numpy as np
+import pandas as pd
 import subprocess
 from .context import src
 
@@ -130,3 +132,45 @@ def test_full_pipeline():
         ]
     )
     assert True
+
+
+@pytest.mark.parametrize(
+    "times, microseconds",
+    [
+        (["00:10:46.675969994"], [646675969]),
+        (["21:09:45.230382300", "21:09:45.230383999"], [76185230382, 76185230383]),
+    ],
+)
+def test_parse_timestamps(times, microseconds):
+    result = src.data_processing.parse_timestamps(np.array(times, dtype=object))
+
+    assert result.tolist() == microseconds
+
+
+def test_parse_run():
+    parsed = src.data_processing.parse_run("test/mock_run_2.txt")
+
+    assert len(parsed.time) == 49
+    assert parsed.direction[0] == b"<"
+    assert parsed.syscall_names[parsed.syscall[0]] == "futex"
+    assert parsed.thread_id[0] == 22467
+
+
+def test_thread_index():
+    run_data = src.data_processing.parse_run_to_pandas("test/mock_run_2.txt")
+    random = np.random.RandomState(0)
+    run_data = pd.concat([run_data] * 20, ignore_index=True)
+    run_data["time"] = np.sort(random.randint(0, 1000000, len(run_data)))
+    run_data["thread_id"] = random.randint(0, 7, len(run_data))
+
+    index = src.data_processing.ThreadIndex.from_frame(run_data)
+
+    for window in [None, (0, 2000000), (-5, 100), (200000, 400000), (500000, 500000)]:
+        selected = run_data
+        if window is not None:
+            selected = run_data[(run_data["time"] >= window[0]) & (run_data["time"] < window[1])]
+        expected = [data["syscall"].to_list() for _, data in selected.groupby("thread_id")]
+
+        paths = index.window(*window) if window is not None else index.window()
+
+        assert [index.syscall_names[path].tolist() for path in paths] == expected
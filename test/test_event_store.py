@@ -0,0 +1,49 @@
+import pytest
+import numpy as np
+from .context import src
+
+import src.event_store
+
+
+def test_event_store_from_file():
+    events = src.event_store.EventStore.from_file("test/mock_run_2.txt")
+    data = src.data_processing.parse_run_to_pandas("test/mock_run_2.txt")
+
+    assert events.syscall.dtype == np.uint16
+    assert events.thread_id.dtype == np.int32
+    assert events.time.dtype == np.int64
+    assert events.time.tolist() == data["time"].tolist()
+    assert events.thread_id.tolist() == data["thread_id"].tolist()
+    assert events.syscall_names().tolist() == data["syscall"].tolist()
+
+
+def test_event_store_accepted_by_pipelines():
+    events = src.event_store.EventStore.from_file("test/mock_run_2.txt")
+
+    from_file = src.data_processing.generate_temporal_network("test/mock_run_2.txt")
+    from_store = src.data_processing.generate_temporal_network(events)
+
+    assert from_file.tedges == from_store.tedges
+
+
+@pytest.mark.parametrize(
+    "names, decoded",
+    [(["futex", "read"], ["futex", "read"]), (["futex", "no_such_syscall"], ["futex", "unmapped"])],
+)
+def test_encode_decode_syscalls(names, decoded):
+    ids = src.event_store.encode_syscalls(names)
+
+    assert src.event_store.decode_syscalls(ids).tolist() == decoded
+
+
+def test_encode_syscalls_unmapped():
+    names = ["futex", "llseek", "container", "page_fault"]
+    ids = src.event_store.encode_syscalls(names)
+
+    assert src.event_store.decode_syscalls(ids).tolist() == names
+    # ids of saved counts and models stay valid
+    assert src.event_store.encode_syscalls(["pwrite", "unknown"]).tolist() == [340, 341]
+
+    # names missing in the table are not the unknown node of a model with prior
+    ids = src.event_store.encode_syscalls(["no_such_syscall", "other_syscall", "unknown"])
+    assert ids[0] == ids[1] != ids[2]
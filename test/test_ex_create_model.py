@@ -0,0 +1,204 @@
+import os
+import copy
+import json
+
+import pytest
+import pandas as pd
+import pathpy
+from .context import src
+
+import src.ex_create_model
+from src.path_counts import PathCounts
+from src.preprocess_experiment import preprocess
+from benchmarks.recordings import write_recording
+from .test_path_counts import PriorModel
+
+
+class MockRun(object):
+    def __init__(self):
+        self.scalars = []
+        self.artifacts = []
+
+    def log_scalar(self, name, value, step=None):
+        self.scalars.append((name, value, step))
+
+    def add_artifact(self, filename, name=None):
+        self.artifacts.append(filename)
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setattr(pathpy, "MultiOrderModel", PriorModel)
+
+    data = tmp_path / "data"
+    data.mkdir()
+
+    names = [f"normal_{i}" for i in range(6)]
+    for seed, name in enumerate(names):
+        write_recording(data / f"{name}.txt", 2000, num_threads=5, seed=seed)
+
+    pd.DataFrame({"scenario_name": names, "is_executing_exploit": False}).to_csv(
+        data / "runs.csv", index=False
+    )
+
+    (tmp_path / "results").mkdir()
+
+    return {
+        "data": {"runs": str(data / "runs.csv"), "cache": None},
+        "model": {
+            "paths": str(tmp_path / "paths"),
+            "save": str(tmp_path / "model"),
+            "compiled": str(tmp_path / "model_tables"),
+            "prior": 1,
+            "unknown": True,
+            "time_delta": 0,
+            "train_examples": 3,
+            "max_order": 3,
+            "out_of_core": False,
+            "rescore_share": 0.1,
+        },
+        "simulate": {"cpu_count": 1, "threshold": -100, "time_window": 10000},
+        "c_results": {"output_path": str(tmp_path / "results")},
+    }
+
+
+@pytest.mark.parametrize("unknown", [False, True])
+def test_create_model_order(config, monkeypatch, unknown):
+    config["model"]["unknown"] = unknown
+    preprocess(config)
+
+    estimated = []
+
+    def estimate_order(model):
+        estimated.append(model.unknown)
+        return 2
+
+    monkeypatch.setattr(PriorModel, "estimate_order", estimate_order)
+
+    _, transitions = src.ex_create_model.create_model(config, MockRun())
+    assert transitions == PathCounts.load(config["model"]["paths"]).total_transitions
+
+    # the order is estimated without the unknown node, as before the parallel fit
+    assert estimated == [False]
+
+    parameters, _ = src.ex_create_model.read_model(config["model"]["save"])
+    assert parameters == {"max_order": 2, "prior": 1, "unknown": unknown}
+
+    model = src.ex_create_model.refit_model(config["model"]["save"])
+    assert model.max_order == 2
+    assert model.unknown == unknown
+
+
+def test_save_model_counts(config):
+    preprocess(config)
+    src.ex_create_model.create_model(config, MockRun())
+
+    # the model points to the counts it was fitted to instead of copying them
+    assert not any(name.endswith(".npy") for name in os.listdir(config["model"]["save"]))
+
+    _, counts = src.ex_create_model.read_model(config["model"]["save"])
+    assert counts.total_transitions == PathCounts.load(config["model"]["paths"]).total_transitions
+
+    config["model"]["train_examples"] = 2
+    preprocess(config)
+
+    with pytest.raises(ValueError, match="create_model"):
+        src.ex_create_model.refit_model(config["model"]["save"])
+
+
+def assert_same_counts(counts, expected):
+    assert sorted(counts.paths) == sorted(expected.paths)
+    for length in expected.paths:
+        assert (counts.paths[length] == expected.paths[length]).all()
+        assert (counts.counts[length] == expected.counts[length]).all()
+
+
+def read_threshold(config):
+    with open(os.path.join(config["model"]["compiled"], "threshold.json")) as threshold_file:
+        return json.load(threshold_file)["min_likelihood"]
+
+
+def test_update_model_removed_run(config):
+    preprocess(config)
+    src.ex_create_model.create_model(config, MockRun())
+
+    config["model"]["train_examples"] = 2
+
+    with pytest.raises(ValueError, match="no longer training runs"):
+        src.ex_create_model.update_model(config, MockRun())
+
+
+def test_update_model_no_new_runs(config):
+    preprocess(config)
+    min_likelihood, _ = src.ex_create_model.create_model(config, MockRun())
+    counts = PathCounts.load(config["model"]["paths"])
+
+    assert src.ex_create_model.update_model(config, MockRun()) == (min_likelihood, 0)
+
+    assert_same_counts(PathCounts.load(config["model"]["paths"]), counts)
+    assert read_threshold(config) == min_likelihood
+
+
+@pytest.mark.parametrize("out_of_core", [False, True])
+def test_update_model_counts(config, tmp_path, out_of_core):
+    config["model"]["out_of_core"] = out_of_core
+    preprocess(config)
+    src.ex_create_model.create_model(config, MockRun())
+
+    config["model"]["train_examples"] = 5
+    _, transitions = src.ex_create_model.update_model(config, MockRun())
+
+    # a model created from scratch with all runs
+    full = copy.deepcopy(config)
+    for name in ["paths", "save", "compiled"]:
+        full["model"][name] = str(tmp_path / "full" / name)
+    preprocess(full)
+    src.ex_create_model.create_model(full, MockRun())
+
+    _, counts = src.ex_create_model.read_model(config["model"]["save"])
+    assert_same_counts(counts, PathCounts.load(full["model"]["paths"]))
+    assert transitions == counts.total_transitions
+
+    runs = pd.read_csv(os.path.join(config["model"]["paths"], "runs.csv"))
+    assert sorted(runs["path"]) == sorted(
+        pd.read_csv(os.path.join(full["model"]["paths"], "runs.csv"))["path"]
+    )
+
+
+@pytest.mark.parametrize("rescore_share, rescored", [(1.0, False), (0.0, True)])
+def test_update_model_rescore(config, monkeypatch, rescore_share, rescored):
+    preprocess(config)
+    src.ex_create_model.create_model(config, MockRun())
+    old_runs = pd.read_csv(os.path.join(config["model"]["paths"], "runs.csv"))["path"].tolist()
+
+    scored = []
+    score_training_runs = src.ex_create_model.score_training_runs
+
+    def score_spy(config, sacred_run, runs):
+        scored.append(sorted(runs["path"]))
+        return score_training_runs(config, sacred_run, runs)
+
+    monkeypatch.setattr(src.ex_create_model, "score_training_runs", score_spy)
+
+    config["model"]["train_examples"] = 5
+    config["model"]["rescore_share"] = rescore_share
+    min_likelihood, _ = src.ex_create_model.update_model(config, MockRun())
+
+    all_runs = pd.read_csv(os.path.join(config["model"]["paths"], "runs.csv"))["path"].tolist()
+    new_runs = sorted(set(all_runs) - set(old_runs))
+    assert len(new_runs) == 2
+
+    likelihoods = pd.read_csv(os.path.join(config["model"]["compiled"], "train_likelihoods.csv"))
+    versions = likelihoods.set_index("path")["model_version"]
+
+    if rescored:
+        assert scored == [sorted(all_runs)]
+        assert (versions == 2).all()
+    else:
+        assert scored == [new_runs]
+        assert (versions[new_runs] == 2).all()
+        assert (versions[old_runs] == 1).all()
+
+    assert sorted(likelihoods["path"]) == sorted(all_runs)
+    assert min_likelihood == likelihoods["min_likelihood"].quantile(0.2)
+    assert read_threshold(config) == min_likelihood
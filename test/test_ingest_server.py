@@ -0,0 +1,95 @@
+import asyncio
+import pathpy
+from .context import src
+
+import src.likelihood
+import src.ingest_server
+import src.stream_detector
+from .test_stream_detector import write_recording
+
+
+def test_ingest_server_isolates_hosts(tmp_path):
+    runs = [str(tmp_path / "run_a.txt"), str(tmp_path / "run_b.txt")]
+    write_recording(runs[0], 1500, seed=1)
+    write_recording(runs[1], 1000, seed=2)
+
+    run_data = src.data_processing.parse_run_to_pandas(runs[0])
+    model = src.likelihood.compile_model(
+        pathpy.MultiOrderModel(src.data_processing.generate_paths_from_threads(run_data), 1)
+    )
+
+    scores = {"a": [], "b": []}
+    server = src.ingest_server.IngestServer(
+        model, -1.5, 200000, queue_size=2, on_score=lambda host, score: scores[host].append(score)
+    )
+    socket = str(tmp_path / "ingest.sock")
+
+    async def scenario():
+        serving = asyncio.ensure_future(server.serve(unix=socket))
+        await asyncio.sleep(0.1)
+        answers = await asyncio.gather(
+            src.ingest_server.replay(runs[0], "a", unix=socket),
+            src.ingest_server.replay(runs[1], "b", unix=socket),
+        )
+        metrics = server.metrics()
+        serving.cancel()
+        return answers, metrics
+
+    answers, metrics = asyncio.run(scenario())
+
+    assert answers == ["processed 3000\n", "processed 2000\n"]
+    assert set(metrics) == {"a", "b"}
+
+    for host, run in zip(["a", "b"], runs):
+        detector = src.stream_detector.StreamDetector(model, -1.5, 200000)
+        expected = []
+        with open(run) as recording:
+            for line in recording:
+                expected += detector.process_line(line)
+        assert scores[host] == expected
+
+
+def test_ingest_server_survives_bad_lines(tmp_path, monkeypatch):
+    run = str(tmp_path / "run.txt")
+    write_recording(run, 500, seed=1)
+
+    model = src.likelihood.compile_model(
+        pathpy.MultiOrderModel(
+            src.data_processing.generate_paths_from_threads(
+                src.data_processing.parse_run_to_pandas(run)
+            ),
+            1,
+        )
+    )
+
+    with open(run, "ab") as recording:
+        recording.write(b"\xff\xfe not utf-8\nboom\n")
+
+    process_line = src.stream_detector.StreamDetector.process_line
+
+    def failing_process_line(detector, line):
+        if line == "boom":
+            raise RuntimeError("bad line")
+        return process_line(detector, line)
+
+    monkeypatch.setattr(src.stream_detector.StreamDetector, "process_line", failing_process_line)
+
+    server = src.ingest_server.IngestServer(
+        model, -1.5, 200000, on_score=lambda host, score: None, idle_timeout=0
+    )
+    socket = str(tmp_path / "ingest.sock")
+
+    async def scenario():
+        serving = asyncio.ensure_future(server.serve(unix=socket))
+        await asyncio.sleep(0.1)
+        answer = await src.ingest_server.replay(run, "a", unix=socket)
+        metrics = server.metrics()
+        expired = server.expire_hosts()
+        serving.cancel()
+        return answer, metrics, expired
+
+    answer, metrics, expired = asyncio.run(scenario())
+
+    assert answer == "processed 1002\n"
+    assert metrics["a"]["dropped_lines"] == 1
+    assert expired == ["a"] and not server.hosts
@@ -0,0 +1,48 @@
+import pytest
+from .context import src
+
+import src.instrumentation
+
+
+class MockRun(object):
+    def __init__(self):
+        self.scalars = {}
+
+    def log_scalar(self, name, value, step=None):
+        self.scalars.setdefault(name, []).append(value)
+
+
+def test_instrumentation():
+    instrumentation = src.instrumentation.Instrumentation()
+
+    with instrumentation.stage("parse") as record:
+        sum(range(100000))
+        record["events"] = 1000
+    with instrumentation.stage("model"):
+        pass
+
+    run = MockRun()
+    instrumentation.log_scalars(run)
+
+    assert run.scalars["parse_events"] == [1000]
+    assert run.scalars["parse_wall_time"][0] > 0
+    assert run.scalars["parse_peak_rss_so_far_mb"][0] > 0
+    assert "parse_events_per_second" in run.scalars
+    assert "model_cpu_time" in run.scalars
+    assert "model_events" not in run.scalars
+
+
+def test_instrumentation_failed_stage():
+    instrumentation = src.instrumentation.Instrumentation()
+
+    with pytest.raises(RuntimeError):
+        with instrumentation.stage("model") as record:
+            record["events"] = 10
+            raise RuntimeError("fit failed")
+
+    run = MockRun()
+    instrumentation.log_scalars(run)
+
+    assert run.scalars["model_failed"] == [1]
+    assert run.scalars["model_events"] == [10]
+    assert "model_wall_time" in run.scalars
@@ -0,0 +1,214 @@
+import pickle
+import multiprocessing
+
+import pytest
+import numpy as np
+import pathpy
+from .context import src
+
+import src.event_store
+import src.likelihood
+import src.attack_simulate
+import src.path_counts
+import src.ex_create_model
+from src.attack_simulate import compute_total_transitions
+
+
+def random_events(num_events, seed=0):
+    random = np.random.RandomState(seed)
+    syscalls = src.event_store.encode_syscalls(["futex", "read", "write", "poll", "close"])
+
+    time = np.cumsum(random.randint(1, 10000, num_events))
+    thread_id = random.randint(0, 5, num_events)
+    syscall = syscalls[np.cumsum(random.randint(1, 3, num_events)) % len(syscalls)]
+
+    return src.event_store.EventStore(time - time[0], thread_id, syscall)
+
+
+@pytest.mark.parametrize("max_order", [0, 1, 2, 3])
+def test_incremental_scorer(max_order):
+    events = random_events(3000)
+    run_data = src.data_processing.parse_run_to_pandas(events)
+    model = pathpy.MultiOrderModel(
+        src.data_processing.generate_paths_from_threads(run_data), max_order
+    )
+
+    scorer = src.likelihood.IncrementalScorer(src.likelihood.TransitionLogProbs(model), events)
+
+    windows = [(start, start + 200000) for start in range(0, 14000000, 100000)]
+    windows += [(14300000, 14350000), (14600000, 14800000)]
+
+    for window in windows:
+        paths = src.data_processing.generate_paths_from_threads(run_data, window)
+
+        total_transitions = compute_total_transitions(paths) if paths.paths else 0
+
+        assert scorer.move(*window) == total_transitions
+        if total_transitions > 3:
+            assert scorer.log_likelihood() == pytest.approx(model.likelihood(paths, log=True))
+
+
+@pytest.mark.parametrize("max_order", [0, 1, 2])
+def test_compiled_model(max_order, tmp_path):
+    events = random_events(3000)
+    run_data = src.data_processing.parse_run_to_pandas(events)
+    model = pathpy.MultiOrderModel(
+        src.data_processing.generate_paths_from_threads(run_data), max_order
+    )
+
+    src.likelihood.compile_model(model).save(str(tmp_path))
+    compiled = src.likelihood.CompiledModel.load(str(tmp_path), mmap_mode="r")
+
+    for window in [(0, 200000), (1000000, 1500000), (5000000, 5100000)]:
+        paths = src.data_processing.generate_paths_from_threads(run_data, window)
+
+        assert compiled.likelihood(paths) == pytest.approx(model.likelihood(paths, log=True))
+
+
+def test_migrate_model(tmp_path):
+    run_data = src.data_processing.parse_run_to_pandas(random_events(3000))
+    paths = src.data_processing.generate_paths_from_threads(run_data)
+    model = pathpy.MultiOrderModel(paths, 2)
+
+    with open(tmp_path / "MOM_delta_0_prior_1.p", "wb") as model_file:
+        pickle.dump(model, model_file)
+
+    save = str(tmp_path / "MOM_delta_0_prior_1")
+    compiled = src.ex_create_model.load_model(save)
+
+    assert compiled.likelihood(paths) == pytest.approx(model.likelihood(paths, log=True))
+
+    counts = src.path_counts.PathCounts.load(save)
+    assert counts.total_transitions == compute_total_transitions(paths)
+
+    with pytest.raises(FileNotFoundError, match="create_model"):
+        src.ex_create_model.load_model(str(tmp_path / "missing"))
+
+
+def test_compiled_model_unknown_node():
+    events = random_events(100)
+    run_data = src.data_processing.parse_run_to_pandas(events)
+    model = pathpy.MultiOrderModel(src.data_processing.generate_paths_from_threads(run_data), 1)
+
+    compiled = src.likelihood.compile_model(model)
+
+    with pytest.raises(pathpy.utils.exceptions.PathpyNotImplemented):
+        compiled[tuple(src.event_store.encode_syscalls(["futex", "execve"]))]
+
+
+def test_simulation_pool(tmp_path):
+    runs = ["test/mock_run.txt", "test/mock_run_2.txt"]
+    paths = src.data_processing.generate_paths_from_threads(
+        src.data_processing.parse_run_to_pandas(runs[1])
+    )
+    compiled = src.likelihood.compile_model(pathpy.MultiOrderModel(paths, 1))
+    compiled.save(str(tmp_path))
+
+    settings = (str(tmp_path), 0, 200000, None)
+    with multiprocessing.Pool(2, src.attack_simulate.init_simulation, settings) as pool:
+        results = pool.map(src.attack_simulate.simulate_run, runs)
+
+    for run, result in zip(runs, results):
+        expected = src.attack_simulate.trial_scenario(compiled, run, 0, 200000)
+        for key in ["run", "likelihoods", "transitions", "time"]:
+            assert result[key] == expected[key]
+
+
+@pytest.mark.parametrize("max_order", [0, 1, 2, 3])
+@pytest.mark.parametrize("batch_size", [50, 1 << 22])
+def test_window_log_likelihoods(max_order, batch_size):
+    training = src.data_processing.parse_run_to_pandas(random_events(3000, seed=1))
+    compiled = src.likelihood.compile_model(
+        pathpy.MultiOrderModel(src.data_processing.generate_paths_from_threads(training), max_order)
+    )
+
+    # the model never saw execve, windows with it cannot be scored
+    events = random_events(3000)
+    execve = (events.time > 3000000) & (events.time < 3100000)
+    events.syscall[execve] = src.event_store.encode_syscalls(["execve"])[0]
+
+    starts = np.arange(0, 14000000, 100000)
+    counts, log_likelihoods = src.likelihood.window_log_likelihoods(
+        compiled, events, starts, 200000, batch_size
+    )
+
+    scorer = src.likelihood.IncrementalScorer(compiled, events)
+    for start, count, log_likelihood in zip(starts, counts, log_likelihoods):
+        assert scorer.move(start, start + 200000) == count
+        if start + 200000 <= 3000000 or start >= 3100000:
+            assert log_likelihood == pytest.approx(scorer.log_likelihood())
+        else:
+            assert np.isnan(log_likelihood)
+            with pytest.raises(pathpy.utils.exceptions.PathpyNotImplemented):
+                scorer.log_likelihood()
+
+
+def test_trial_scenario_early_exit():
+    events = random_events(3000)
+    compiled = src.likelihood.compile_model(
+        pathpy.MultiOrderModel(
+            src.data_processing.generate_paths_from_threads(
+                src.data_processing.parse_run_to_pandas(events)
+            ),
+            2,
+        )
+    )
+
+    full = src.attack_simulate.trial_scenario(compiled, events, 0, 200000)
+    threshold = np.median(full["likelihoods"])
+    first = int(np.argmax(np.array(full["likelihoods"]) < threshold))
+
+    flagged = src.attack_simulate.trial_scenario(compiled, events, 0, 200000, None, threshold)
+    stopped = src.attack_simulate.trial_scenario(compiled, events, 0, 200000, None, threshold, True)
+
+    assert full["detection_time"] is None
+    assert flagged["likelihoods"] == full["likelihoods"]
+    assert flagged["detection_time"] == full["time"][first] + 200000
+    assert stopped["detection_time"] == flagged["detection_time"]
+    assert stopped["likelihoods"] == full["likelihoods"][: first + 1]
+    assert full["attribution"] is None
+    assert stopped["attribution"] == flagged["attribution"]
+    assert len(flagged["attribution"]) == 5
+
+
+def test_window_attribution():
+    events = random_events(3000)
+    model = pathpy.MultiOrderModel(
+        src.data_processing.generate_paths_from_threads(
+            src.data_processing.parse_run_to_pandas(events)
+        ),
+        2,
+    )
+    compiled = src.likelihood.compile_model(model)
+    log_probs = src.likelihood.TransitionLogProbs(model)
+
+    for window in [(0, 200000), (5000000, 5300000)]:
+        attribution = src.likelihood.window_attribution(compiled, events, *window, k=1000)
+        expected = src.likelihood.window_attribution(log_probs, events, *window, k=1000)
+
+        assert [t["ngram"] for t in attribution] == [t["ngram"] for t in expected]
+        assert [t["log_prob"] for t in attribution] == pytest.approx(
+            [t["log_prob"] for t in expected]
+        )
+
+        # all transitions of the window add up to its log-likelihood
+        scorer = src.likelihood.IncrementalScorer(compiled, events)
+        scorer.move(*window)
+        assert sum(t["log_prob"] * t["count"] for t in attribution) == pytest.approx(
+            scorer.log_likelihood()
+        )
+
+        log_probs_sorted = [t["log_prob"] for t in attribution]
+        assert log_probs_sorted == sorted(log_probs_sorted)
+
+    # a syscall not seen in training is the first explanation
+    syscall = events.syscall.copy()
+    syscall[1000] = src.event_store.encode_syscalls(["execve"])[0]
+    unseen = src.event_store.EventStore(events.time, events.thread_id, syscall)
+
+    start = int(events.time[1000]) - 100000
+    attribution = src.likelihood.window_attribution(compiled, unseen, start, start + 200000, k=3)
+
+    assert len(attribution) == 3
+    assert attribution[0]["log_prob"] is None
+    assert "execve" in attribution[0]["ngram"]
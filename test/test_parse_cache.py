@@ -0,0 +1,32 @@
+import os
+import shutil
+import numpy as np
+from .context import src
+
+import src.parse_cache
+
+
+def test_load_events_cached(tmp_path):
+    run_file = str(tmp_path / "run.txt")
+    shutil.copy("test/mock_run_2.txt", run_file)
+    cache_dir = str(tmp_path / "cache")
+
+    parsed = src.parse_cache.load_events(run_file, cache_dir)
+    cached = src.parse_cache.load_events(run_file, cache_dir)
+
+    assert isinstance(cached.syscall, np.memmap) or isinstance(cached.syscall.base, np.memmap)
+    for column in src.parse_cache.COLUMNS:
+        assert getattr(parsed, column).tolist() == getattr(cached, column).tolist()
+
+
+def test_load_events_invalidated(tmp_path):
+    run_file = str(tmp_path / "run.txt")
+    shutil.copy("test/mock_run_2.txt", run_file)
+    cache_dir = str(tmp_path / "cache")
+
+    src.parse_cache.load_events(run_file, cache_dir)
+
+    shutil.copy("test/mock_run.txt", run_file)
+    os.utime(run_file, ns=(0, 0))
+
+    assert len(src.parse_cache.load_events(run_file, cache_dir)) == 1
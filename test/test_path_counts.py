@@ -0,0 +1,214 @@
+import os
+import operator
+import tracemalloc
+from functools import reduce
+
+import pytest
+import numpy as np
+import pandas as pd
+import pathpy
+from .context import src
+
+import src.path_counts
+from src.event_store import decode_syscalls
+from src.likelihood import compile_model
+from src.parse_cache import load_events
+from src.attack_simulate import compute_total_transitions
+from benchmarks.recordings import write_recording
+from src.data_processing import (
+    process_raw_temporal_dataset,
+    extract_dataset_counts,
+    generate_paths_from_threads,
+    generate_temporal_network,
+    parse_run_to_pandas,
+)
+
+
+def as_dict(paths):
+    return {
+        length: {path: count.tolist() for path, count in length_paths.items()}
+        for length, length_paths in paths.paths.items()
+        if length_paths
+    }
+
+
+def test_path_counts_round_trip():
+    paths = generate_paths_from_threads(parse_run_to_pandas("test/mock_run_2.txt"))
+
+    counts = src.path_counts.PathCounts.from_paths(paths)
+    decoded = counts.to_paths()
+
+    assert as_dict(decoded) == as_dict(paths)
+    assert decoded.max_subpath_length == paths.max_subpath_length
+
+
+@pytest.mark.parametrize("time_delta", [0, 1000])
+@pytest.mark.parametrize("processes", [1, 2])
+def test_process_raw_temporal_dataset(time_delta, processes):
+    runs = pd.DataFrame({"path": ["test/mock_run.txt", "test/mock_run_2.txt"] * 2})
+
+    if time_delta == 0:
+        expected = [generate_paths_from_threads(parse_run_to_pandas(run)) for run in runs["path"]]
+    else:
+        expected = [
+            pathpy.path_extraction.paths_from_temporal_network_single(
+                generate_temporal_network(run), delta=time_delta, max_subpath_length=3
+            )
+            for run in runs["path"]
+        ]
+    expected = reduce(operator.add, expected)
+
+    paths = process_raw_temporal_dataset(runs, time_delta, processes=processes, chunksize=1)
+
+    assert as_dict(paths) == as_dict(expected)
+    assert paths.max_subpath_length == expected.max_subpath_length
+
+
+@pytest.mark.parametrize("delta", [1, 3, 10, 1000])
+@pytest.mark.parametrize("max_subpath_length", [1, 4])
+def test_temporal_path_counts(delta, max_subpath_length):
+    rng = np.random.default_rng(delta)
+
+    # few syscalls and equal time stamps give branching and merging paths
+    syscalls = rng.integers(0, 4, 300).astype(np.uint16)
+    times = np.sort(rng.integers(0, 200, 299))
+
+    names = decode_syscalls(syscalls).tolist()
+    net = pathpy.TemporalNetwork(list(zip(names[:-1], names[1:], times.tolist())))
+    expected = pathpy.path_extraction.paths_from_temporal_network_single(
+        net, delta=delta, max_subpath_length=max_subpath_length
+    )
+
+    counts = src.path_counts.temporal_path_counts(
+        syscalls[:-1], syscalls[1:], times, delta, max_subpath_length, flush_size=50
+    )
+    paths = counts.to_paths()
+
+    assert as_dict(paths) == as_dict(expected)
+    assert paths.max_subpath_length == max_subpath_length
+
+
+def test_temporal_path_counts_memory(tmp_path):
+    write_recording(tmp_path / "run.txt", 10000)
+    events = load_events(str(tmp_path / "run.txt"))
+    order = np.argsort(events.time[:-1], kind="stable")
+    edges = (events.syscall[order], events.syscall[order + 1], events.time[order])
+
+    # memory besides the result, with a large delta most paths merge into a few long trees
+    extra = []
+    for delta in [100, 10**9]:
+        tracemalloc.start()
+        counts = src.path_counts.temporal_path_counts(*edges, delta, 3)
+        extra.append(tracemalloc.get_traced_memory()[1] - counts.nbytes)
+        tracemalloc.stop()
+
+    assert extra[1] < 5 * extra[0]
+
+
+def test_path_counts_save_load(tmp_path):
+    first = src.path_counts.extract_path_counts("test/mock_run.txt", 0)
+    second = src.path_counts.extract_path_counts("test/mock_run_2.txt", 0)
+
+    first.save(tmp_path / "first")
+    second.save(tmp_path / "second")
+
+    loaded = src.path_counts.PathCounts.load(tmp_path / "first", mmap_mode="r")
+    assert as_dict(loaded.to_paths()) == as_dict(first.to_paths())
+    assert loaded.total_transitions == compute_total_transitions(first.to_paths())
+
+    src.path_counts.main(
+        [str(tmp_path / "merged"), str(tmp_path / "first"), str(tmp_path / "second")]
+    )
+    merged = src.path_counts.PathCounts.load(tmp_path / "merged")
+
+    for length, paths in merged.paths.items():
+        assert (np.lexsort(paths.T[::-1]) == np.arange(len(paths))).all()
+
+    assert as_dict(merged.to_paths()) == as_dict(first.to_paths() + second.to_paths())
+
+
+class PriorModel(pathpy.MultiOrderModel):
+    """Stand-in for the model of the pathpy fork, which keeps a prior per order."""
+
+    def __init__(self, paths, max_order=1, prior=1, unknown=False):
+        self.prior = prior
+        self.unknown = unknown
+        self.transition_matrices_prior = {}
+        super(PriorModel, self).__init__(paths, max_order)
+
+    def add_layers(self, max_order):
+        super(PriorModel, self).add_layers(max_order)
+
+        for k, layer in self.layers.items():
+            index_map = layer.node_to_name_map()
+            outweights = np.zeros(len(index_map))
+            for node, index in index_map.items():
+                outweights[index] = layer.nodes[node]["outweight"].sum()
+            self.transition_matrices_prior[k] = self.prior / (
+                outweights + self.prior * len(index_map)
+            )
+
+
+def test_fit_parallel(tmp_path):
+    write_recording(tmp_path / "run.txt", 20000)
+    counts = src.path_counts.extract_path_counts(str(tmp_path / "run.txt"), 0)
+    paths = counts.to_paths()
+
+    expected = pathpy.MultiOrderModel(paths, max_order=3)
+    model = counts.fit(3, processes=2)
+
+    for k in range(4):
+        assert model.layers[k].nodes.keys() == expected.layers[k].nodes.keys()
+        assert (model.transition_matrices[k] != expected.transition_matrices[k]).nnz == 0
+
+    assert model.likelihood(paths, log=True) == expected.likelihood(paths, log=True)
+
+    model = src.path_counts.truncate_model(model, 1)
+    expected = pathpy.MultiOrderModel(paths, max_order=1)
+
+    assert model.max_order == 1
+    assert model.likelihood(paths, log=True) == expected.likelihood(paths, log=True)
+
+
+def test_fit_parallel_prior(tmp_path, monkeypatch):
+    monkeypatch.setattr(pathpy, "MultiOrderModel", PriorModel)
+
+    write_recording(tmp_path / "run.txt", 20000)
+    counts = src.path_counts.extract_path_counts(str(tmp_path / "run.txt"), 0)
+
+    expected = PriorModel(counts.to_paths(), max_order=3, prior=1, unknown=True)
+    model = counts.fit(3, processes=2, prior=1, unknown=True)
+
+    assert model.transition_matrices_prior.keys() == expected.transition_matrices_prior.keys()
+    for k in range(4):
+        assert (model.transition_matrices_prior[k] == expected.transition_matrices_prior[k]).all()
+
+    compile_model(model)
+
+    model = src.path_counts.truncate_model(model, 2)
+    assert list(model.transition_matrices_prior) == [0, 1, 2]
+    compile_model(model)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_count_store(processes, tmp_path):
+    runs = pd.DataFrame({"path": ["test/mock_run.txt", "test/mock_run_2.txt"] * 3})
+    expected = src.path_counts.PathCounts.merge(
+        [src.path_counts.extract_path_counts(run, 1000) for run in runs["path"]]
+    )
+
+    # a segment for every run, merged a few rows at a time
+    store = src.path_counts.CountStore(str(tmp_path / "counts"), buffer_size=0, chunk_size=4)
+    counts = extract_dataset_counts(runs, 1000, processes=processes, chunksize=1, store=store)
+
+    assert len(store.segments) == len(runs)
+    assert not os.path.exists(store.directory)
+    assert as_dict(counts.to_paths()) == as_dict(expected.to_paths())
+
+    # saved counts are merged without loading them
+    store = src.path_counts.CountStore(str(tmp_path / "counts"), chunk_size=4)
+    store.add_saved(str(tmp_path / "counts"))
+    store.add(expected)
+    counts = store.finish()
+
+    assert as_dict(counts.to_paths()) == as_dict((expected + expected).to_paths())
@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+from .context import src
+
+import src.RollingTimeWindow
+
+
+@pytest.mark.parametrize("window_size, step_size", [(100, 10), (250, 100), (1000, 1), (5000, 10)])
+def test_array_rolling_time_window(window_size, step_size):
+    times = np.sort(np.random.RandomState(0).randint(0, 3000, 500))
+
+    windows = src.RollingTimeWindow.ArrayRollingTimeWindow(
+        times, window_size, step_size=step_size, return_window=True
+    )
+
+    start = times[0]
+    for edges, window in windows:
+        assert window == [start, start + window_size]
+        expected = times[(start <= times) & (times <= start + window_size)]
+        assert times[edges].tolist() == expected.tolist()
+        start += step_size
+
+    assert start + window_size > times[-1]
+
+
+def test_my_rolling_time_window():
+    net = src.data_processing.generate_temporal_network("test/mock_run_2.txt")
+
+    windows = src.RollingTimeWindow.MyRollingTimeWindow(
+        net, 200000, step_size=100000, return_window=True
+    )
+
+    for window_net, window in windows:
+        expected = [x for x in net.tedges if window[0] <= x[2] <= window[1]]
+        assert sorted(window_net.tedges) == sorted(expected)
@@ -0,0 +1,172 @@
+import pytest
+import numpy as np
+import pandas as pd
+from .context import src
+
+from src.metrics import read_metrics
+from src.scenario_analyzer import ScenarioAnalyzer
+
+
+class MockRun(object):
+    def __init__(self):
+        self.scalars = []
+        self.artifacts = []
+
+    def log_scalar(self, name, value, step=None):
+        self.scalars.append((name, value, step))
+
+    def add_artifact(self, filename, name=None):
+        self.artifacts.append(filename)
+
+
+def random_results(num_runs, seed=0):
+    random = np.random.RandomState(seed)
+
+    runs = pd.DataFrame(
+        {
+            "scenario_name": [f"run_{i}" for i in range(num_runs)],
+            "is_executing_exploit": random.rand(num_runs) < 0.3,
+        }
+    )
+    runs["path"] = runs["scenario_name"] + ".txt"
+
+    results = [
+        {"run": path, "likelihoods": list(-10 * random.rand(random.randint(1, 20)))}
+        for path in runs["path"].sample(frac=1, random_state=seed)
+    ]
+
+    return runs, results
+
+
+def test_evaluate_runs():
+    runs, results = random_results(50)
+
+    analyzer = ScenarioAnalyzer(-8, MockRun(), runs)
+    for result in results:
+        analyzer.add_run(result)
+
+    evaluated = analyzer.evaluate_runs()
+
+    assert len(evaluated) == len(runs)
+    for i, result in enumerate(results):
+        row = evaluated[evaluated["path"] == result["run"]].iloc[0]
+        assert row["min_likelihood"] == min(result["likelihoods"])
+        assert row["result_id"] == i
+        assert row["prediction_exploit"] == (min(result["likelihoods"]) < -8)
+
+    # evaluating again gives the same columns
+    assert analyzer.evaluate_runs().equals(evaluated)
+
+
+def test_evaluate_many_runs():
+    runs, results = random_results(2000)
+    # a run simulated twice keeps its last result
+    results.append({"run": results[0]["run"], "likelihoods": [-9.5]})
+
+    analyzer = ScenarioAnalyzer(-8, MockRun(), runs)
+    for result in results:
+        analyzer.add_run(result)
+
+    evaluated = analyzer.evaluate_runs().set_index("path")
+
+    expected = {}
+    for i, result in enumerate(results):
+        expected[result["run"]] = (min(result["likelihoods"]), i)
+
+    min_likelihoods = [expected[path][0] for path in evaluated.index]
+    assert evaluated["min_likelihood"].tolist() == min_likelihoods
+    assert evaluated["result_id"].tolist() == [expected[path][1] for path in evaluated.index]
+    assert evaluated["prediction_exploit"].tolist() == [
+        likelihood < -8 for likelihood in min_likelihoods
+    ]
+    assert analyzer.get_min_likelihood(0.2) == pytest.approx(np.quantile(min_likelihoods, 0.2))
+
+
+def test_curves(tmp_path):
+    runs, results = random_results(200)
+
+    analyzer = ScenarioAnalyzer(-8, MockRun(), runs)
+    for result in results:
+        analyzer.add_run(result)
+
+    pr, roc, summary = analyzer.get_curves()
+
+    # every threshold of the sweep gives the same scores as evaluating with it
+    for _, point in pr.sample(10, random_state=0).iterrows():
+        analyzer.threshold = point["threshold"]
+        evaluated = analyzer.evaluate_runs()
+        predicted = evaluated["prediction_exploit"]
+        true_positives = (predicted & evaluated["is_executing_exploit"]).sum()
+
+        assert point["precision"] == pytest.approx(true_positives / predicted.sum())
+        assert point["recall"] == pytest.approx(
+            true_positives / evaluated["is_executing_exploit"].sum()
+        )
+
+    assert summary["best_f1"] == pr["f1"].max()
+    assert 0 <= summary["roc_auc"] <= 1
+    # step-wise area, the precision of every point weighted by the recall it adds
+    recall_steps = pr["recall"] - np.append(pr["recall"].to_numpy()[1:], 0)
+    assert summary["pr_auc"] == pytest.approx((recall_steps * pr["precision"]).sum())
+    assert roc["tpr"].is_monotonic_increasing
+
+    files = analyzer.write_curves(str(tmp_path))
+    assert all((tmp_path / name).exists() for name in ["pr_curve.csv", "curves.png"])
+    assert len(files) == 4
+
+
+def test_detection_report():
+    runs, results = random_results(100)
+    runs["exploit_start_time"] = 1.0
+
+    for result in results:
+        flagged = min(result["likelihoods"]) < -8
+        result["detection_time"] = 3500000 if flagged else None
+
+    analyzer = ScenarioAnalyzer(-8, MockRun(), runs)
+    for result in results:
+        analyzer.add_run(result)
+
+    detection = analyzer.get_detection_report()
+    evaluated = analyzer.processed_results
+
+    assert (
+        detection["count"]
+        == (evaluated["is_executing_exploit"] & evaluated["prediction_exploit"]).sum()
+    )
+    assert detection["mean"] == pytest.approx(2.5)
+    assert "Time to detection" in analyzer.get_report()
+
+
+def test_write_misclassified_runs(tmp_path):
+    runs, results = random_results(50)
+
+    for result in results:
+        result["time"] = list(1000 * np.arange(len(result["likelihoods"])))
+        result["transitions"] = list(range(len(result["likelihoods"])))
+
+    sacred_run = MockRun()
+    analyzer = ScenarioAnalyzer(-8, sacred_run, runs)
+    for result in results:
+        analyzer.add_run(result)
+
+    path = analyzer.write_misclassified_runs(str(tmp_path), only_wrong=False)
+
+    # a single artifact instead of a scalar per window
+    assert sacred_run.artifacts == [path]
+    assert sacred_run.scalars == []
+
+    metrics = read_metrics(path)
+    logged = analyzer.processed_results["min_likelihood"] < -1
+    assert len(metrics) == 2 * logged.sum()
+
+    for _, run in analyzer.processed_results[logged].iterrows():
+        result = results[run["result_id"]]
+        exploit = "w_expl" if run["is_executing_exploit"] else "no_expl"
+
+        steps, values = metrics[f"likelihood_{run['scenario_name']}_{exploit}"]
+        assert steps.tolist() == result["time"]
+        assert values.tolist() == result["likelihoods"]
+
+        steps, values = metrics[f"transitions_{run['scenario_name']}_{exploit}"]
+        assert values.tolist() == result["transitions"]
@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+import pathpy
+from .context import src
+
+import src.likelihood
+import src.path_counts
+import src.stream_detector
+from src.attack_simulate import trial_scenario
+
+
+def write_recording(path, num_events, seed=0, syscalls=("futex", "read", "write", "poll", "close")):
+    random = np.random.RandomState(seed)
+
+    time = 23 * 3600 * 10 ** 9 + np.cumsum(random.randint(1, 10000000, num_events))
+    thread_id = random.randint(100, 105, num_events)
+    syscall = np.cumsum(random.randint(1, 3, num_events)) % len(syscalls)
+
+    with open(path, "w") as recording:
+        for i in range(num_events):
+            seconds, nanoseconds = divmod(int(time[i]), 10 ** 9)
+            minutes, seconds = divmod(seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            timestamp = f"{hours:02d}:{minutes:02d}:{seconds:02d}.{nanoseconds:09d}"
+            name = syscalls[syscall[i]]
+            recording.write(f"{i} {timestamp} 0 999 mysqld {thread_id[i]} > {name} fd=3\n")
+            recording.write(f"{i} {timestamp} 0 999 mysqld {thread_id[i]} < {name} res=0\n")
+
+
+def test_stream_detector_matches_trial_scenario(tmp_path):
+    run = str(tmp_path / "run.txt")
+    write_recording(run, 2000)
+
+    events = src.event_store.EventStore.from_file(run)
+    run_data = src.data_processing.parse_run_to_pandas(events)
+    model = src.likelihood.compile_model(
+        pathpy.MultiOrderModel(src.data_processing.generate_paths_from_threads(run_data), 2)
+    )
+
+    expected = trial_scenario(model, events, 0, 200000)
+
+    detector = src.stream_detector.StreamDetector(model, -1.5, 200000)
+    scores = []
+    with open(run) as recording:
+        for line in recording:
+            scores += detector.process_line(line)
+    scores = [score for score in scores if score["likelihood"] is not None]
+
+    assert len(scores) >= len(expected["time"])
+    for score, time, likelihood in zip(scores, expected["time"], expected["likelihoods"]):
+        assert score["time"] - scores[0]["time"] == time - expected["time"][0]
+        assert score["likelihood"] == pytest.approx(likelihood)
+        assert score["alert"] == (likelihood < -1.5)
+    assert len(detector.queue) < 2000
+
+
+def test_stream_detector_unmapped_syscalls(tmp_path):
+    # syscalls missing in references/syscalls.txt, e.g. of a newer kernel
+    run = str(tmp_path / "run.txt")
+    write_recording(run, 2000, syscalls=("futex", "read", "new_syscall", "poll", "other_syscall"))
+
+    counts = src.path_counts.extract_path_counts(run, 0)
+    model = src.likelihood.compile_model(counts.fit(2))
+
+    expected = trial_scenario(model, src.event_store.EventStore.from_file(run), 0, 200000)
+
+    detector = src.stream_detector.StreamDetector(model, -1.5, 200000)
+    scores = []
+    with open(run) as recording:
+        for line in recording:
+            scores += detector.process_line(line)
+    scores = [score["likelihood"] for score in scores if score["likelihood"] is not None]
+
+    # training and detection encode them as the same node
+    assert scores[: len(expected["likelihoods"])] == pytest.approx(expected["likelihoods"])
+    assert np.isfinite(scores).all()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from .context import src
+
+import src.event_store
+import src.trace_statistics
+import src.ex_analyze_data
+from src.data_processing import generate_temporal_network
+from src.parse_cache import load_events
+from benchmarks.recordings import write_recording
+
+
+def test_trace_statistics(tmp_path):
+    runs = [str(tmp_path / f"run_{seed}.txt") for seed in range(3)]
+    for seed, run in enumerate(runs):
+        write_recording(run, 5000, seed=seed)
+
+    nets = [generate_temporal_network(load_events(run)) for run in runs]
+    inter_event_times = np.concatenate([net.inter_event_times() for net in nets])
+
+    statistics = src.trace_statistics.dataset_statistics(pd.DataFrame({"path": runs}), processes=2)
+
+    summary = statistics.summary()
+    assert summary["inter_event_times"] == len(inter_event_times)
+    assert summary["mean"] == pytest.approx(inter_event_times.mean())
+    assert summary["std"] == pytest.approx(inter_event_times.std())
+    assert summary["max"] == inter_event_times.max()
+    assert summary["observation_length"] == sum(net.observation_length() for net in nets)
+
+    assert statistics.run_maxima.tolist() == [net.inter_event_times().max() for net in nets]
+
+    # the percentiles are exact up to the width of a bin
+    for q in [50, 90, 99]:
+        assert statistics.histogram.percentile(q) == pytest.approx(
+            np.percentile(inter_event_times, q), rel=0.03
+        )
+
+    events = sum(len(load_events(run)) for run in runs)
+    assert statistics.syscalls.sum() == events
+    assert sum(count for _, count in statistics.most_frequent_syscalls(1000)) == events
+
+    src.ex_analyze_data.analyze_time(statistics, str(tmp_path / "figures" / "time.png"))
+    assert (tmp_path / "figures" / "time.png").exists()
+
+
+def test_analyze_empty_runs(tmp_path):
+    empty = src.event_store.EventStore(np.zeros(0), np.zeros(0), np.zeros(0))
+    statistics = src.trace_statistics.TraceStatistics.merge(
+        [src.trace_statistics.TraceStatistics.from_events(empty)] * 2
+    )
+
+    assert statistics.summary()["inter_event_times"] == 0
+
+    src.ex_analyze_data.analyze_time(statistics, str(tmp_path / "time.png"))
+    assert (tmp_path / "time.png").exists()